@@ -0,0 +1,95 @@
+"""bench_fsm_storage.py
+Бенчмарк пропускной способности FSM-хранилищ: get/set состояния и данных.
+
+Сравнивает MemoryStorage aiogram, PostgresFSMStorage с кешем чтения и без него.
+По умолчанию использует DATABASE_URL из окружения (таблица fsm_state должна
+существовать — alembic upgrade head); без DATABASE_URL — временный SQLite.
+
+Запуск:
+    python bench_fsm_storage.py [--ops 2000] [--users 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Исправляем проблему с event loop на Windows
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from src.config import Settings
+from src.db.connection import DatabaseManager
+from src.db.models import FsmState
+from src.services.fsm_storage import PostgresFSMStorage
+
+
+async def bench(name, storage, ops: int, users: int) -> None:
+    """Замерить операции в типичном порядке шага сценария."""
+    keys = [StorageKey(bot_id=1, chat_id=10_000 + i, user_id=10_000 + i) for i in range(users)]
+
+    async def measure(label, operation):
+        started = time.perf_counter()
+        for i in range(ops):
+            await operation(keys[i % users], i)
+        elapsed = time.perf_counter() - started
+        print(f"  {label:<28} {ops / elapsed:>12,.0f} оп/с  {elapsed / ops * 1e6:>10,.1f} мкс/оп")
+
+    print(f"\n{name}")
+    await measure("set_state", lambda key, i: storage.set_state(key, f"MemoryStates:step{(i // users) % 5}"))
+    await measure("update_data", lambda key, i: storage.update_data(key, {"step": i}))
+    await measure("get_state", lambda key, i: storage.get_state(key))
+    await measure("get_state + get_data", lambda key, i: _read_step(storage, key))
+
+
+async def _read_step(storage, key) -> None:
+    # Так FSM-middleware и хендлер читают хранилище на каждый апдейт
+    await storage.get_state(key)
+    await storage.get_data(key)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    create_table = False
+    if not database_url:
+        database_url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_fsm.db"
+        create_table = True
+
+    settings = Settings(
+        telegram_bot_token="bench",
+        openai_api_key="bench",
+        database_url=database_url,
+        environment="bench",
+    )
+    db_manager = DatabaseManager(settings)
+    await db_manager.initialize()
+    if create_table:
+        async with db_manager.engine.begin() as conn:
+            await conn.run_sync(FsmState.__table__.create)
+
+    print(f"БД: {database_url.split('@')[-1]}; операций: {args.ops}; пользователей: {args.users}")
+    try:
+        await bench("MemoryStorage (aiogram)", MemoryStorage(), args.ops, args.users)
+        await bench("PostgresFSMStorage, кеш чтения", PostgresFSMStorage(db_manager), args.ops, args.users)
+        await bench("PostgresFSMStorage, без кеша", PostgresFSMStorage(db_manager, cache_ttl=0), args.ops, args.users)
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,12 +5,12 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import multiprocessing
 import signal
 import sys
 import os
 from typing import Optional
 from aiohttp import web
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 # Исправляем проблему с event loop на Windows
 if sys.platform == "win32":
@@ -24,8 +24,21 @@ except Exception as e:  # noqa: BLE001
 from aiogram import Bot, Dispatcher
 
 from src.config import Settings
-from src.db.connection import initialize_database
-from src.handlers import context_handler, memory_handler
+from src.db.connection import DatabaseManager, initialize_database
+from src.handlers import context_handler, memory_handler, start
+from src.middlewares.idempotency import IdempotencyMiddleware, SharedIdempotencyMiddleware
+from src.middlewares.rate_limit import RateLimitMiddleware
+from src.middlewares.scheduler import UpdateSchedulerMiddleware
+from src.middlewares.user_state import UserStateMiddleware
+from src.services.access_log import get_access_log_writer
+from src.services.conversation_repository import PARTITION_MAINTENANCE_INTERVAL, get_conversation_repository
+from src.services.fsm_storage import create_fsm_storage
+from src.services.metrics import render_metrics
+from src.services.outbound import create_outbound_limiter
+from src.services.rate_limiter import create_rate_limit_backend
+from src.services.update_dedup import create_update_deduplicator
+from src.services.user_state_store import create_user_state_backend, get_user_state_store
+from src.webhook import WebhookUpdateQueue, derive_webhook_secret, resolve_webhook_url
 
 
 def setup_logging() -> None:
@@ -45,6 +58,117 @@ def setup_sentry(dsn: Optional[str]) -> None:
             logging.getLogger(__name__).warning("Sentry init failed: %s", e)
 
 
+def create_bot(settings: Settings) -> Bot:
+    """Бот, все исходящие запросы которого идут через лимитер Telegram."""
+    bot = Bot(token=settings.telegram_bot_token)
+    bot.session.middleware(create_outbound_limiter(settings))
+    return bot
+
+
+def setup_middlewares(
+    dp: Dispatcher,
+    settings: Settings,
+    db_manager: DatabaseManager,
+) -> None:
+    """Подключить middleware диспетчера."""
+    # Повторы, уже виденные процессом, отбрасываются до очереди (без ожидания)
+    deduplicator = create_update_deduplicator(settings, db_manager)
+    idempotency = IdempotencyMiddleware(deduplicator)
+    # Затем апдейты одного чата строго по порядку, разные чаты — параллельно
+    scheduler = UpdateSchedulerMiddleware(
+        workers=settings.scheduler_workers,
+        capacity=settings.scheduler_capacity,
+    )
+    # Проверка в общем бэкенде ждёт БД — только в очереди чата, иначе апдейты чата поменяются местами
+    shared_idempotency = SharedIdempotencyMiddleware(deduplicator)
+    # FSM-middleware переставляем за планировщик: состояние читается уже в очереди чата
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(idempotency)
+    dp.update.outer_middleware(scheduler)
+    dp.update.outer_middleware(shared_idempotency)
+    dp.update.outer_middleware(dp.fsm)
+    dp.shutdown.register(scheduler.close)
+
+    # Лимит запросов на пользователя: отсекаем флуд до хендлеров и вызовов OpenAI
+    rate_limiter = RateLimitMiddleware(create_rate_limit_backend(settings, db_manager))
+    dp.message.outer_middleware(rate_limiter)
+    dp.callback_query.outer_middleware(rate_limiter)
+
+    # Состояние пользователя подгружается в L1 после лимитера — отклонённые апдейты не читают БД
+    state_store = get_user_state_store()
+    state_store.set_backend(create_user_state_backend(settings, db_manager))
+    user_state = UserStateMiddleware(state_store)
+    dp.message.outer_middleware(user_state)
+    dp.callback_query.outer_middleware(user_state)
+
+    # Журнал доступа к воспоминаниям пишется в фоне пачками
+    get_access_log_writer().set_session_provider(db_manager.get_session)
+
+
+def setup_conversations(dp: Dispatcher, settings: Settings, db_manager: DatabaseManager) -> None:
+    """История диалогов: запись в фоне пачками, партиции message обслуживаются при запуске и раз в сутки."""
+    conversations = get_conversation_repository()
+    conversations.set_session_provider(db_manager.get_session)
+    running = {}
+
+    async def maintain_partitions() -> None:
+        try:
+            await conversations.maintain_partitions(settings.conversation_retention_months)
+        except Exception as e:  # noqa: BLE001
+            # Без новых партиций строки уходят в message_default — бот работает дальше
+            logging.getLogger(__name__).warning("Не удалось обслужить партиции message: %s", e)
+
+    async def maintain_periodically() -> None:
+        # Процесс живёт месяцами: партиции следующих месяцев и срок хранения — по расписанию
+        while True:
+            await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+            await maintain_partitions()
+
+    async def start_maintenance() -> None:
+        await maintain_partitions()
+        running["task"] = asyncio.create_task(maintain_periodically())
+
+    async def stop_maintenance() -> None:
+        task = running.pop("task", None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    dp.startup.register(start_maintenance)
+    dp.shutdown.register(stop_maintenance)
+
+
+def setup_report_worker(dp: Dispatcher, settings: Settings, db_manager: DatabaseManager) -> None:
+    """Встроенный воркер очереди отчётов: стартует и останавливается вместе с диспетчером."""
+    if not settings.report_worker_embedded:
+        return
+    running = {}
+
+    async def start_worker(bot: Bot) -> None:
+        worker = start.create_report_worker(bot, db_manager, settings)
+        running["worker"] = worker
+        running["task"] = asyncio.create_task(worker.run())
+
+    async def stop_worker() -> None:
+        if "worker" in running:
+            running["worker"].stop()
+            await running.pop("task")
+
+    dp.startup.register(start_worker)
+    dp.shutdown.register(stop_worker)
+
+
+def create_dispatcher(settings: Settings, db_manager: DatabaseManager) -> Dispatcher:
+    """Диспетчер с хранилищем FSM, middleware, роутерами и воркером отчётов."""
+    dp = Dispatcher(storage=create_fsm_storage(settings, db_manager))
+    setup_middlewares(dp, settings, db_manager)
+    setup_report_worker(dp, settings, db_manager)
+    setup_conversations(dp, settings, db_manager)
+    dp.include_router(context_handler.router)
+    dp.include_router(memory_handler.router)
+    return dp
+
+
 async def polling_app() -> None:
     settings = Settings.from_env()
     setup_logging()
@@ -54,12 +178,8 @@ async def polling_app() -> None:
     db_manager = initialize_database(settings)
     await db_manager.initialize()
 
-    bot = Bot(settings.telegram_bot_token)
-    dp = Dispatcher()
-
-    # Routers
-    dp.include_router(context_handler.router)
-    dp.include_router(memory_handler.router)
+    bot = create_bot(settings)
+    dp = create_dispatcher(settings, db_manager)
 
     # Настройка graceful shutdown
     shutdown_event = asyncio.Event()
@@ -78,7 +198,12 @@ async def polling_app() -> None:
         
         # Запускаем polling в фоне
         polling_task = asyncio.create_task(
-            dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+            dp.start_polling(
+                bot,
+                allowed_updates=dp.resolve_used_update_types(),
+                # Не забираем новые апдейты, пока планировщик заполнен
+                tasks_concurrency_limit=settings.scheduler_capacity,
+            )
         )
         
         # Ждём сигнала остановки
@@ -98,49 +223,115 @@ async def polling_app() -> None:
         print(f"❌ Ошибка при работе бота: {e}")
         raise
     finally:
-        # Закрываем соединения
+        # Сохраняем несброшенное состояние пользователей, журнал доступа и историю диалогов, закрываем соединения
+        await get_user_state_store().close()
+        await get_access_log_writer().close()
+        await get_conversation_repository().close()
         await bot.session.close()
         await db_manager.close()
 
 
-async def webhook_app() -> web.Application:
-    """Создание webhook приложения для production."""
-    settings = Settings.from_env()
-    
-    # Инициализируем базу данных
-    await initialize_database()
-    
-    # Создаем бота и диспетчер
-    bot = Bot(token=settings.telegram_bot_token)
-    dp = Dispatcher()
-    
-    # Регистрируем роутеры
-    dp.include_router(context_handler.router)
-    dp.include_router(memory_handler.router)
-    
-    # Создаем webhook приложение
-    app = web.Application()
-    
-    # Настраиваем webhook
-    webhook_path = "/webhook"
-    webhook_url = os.getenv("WEBHOOK_URL", f"https://your-app.railway.app{webhook_path}")
-    
-    # Устанавливаем webhook
-    await bot.set_webhook(webhook_url)
-    print(f"🌐 Webhook установлен: {webhook_url}")
-    
-    # Настраиваем обработчик
-    webhook_handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
-    webhook_handler.register(app, path=webhook_path)
-    
-    # Добавляем health check
-    async def health_check(request):
+def webhook_app(settings: Settings, set_webhook: bool = True) -> web.Application:
+    """Webhook-приложение для production.
+
+    Всё, что требует цикла событий (БД, setWebhook, исполнители очереди),
+    запускается в on_startup — в том же цикле, что и сервер.
+    """
+    db_manager = initialize_database(settings)
+    bot = create_bot(settings)
+    dp = create_dispatcher(settings, db_manager)
+    secret = settings.webhook_secret or derive_webhook_secret(settings.telegram_bot_token)
+    updates = WebhookUpdateQueue(
+        dp,
+        bot,
+        secret_token=secret,
+        queue_size=settings.webhook_queue_size,
+    )
+
+    async def on_startup(app: web.Application) -> None:
+        await db_manager.initialize()
+        await dp.emit_startup(bot=bot)
+        if not set_webhook:
+            return
+        webhook_url = resolve_webhook_url(settings.webhook_url, settings.webhook_path)
+        if webhook_url is None:
+            logging.getLogger(__name__).warning("WEBHOOK_URL не задан — setWebhook пропущен")
+            return
+        await bot.set_webhook(
+            webhook_url,
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        print(f"🌐 Webhook установлен: {webhook_url}")
+
+    async def on_cleanup(app: web.Application) -> None:
+        # Очередь уже дообработана в on_shutdown
+        await dp.emit_shutdown(bot=bot)
+        await get_user_state_store().close()
+        await get_access_log_writer().close()
+        await get_conversation_repository().close()
+        await bot.session.close()
+        await db_manager.close()
+
+    async def health_check(request: web.Request) -> web.Response:
         return web.Response(text="OK")
-    
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render_metrics(), content_type="text/plain")
+
+    app = web.Application()
+    # БД должна быть готова до запуска исполнителей очереди
+    app.on_startup.append(on_startup)
+    updates.register(app, path=settings.webhook_path)
+    app.on_cleanup.append(on_cleanup)
     app.router.add_get("/health", health_check)
-    
+    app.router.add_get("/metrics", metrics)
     return app
 
+
+def serve_webhook(settings: Settings, primary: bool = True, reuse_port: bool = False) -> None:
+    """Запустить webhook-сервер в текущем процессе."""
+    setup_logging()
+    setup_sentry(settings.sentry_dsn)
+    web.run_app(
+        webhook_app(settings, set_webhook=primary),
+        host="0.0.0.0",
+        port=settings.port,
+        reuse_port=reuse_port,
+        print=None,
+    )
+
+
+def run_webhook(settings: Settings) -> None:
+    """Webhook в одном или нескольких процессах на общем порту (SO_REUSEPORT).
+
+    setWebhook вызывает только первый процесс. При нескольких процессах
+    состояние должно быть общим: RATE_LIMIT_BACKEND, USER_STATE_BACKEND,
+    UPDATE_DEDUP_BACKEND и FSM_STORAGE = postgres.
+    """
+    if settings.webhook_processes <= 1:
+        serve_webhook(settings)
+        return
+
+    children = [
+        multiprocessing.Process(target=serve_webhook, args=(settings, index == 0, True))
+        for index in range(settings.webhook_processes)
+    ]
+    for child in children:
+        child.start()
+
+    def stop_children(signum, frame):
+        # SIGTERM дочерним процессам: aiohttp завершает их штатно (on_shutdown/on_cleanup)
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+
+    signal.signal(signal.SIGINT, stop_children)
+    signal.signal(signal.SIGTERM, stop_children)
+    for child in children:
+        child.join()
+
+
 def main():
     """Главная функция с обработкой ошибок."""
     # Проверяем, запускаем ли мы в production (webhook) или локально (polling)
@@ -148,8 +339,7 @@ def main():
         # Production режим - webhook
         print("🚀 Запуск в production режиме (webhook)")
         try:
-            app = asyncio.run(webhook_app())
-            web.run_app(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
+            run_webhook(Settings.from_env())
         except Exception as e:
             print(f"❌ Ошибка webhook сервера: {e}")
             sys.exit(1)
@@ -11,6 +11,7 @@ from sqlalchemy import pool
 from sqlalchemy.engine import Connection
 from sqlalchemy import engine_from_config
 
+from src.db.engine import normalize_db_url
 from src.db.models import SQLModel
 
 # this is the Alembic Config object, which provides
@@ -46,7 +47,8 @@ def get_database_url() -> str:
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
         raise RuntimeError("DATABASE_URL не задан в окружении")
-    return database_url
+    # Тот же драйвер, что и у приложения (psycopg3)
+    return normalize_db_url(database_url)
 
 
 def run_migrations_offline() -> None:
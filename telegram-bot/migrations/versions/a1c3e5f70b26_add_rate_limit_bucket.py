@@ -0,0 +1,32 @@
+"""Add rate limit bucket table
+
+Revision ID: a1c3e5f70b26
+Revises: 6c293c4b8db3
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f70b26'
+down_revision = '6c293c4b8db3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('rate_limit_bucket',
+    sa.Column('key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_rate_limit_bucket_updated_at'), 'rate_limit_bucket', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_rate_limit_bucket_updated_at'), table_name='rate_limit_bucket')
+    op.drop_table('rate_limit_bucket')
@@ -0,0 +1,89 @@
+"""Add memory_tag and memory_link tables
+
+Revision ID: a8d3f0c2e715
+Revises: f7c2a9e1b364
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d3f0c2e715'
+down_revision = 'f7c2a9e1b364'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('memory_tag',
+    sa.Column('memory_id', sa.Integer(), nullable=False),
+    sa.Column('tag', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['memory_id'], ['memory.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('memory_id', 'tag')
+    )
+    op.create_index('ix_memory_tag_user_tag', 'memory_tag', ['user_id', 'tag', 'memory_id'], unique=False)
+    op.create_table('memory_link',
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['source_id'], ['memory.id'], ),
+    sa.ForeignKeyConstraint(['target_id'], ['memory.id'], ),
+    sa.PrimaryKeyConstraint('source_id', 'target_id')
+    )
+    op.create_index('ix_memory_link_target_source', 'memory_link', ['target_id', 'source_id'], unique=False)
+
+    _backfill()
+
+
+def _backfill() -> None:
+    """Перенести теги и связи из строк через запятую в новые таблицы."""
+    bind = op.get_bind()
+    memory = sa.table(
+        'memory',
+        sa.column('id', sa.Integer),
+        sa.column('user_id', sa.Integer),
+        sa.column('tags', sa.String),
+        sa.column('related_memories', sa.String),
+    )
+    rows = bind.execute(
+        sa.select(memory.c.id, memory.c.user_id, memory.c.tags, memory.c.related_memories)
+    ).all()
+    owners = {row.id: row.user_id for row in rows}
+
+    tags, links = [], []
+    for row in rows:
+        parsed = (tag.strip().lower() for tag in (row.tags or '').split(','))
+        for tag in dict.fromkeys(tag for tag in parsed if tag):
+            tags.append({'memory_id': row.id, 'tag': tag, 'user_id': row.user_id})
+        for target_id in dict.fromkeys(int(m) for m in re.findall(r'\d+', row.related_memories or '')):
+            # Связи только между существующими воспоминаниями одного пользователя
+            if target_id != row.id and owners.get(target_id) == row.user_id:
+                links.append({'source_id': row.id, 'target_id': target_id})
+
+    if tags:
+        op.bulk_insert(sa.table(
+            'memory_tag',
+            sa.column('memory_id', sa.Integer),
+            sa.column('tag', sa.String),
+            sa.column('user_id', sa.Integer),
+        ), tags)
+    if links:
+        op.bulk_insert(sa.table(
+            'memory_link',
+            sa.column('source_id', sa.Integer),
+            sa.column('target_id', sa.Integer),
+        ), links)
+
+
+def downgrade() -> None:
+    # Строки Memory.tags/related_memories не удалялись — данные сохраняются
+    op.drop_index('ix_memory_link_target_source', table_name='memory_link')
+    op.drop_table('memory_link')
+    op.drop_index('ix_memory_tag_user_tag', table_name='memory_tag')
+    op.drop_table('memory_tag')
@@ -0,0 +1,32 @@
+"""Add user state table
+
+Revision ID: b7d2e4f81c39
+Revises: a1c3e5f70b26
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f81c39'
+down_revision = 'a1c3e5f70b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('user_state',
+    sa.Column('key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('value', sa.LargeBinary(), nullable=False),
+    sa.Column('expires_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_user_state_expires_at'), 'user_state', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_state_expires_at'), table_name='user_state')
+    op.drop_table('user_state')
@@ -0,0 +1,34 @@
+"""Add memory_stats table
+
+Revision ID: b9e4a1d7c382
+Revises: a8d3f0c2e715
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e4a1d7c382'
+down_revision = 'a8d3f0c2e715'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Строки заполняются при первом обращении или `python rebuild_memory_stats.py`
+    op.create_table('memory_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('by_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('recent', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('memory_stats')
@@ -0,0 +1,91 @@
+"""Partition message table by month, add keyset indexes
+
+Revision ID: c1f5d8e2a907
+Revises: b9e4a1d7c382
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.db.message_partitions import DEFAULT_PARTITION, month_start, partition_ddl
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1f5d8e2a907'
+down_revision = 'b9e4a1d7c382'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_index(op.f('ix_dialog_user_id'), table_name='dialog')
+    op.create_index('ix_dialog_user_id_id', 'dialog', ['user_id', 'id'], unique=False)
+
+    if op.get_bind().dialect.name != 'postgresql':
+        op.drop_index(op.f('ix_message_dialog_id'), table_name='message')
+        op.create_index('ix_message_dialog_id_id', 'message', ['dialog_id', 'id'], unique=False)
+        return
+
+    # Секционированная таблица: ключ секционирования обязан входить в первичный ключ.
+    # Последовательность id переходит к новой таблице вместе со значением по умолчанию
+    op.execute("ALTER TABLE message RENAME TO message_unpartitioned")
+    op.execute("ALTER TABLE message_unpartitioned RENAME CONSTRAINT message_pkey TO message_unpartitioned_pkey")
+    op.execute("ALTER TABLE message_unpartitioned RENAME CONSTRAINT message_dialog_id_fkey TO message_unpartitioned_dialog_id_fkey")
+    op.drop_index(op.f('ix_message_dialog_id'), table_name='message_unpartitioned')
+    op.execute("""
+        CREATE TABLE message (
+            id INTEGER NOT NULL DEFAULT nextval('message_id_seq'),
+            dialog_id INTEGER NOT NULL REFERENCES dialog (id),
+            role VARCHAR NOT NULL,
+            content VARCHAR NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT message_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF message DEFAULT")
+    # Партиции для месяцев с данными и на два месяца вперёд; остальное — при запуске бота
+    now = datetime.utcnow()
+    oldest = op.get_bind().scalar(sa.text("SELECT min(created_at) FROM message_unpartitioned")) or now
+    month = month_start(oldest)
+    while month <= month_start(now, 2):
+        op.execute(partition_ddl(month))
+        month = month_start(month, 1)
+    op.execute(
+        "INSERT INTO message (id, dialog_id, role, content, created_at) "
+        "SELECT id, dialog_id, role, content, created_at FROM message_unpartitioned"
+    )
+    op.execute("ALTER SEQUENCE message_id_seq OWNED BY message.id")
+    op.execute("DROP TABLE message_unpartitioned")
+    op.create_index('ix_message_dialog_id_id', 'message', ['dialog_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE message RENAME TO message_partitioned")
+        op.execute("ALTER TABLE message_partitioned RENAME CONSTRAINT message_pkey TO message_partitioned_pkey")
+        op.drop_index('ix_message_dialog_id_id', table_name='message_partitioned')
+        op.execute("""
+            CREATE TABLE message (
+                id INTEGER NOT NULL DEFAULT nextval('message_id_seq'),
+                dialog_id INTEGER NOT NULL REFERENCES dialog (id),
+                role VARCHAR NOT NULL,
+                content VARCHAR NOT NULL,
+                created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                CONSTRAINT message_pkey PRIMARY KEY (id)
+            )
+        """)
+        op.execute(
+            "INSERT INTO message (id, dialog_id, role, content, created_at) "
+            "SELECT id, dialog_id, role, content, created_at FROM message_partitioned"
+        )
+        op.execute("ALTER SEQUENCE message_id_seq OWNED BY message.id")
+        op.execute("DROP TABLE message_partitioned")
+    else:
+        op.drop_index('ix_message_dialog_id_id', table_name='message')
+    op.create_index(op.f('ix_message_dialog_id'), 'message', ['dialog_id'], unique=False)
+
+    op.drop_index('ix_dialog_user_id_id', table_name='dialog')
+    op.create_index(op.f('ix_dialog_user_id'), 'dialog', ['user_id'], unique=False)
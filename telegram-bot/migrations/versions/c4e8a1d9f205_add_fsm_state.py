@@ -0,0 +1,33 @@
+"""Add FSM state table
+
+Revision ID: c4e8a1d9f205
+Revises: b7d2e4f81c39
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1d9f205'
+down_revision = 'b7d2e4f81c39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('fsm_state',
+    sa.Column('key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('state', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('data', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('expires_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_fsm_state_expires_at'), 'fsm_state', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_fsm_state_expires_at'), table_name='fsm_state')
+    op.drop_table('fsm_state')
@@ -0,0 +1,30 @@
+"""Add reportrequest.result_json and content_hash
+
+Revision ID: d2a6e9f3b481
+Revises: c1f5d8e2a907
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6e9f3b481'
+down_revision = 'c1f5d8e2a907'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Старые строки остаются с result_text и без хеша: уникальный индекс их не затрагивает
+    op.add_column('reportrequest', sa.Column('result_json', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True))
+    op.add_column('reportrequest', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ux_reportrequest_user_id_content_hash', 'reportrequest', ['user_id', 'content_hash'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_reportrequest_user_id_content_hash', table_name='reportrequest')
+    op.drop_column('reportrequest', 'content_hash')
+    op.drop_column('reportrequest', 'result_json')
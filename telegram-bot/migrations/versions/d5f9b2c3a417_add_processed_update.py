@@ -0,0 +1,31 @@
+"""Add processed update table
+
+Revision ID: d5f9b2c3a417
+Revises: c4e8a1d9f205
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f9b2c3a417'
+down_revision = 'c4e8a1d9f205'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('processed_update',
+    sa.Column('update_id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('seen_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('update_id')
+    )
+    op.create_index(op.f('ix_processed_update_seen_at'), 'processed_update', ['seen_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_processed_update_seen_at'), table_name='processed_update')
+    op.drop_table('processed_update')
@@ -0,0 +1,37 @@
+"""Add composite indexes for keyset listing of memories and reports
+
+Revision ID: e3b7f0a4c592
+Revises: d2a6e9f3b481
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7f0a4c592'
+down_revision = 'd2a6e9f3b481'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Порядок колонок совпадает с ORDER BY списков: страница по курсору — один проход по индексу
+    op.create_index(
+        'ix_memory_user_id_importance_updated_at',
+        'memory',
+        ['user_id', sa.text('importance DESC'), sa.text('updated_at DESC'), 'id'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_reportrequest_user_id_created_at',
+        'reportrequest',
+        ['user_id', sa.text('created_at DESC'), 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reportrequest_user_id_created_at', table_name='reportrequest')
+    op.drop_index('ix_memory_user_id_importance_updated_at', table_name='memory')
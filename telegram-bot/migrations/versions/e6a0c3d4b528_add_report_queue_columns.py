@@ -0,0 +1,33 @@
+"""Add report queue columns
+
+Revision ID: e6a0c3d4b528
+Revises: d5f9b2c3a417
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a0c3d4b528'
+down_revision = 'd5f9b2c3a417'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('reportrequest', sa.Column('chat_id', sa.BigInteger(), nullable=True))
+    op.add_column('reportrequest', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('reportrequest', sa.Column('run_after', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+    op.add_column('reportrequest', sa.Column('locked_until', sa.DateTime(), nullable=True))
+    op.create_index('ix_reportrequest_status_run_after', 'reportrequest', ['status', 'run_after'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reportrequest_status_run_after', table_name='reportrequest')
+    op.drop_column('reportrequest', 'locked_until')
+    op.drop_column('reportrequest', 'run_after')
+    op.drop_column('reportrequest', 'attempts')
+    op.drop_column('reportrequest', 'chat_id')
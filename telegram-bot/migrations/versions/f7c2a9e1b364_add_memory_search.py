@@ -0,0 +1,88 @@
+"""Add Memory Bank tables and full-text search
+
+Revision ID: f7c2a9e1b364
+Revises: e6a0c3d4b528
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c2a9e1b364'
+down_revision = 'e6a0c3d4b528'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Таблицы Memory Bank раньше создавались вне миграций (create_all)
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('memory'):
+        op.create_table('memory',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('title', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('content', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('memory_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('importance', sa.Integer(), nullable=False),
+        sa.Column('tags', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('last_accessed', sa.DateTime(), nullable=True),
+        sa.Column('related_memories', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_memory_user_id'), 'memory', ['user_id'], unique=False)
+    if not inspector.has_table('memoryaccess'):
+        op.create_table('memoryaccess',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('memory_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('access_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('context', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['memory_id'], ['memory.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_memoryaccess_memory_id'), 'memoryaccess', ['memory_id'], unique=False)
+        op.create_index(op.f('ix_memoryaccess_user_id'), 'memoryaccess', ['user_id'], unique=False)
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # pg_trgm — нечёткий поиск по заголовку и тегам; btree_gin — user_id в составных GIN-индексах
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.execute(
+        """
+        ALTER TABLE memory ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(title, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(tags, '')), 'B')
+            || setweight(to_tsvector('russian', coalesce(content, '')), 'C')
+        ) STORED
+        """
+    )
+    op.create_index('ix_memory_user_search', 'memory', ['user_id', 'search_vector'], postgresql_using='gin')
+    op.create_index(
+        'ix_memory_user_title_trgm', 'memory', ['user_id', 'title'],
+        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'},
+    )
+    op.create_index(
+        'ix_memory_user_tags_trgm', 'memory', ['user_id', 'tags'],
+        postgresql_using='gin', postgresql_ops={'tags': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    # Таблицы Memory Bank могли существовать до миграции — оставляем их
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_memory_user_tags_trgm', table_name='memory')
+    op.drop_index('ix_memory_user_title_trgm', table_name='memory')
+    op.drop_index('ix_memory_user_search', table_name='memory')
+    op.drop_column('memory', 'search_vector')
@@ -0,0 +1,47 @@
+"""rebuild_memory_stats.py
+Пересчёт материализованной статистики Memory Bank (таблица memory_stats).
+
+Счётчики обновляются при каждом изменении воспоминания; скрипт нужен,
+если данные менялись в обход MemoryBankService (ручные правки, импорт)
+или после сбоя. Без аргументов пересчитывает всех пользователей.
+
+Запуск:
+    python rebuild_memory_stats.py [user_id]
+"""
+import asyncio
+import logging
+import sys
+
+# Исправляем проблему с event loop на Windows
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from src.config import Settings
+from src.db.connection import initialize_database
+from src.services.memory_bank_service import MemoryBankService
+
+
+async def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    settings = Settings.from_env()
+    db_manager = initialize_database(settings)
+    await db_manager.initialize()
+    try:
+        rebuilt = await MemoryBankService(db_manager).rebuild_stats(user_id)
+        print(f"✅ Статистика Memory Bank пересчитана: {rebuilt} пользователей")
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""report_worker.py
+Отдельный процесс воркера очереди отчётов (таблица reportrequest).
+
+Забирает заявки через FOR UPDATE SKIP LOCKED, поэтому процессов можно
+запустить сколько угодно — пропускная способность растёт линейно до
+лимитов OpenAI. Параллельность внутри процесса — REPORT_WORKER_CONCURRENCY.
+Встроенный в процесс бота воркер включается REPORT_WORKER_EMBEDDED=1;
+при отдельных процессах оставьте значение по умолчанию (0). В Procfile
+процесс не входит, пока заявки не ставит ни один подключённый хендлер.
+
+Запуск:
+    python report_worker.py
+"""
+import asyncio
+import logging
+import signal
+import sys
+
+# Исправляем проблему с event loop на Windows
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from aiogram import Bot
+
+from src.config import Settings
+from src.db.connection import initialize_database
+from src.handlers.start import create_report_worker
+from src.services.outbound import create_outbound_limiter
+
+
+async def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    settings = Settings.from_env()
+    db_manager = initialize_database(settings)
+    await db_manager.initialize()
+    bot = Bot(settings.telegram_bot_token)
+    bot.session.middleware(create_outbound_limiter(settings))
+    worker = create_report_worker(bot, db_manager, settings)
+
+    # SIGTERM/SIGINT: перестаём забирать заявки и дообрабатываем начатые
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:
+            pass
+
+    print(f"🧵 Воркер отчётов запущен (параллельность: {settings.report_worker_concurrency})")
+    try:
+        await worker.run()
+    finally:
+        await bot.session.close()
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
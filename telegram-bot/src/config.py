@@ -9,6 +9,13 @@ from dataclasses import dataclass
 from typing import Optional
 
 
+def _optional_int(value: Optional[str]) -> Optional[int]:
+    """Целое из окружения; пустое значение, `none` или `off` — None."""
+    if value is None or value.strip().lower() in ("", "none", "off"):
+        return None
+    return int(value)
+
+
 @dataclass(slots=True)
 class Settings:
     """Настройки приложения.
@@ -31,8 +38,55 @@ class Settings:
     kv_namespace: Optional[str] = None
     r2_bucket: Optional[str] = None
 
+    # Пул соединений с БД (Neon PostgreSQL)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0  # секунды ожидания свободного соединения
+    db_pool_recycle: int = 240  # секунды; меньше таймаута простоя Neon
+    db_prepare_threshold: Optional[int] = 5  # psycopg; None — без подготовленных выражений
+    db_query_cache_size: int = 500  # кеш компиляции запросов SQLAlchemy
+    db_keepalive_interval: float = 60.0  # секунды между SELECT 1; 0 — выключено
+    db_warm_connections: int = 1  # соединений, открываемых при старте
+    db_echo: bool = False  # логировать SQL
+
     # Контроль расходов
     rate_limit_per_minute: int = 30
+    rate_limit_backend: str = "memory"  # memory|postgres
+
+    # Состояние пользователей (контекст диалога, введённые данные)
+    user_state_backend: str = "memory"  # memory|postgres
+
+    # FSM aiogram (сценарии memory_handler)
+    fsm_storage: str = "memory"  # memory|postgres
+    fsm_cache_ttl: float = 30.0  # секунды; 0 — без кеша чтения
+
+    # Исходящие сообщения: лимиты Telegram на процесс бота
+    outbound_global_rate: float = 30.0  # сообщений в секунду
+    outbound_chat_rate: float = 1.0  # сообщений в секунду в личный чат
+
+    # Дедупликация повторно доставленных апдейтов по update_id
+    update_dedup_backend: str = "memory"  # memory|postgres
+
+    # Планировщик апдейтов: порядок внутри чата, параллельность между чатами
+    scheduler_workers: int = 16
+    scheduler_capacity: int = 1000  # апдейтов в очереди и в работе
+
+    # Очередь генерации отчётов (reportrequest)
+    report_worker_concurrency: int = 4  # отчётов одновременно на процесс воркера
+    # Запускать воркер в процессе бота. Выключено: заявки ставит только start.router,
+    # который в диспетчер не подключён, — пустая очередь опрашивалась бы каждую секунду
+    report_worker_embedded: bool = False
+
+    # История диалогов (dialog/message): месяцев хранения; None — хранить всё
+    conversation_retention_months: Optional[int] = None
+
+    # Webhook (production)
+    webhook_url: Optional[str] = None  # публичный URL; без него setWebhook не вызывается
+    webhook_path: str = "/webhook"
+    webhook_secret: Optional[str] = None  # по умолчанию выводится из токена бота
+    webhook_queue_size: int = 1000
+    webhook_processes: int = 1  # >1 — несколько процессов на одном порту (SO_REUSEPORT)
+    port: int = 8000
 
     @classmethod
     def from_env(cls) -> "Settings":
@@ -61,5 +115,32 @@ class Settings:
             cf_account_id=os.getenv("CF_ACCOUNT_ID"),
             kv_namespace=os.getenv("CF_KV_NAMESPACE"),
             r2_bucket=os.getenv("CF_R2_BUCKET"),
+            db_pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "240")),
+            db_prepare_threshold=_optional_int(os.getenv("DB_PREPARE_THRESHOLD", "5")),
+            db_query_cache_size=int(os.getenv("DB_QUERY_CACHE_SIZE", "500")),
+            db_keepalive_interval=float(os.getenv("DB_KEEPALIVE_INTERVAL", "60")),
+            db_warm_connections=int(os.getenv("DB_WARM_CONNECTIONS", "1")),
+            db_echo=os.getenv("DB_ECHO", "0").lower() in ("1", "true", "yes"),
             rate_limit_per_minute=int(os.getenv("RATE_LIMIT_PER_MINUTE", "30")),
+            rate_limit_backend=os.getenv("RATE_LIMIT_BACKEND", "memory"),
+            user_state_backend=os.getenv("USER_STATE_BACKEND", "memory"),
+            fsm_storage=os.getenv("FSM_STORAGE", "memory"),
+            fsm_cache_ttl=float(os.getenv("FSM_CACHE_TTL", "30")),
+            outbound_global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")),
+            outbound_chat_rate=float(os.getenv("OUTBOUND_CHAT_RATE", "1")),
+            update_dedup_backend=os.getenv("UPDATE_DEDUP_BACKEND", "memory"),
+            scheduler_workers=int(os.getenv("SCHEDULER_WORKERS", "16")),
+            scheduler_capacity=int(os.getenv("SCHEDULER_CAPACITY", "1000")),
+            report_worker_concurrency=int(os.getenv("REPORT_WORKER_CONCURRENCY", "4")),
+            report_worker_embedded=os.getenv("REPORT_WORKER_EMBEDDED", "0").lower() not in ("0", "false", "no"),
+            conversation_retention_months=_optional_int(os.getenv("CONVERSATION_RETENTION_MONTHS")),
+            webhook_url=os.getenv("WEBHOOK_URL"),
+            webhook_path=os.getenv("WEBHOOK_PATH", "/webhook"),
+            webhook_secret=os.getenv("WEBHOOK_SECRET"),
+            webhook_queue_size=int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")),
+            webhook_processes=int(os.getenv("WEBHOOK_PROCESSES", "1")),
+            port=int(os.getenv("PORT", "8000")),
         )
@@ -5,12 +5,17 @@ from __future__ import annotations
 
 import asyncio
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncContextManager, AsyncGenerator, Callable
 
-from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from src.config import Settings
+from src.db.engine import PoolKeepalive, create_engine, warm_pool
+
+# Источник коротких сессий (обычно `DatabaseManager.get_session`): сервис берёт
+# сессию только на время запроса к БД и сразу возвращает соединение в пул
+SessionProvider = Callable[[], AsyncContextManager[AsyncSession]]
 
 
 class DatabaseManager:
@@ -20,15 +25,18 @@ class DatabaseManager:
         self.settings = settings
         self.engine: AsyncEngine | None = None
         self.session_factory: sessionmaker[AsyncSession] | None = None
+        self.keepalive: PoolKeepalive | None = None
     
     async def initialize(self) -> None:
         """Инициализация подключения к базе данных."""
-        # Создаём асинхронный движок
-        self.engine = create_async_engine(
-            self.settings.database_url,
-            echo=self.settings.environment == "development",  # Логируем SQL в dev
-            future=True,
-        )
+        # Создаём асинхронный движок (пул и кеши — по настройкам DB_*)
+        self.engine = create_engine(self.settings)
+        
+        if self.engine.dialect.name != "sqlite":
+            # Прогреваем пул и держим соединение живым без pre-ping на каждый запрос
+            await warm_pool(self.engine, self.settings.db_warm_connections)
+            self.keepalive = PoolKeepalive(self.engine, self.settings.db_keepalive_interval)
+            self.keepalive.start()
         
         # Создаём фабрику сессий
         self.session_factory = sessionmaker(
@@ -39,6 +47,8 @@ class DatabaseManager:
     
     async def close(self) -> None:
         """Закрытие подключения к базе данных."""
+        if self.keepalive:
+            await self.keepalive.stop()
         if self.engine:
             await self.engine.dispose()
     
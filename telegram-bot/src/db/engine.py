@@ -0,0 +1,207 @@
+"""src/db/engine.py
+Единая фабрика движков SQLAlchemy с настраиваемым пулом (Neon PostgreSQL).
+
+- Пул задаётся настройками DB_* (размер, overflow, таймаут ожидания,
+  recycle, кеш подготовленных выражений psycopg и кеш компиляции SQLAlchemy).
+- Вместо `pool_pre_ping` (лишний round-trip на каждую выдачу соединения)
+  фоновая задача раз в `db_keepalive_interval` секунд выполняет `SELECT 1`
+  на каждом простаивающем соединении пула, а не только на верхнем (пул
+  работает в режиме LIFO и выдал бы одно и то же): оборванное соединение
+  SQLAlchemy инвалидирует вместе с пулом, и следующие запросы пользователей
+  получают свежие соединения. Между проверками от обрывов страхует
+  `pool_recycle`, он меньше таймаута простоя Neon.
+- `warm_pool` открывает соединения при старте: холодный старт Neon
+  оплачивает процесс, а не первый пользователь.
+- Ожидание соединения из пула и его загрузка экспортируются в метриках
+  `bot_db_pool_*`.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+from src.config import Settings
+from src.services.metrics import gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+POOL_WAIT = histogram(
+    "bot_db_pool_checkout_wait_seconds",
+    "Ожидание соединения из пула БД",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+POOL_CONNECTIONS = gauge("bot_db_pool_connections", "Соединения пула БД по состоянию")
+POOL_SATURATION = gauge("bot_db_pool_saturation", "Доля занятых соединений от максимума пула (0..1)")
+KEEPALIVE_FAILURES = gauge("bot_db_keepalive_failures", "Подряд неудачных проверок соединения с БД")
+
+_POSTGRES_PREFIXES = ("postgresql://", "postgres://")
+_PSYCOPG_PREFIX = "postgresql+psycopg://"
+
+
+def normalize_db_url(url: str) -> str:
+    """Схемы `postgresql://` и `postgres://` перевести на драйвер psycopg3.
+
+    psycopg3 поддерживает и синхронный, и асинхронный режим, поэтому один URL
+    подходит обоим движкам. Иные схемы не трогаем.
+    """
+    for prefix in _POSTGRES_PREFIXES:
+        if url.startswith(prefix):
+            return _PSYCOPG_PREFIX + url[len(prefix):]
+    return url
+
+
+class MonitoredPool(AsyncAdaptedQueuePool):
+    """Очередь соединений, замеряющая ожидание при выдаче соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+def engine_options(settings: Settings) -> Dict[str, Any]:
+    """Параметры движка по настройкам DB_* (общие для async и sync движков)."""
+    url = normalize_db_url(settings.database_url)
+    options: Dict[str, Any] = {
+        "echo": settings.db_echo,
+        "query_cache_size": settings.db_query_cache_size,
+    }
+    if url.startswith("sqlite"):
+        # Локальная БД: пул и keepalive не нужны
+        return options
+
+    options.update(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_use_lifo=True,
+        pool_pre_ping=False,
+    )
+    if url.startswith(_PSYCOPG_PREFIX):
+        # None отключает серверные подготовленные выражения (PgBouncer в старом режиме)
+        options["connect_args"] = {"prepare_threshold": settings.db_prepare_threshold}
+    return options
+
+
+def create_engine(settings: Settings) -> AsyncEngine:
+    """Асинхронный движок приложения с метриками пула."""
+    url = normalize_db_url(settings.database_url)
+    options = engine_options(settings)
+    if "pool_size" in options:
+        options["poolclass"] = MonitoredPool
+    engine = create_async_engine(url, **options)
+    _export_pool_metrics(engine.pool, settings.db_pool_size + settings.db_max_overflow)
+    return engine
+
+
+def _export_pool_metrics(pool: Pool, capacity: int) -> None:
+    if not isinstance(pool, MonitoredPool):
+        return
+
+    def connections():
+        return [
+            ({"state": "checked_out"}, pool.checkedout()),
+            ({"state": "idle"}, pool.checkedin()),
+            ({"state": "overflow"}, max(0, pool.overflow())),
+        ]
+
+    def saturation():
+        return [({}, pool.checkedout() / capacity if capacity else 0.0)]
+
+    POOL_CONNECTIONS.set_collector(connections)
+    POOL_SATURATION.set_collector(saturation)
+
+
+async def warm_pool(engine: AsyncEngine, connections: int) -> int:
+    """Открыть до `connections` соединений заранее. Возвращает число открытых."""
+    if connections <= 0:
+        return 0
+
+    async def open_one():
+        connection = await engine.connect().start()
+        try:
+            await connection.execute(text("SELECT 1"))
+        except BaseException:
+            await connection.close()
+            raise
+        return connection
+
+    # Соединения держатся одновременно, иначе пул выдал бы одно и то же
+    results = await asyncio.gather(*(open_one() for _ in range(connections)), return_exceptions=True)
+    opened = 0
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.warning("Не удалось прогреть соединение с БД: %s", result)
+            continue
+        opened += 1
+        await result.close()
+    return opened
+
+
+class PoolKeepalive:
+    """Фоновая проверка соединения с БД вместо pre-ping на каждую выдачу."""
+
+    def __init__(self, engine: AsyncEngine, interval: float) -> None:
+        self.engine = engine
+        self.interval = interval
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def ping(self) -> bool:
+        """`SELECT 1` на каждом простаивающем соединении; при обрыве SQLAlchemy сам инвалидирует пул."""
+        try:
+            await self._ping_idle()
+        except Exception as e:  # noqa: BLE001
+            self.failures += 1
+            logger.warning("Проверка соединения с БД не удалась (%d подряд): %s", self.failures, e)
+            KEEPALIVE_FAILURES.set(self.failures)
+            return False
+        self.failures = 0
+        KEEPALIVE_FAILURES.set(0)
+        return True
+
+    async def _ping_idle(self) -> None:
+        checkedin = getattr(self.engine.pool, "checkedin", None)
+        idle = max(1, checkedin()) if checkedin is not None else 1
+        connections = []
+        try:
+            # Соединения держатся одновременно, иначе пул выдал бы одно и то же
+            for _ in range(idle):
+                connections.append(await self.engine.connect().start())
+            results = await asyncio.gather(
+                *(connection.execute(text("SELECT 1")) for connection in connections),
+                return_exceptions=True,
+            )
+        finally:
+            for connection in connections:
+                await connection.close()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.ping()
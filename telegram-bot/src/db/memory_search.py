@@ -0,0 +1,77 @@
+"""src/db/memory_search.py
+Полнотекстовый индекс Memory Bank.
+
+PostgreSQL: генерируемая колонка `memory.search_vector` (конфигурация
+`russian`; веса: заголовок A, теги B, текст C) и составные GIN-индексы
+`(user_id, search_vector)`, `(user_id, title/tags gin_trgm_ops)` —
+поиск по воспоминаниям одного пользователя не просматривает чужие строки.
+В production их создаёт миграция Alembic; DDL ниже повторяет её для
+`SQLModel.metadata.create_all` при локальной разработке.
+
+SQLite (локальные тесты): внешняя FTS5-таблица `memory_fts` поверх
+`memory`, синхронизируемая триггерами.
+"""
+from __future__ import annotations
+
+import re
+from typing import List
+
+from sqlalchemy import DDL, Table, event, literal_column
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+SEARCH_CONFIG = "russian"
+
+# Колонка не объявлена в модели: её значение вычисляет сама БД
+search_vector = literal_column("memory.search_vector", type_=TSVECTOR)
+search_config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+
+POSTGRES_DDL: List[str] = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    f"""ALTER TABLE memory ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(tags, '')), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'C')
+    ) STORED""",
+    "CREATE INDEX ix_memory_user_search ON memory USING gin (user_id, search_vector)",
+    "CREATE INDEX ix_memory_user_title_trgm ON memory USING gin (user_id, title gin_trgm_ops)",
+    "CREATE INDEX ix_memory_user_tags_trgm ON memory USING gin (user_id, tags gin_trgm_ops)",
+]
+
+SQLITE_DDL: List[str] = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS memory_fts USING fts5(
+        title, content, tags,
+        content='memory', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER memory_fts_ai AFTER INSERT ON memory BEGIN
+        INSERT INTO memory_fts(rowid, title, content, tags)
+        VALUES (new.id, new.title, new.content, new.tags);
+    END""",
+    """CREATE TRIGGER memory_fts_ad AFTER DELETE ON memory BEGIN
+        INSERT INTO memory_fts(memory_fts, rowid, title, content, tags)
+        VALUES ('delete', old.id, old.title, old.content, old.tags);
+    END""",
+    """CREATE TRIGGER memory_fts_au AFTER UPDATE OF title, content, tags ON memory BEGIN
+        INSERT INTO memory_fts(memory_fts, rowid, title, content, tags)
+        VALUES ('delete', old.id, old.title, old.content, old.tags);
+        INSERT INTO memory_fts(rowid, title, content, tags)
+        VALUES (new.id, new.title, new.content, new.tags);
+    END""",
+]
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def fts5_query(text: str) -> str:
+    """Текст пользователя → безопасный запрос FTS5: слова в кавычках с поиском по префиксу."""
+    return " ".join(f'"{word}"*' for word in _WORD.findall(text))
+
+
+def install_search_ddl(table: Table) -> None:
+    """Навесить создание поискового индекса на `CREATE TABLE memory`."""
+    for statement in POSTGRES_DDL:
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+    for statement in SQLITE_DDL:
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    event.listen(table, "before_drop", DDL("DROP TABLE IF EXISTS memory_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,116 @@
+"""src/db/message_partitions.py
+Помесячные партиции таблицы `message` (только PostgreSQL).
+
+Миграция Alembic делает `message` секционированной по `created_at`
+(`PARTITION BY RANGE`) с партицией DEFAULT для строк вне созданных
+месяцев. Здесь — обслуживание: заранее создать партиции на ближайшие
+месяцы и целиком удалить месяцы старше срока хранения (`DROP TABLE`
+вместо `DELETE` без раздувания таблицы и нагрузки на автовакуум).
+
+На других СУБД и на несекционированной `message` (локальная разработка
+через `create_all`) функции ничего не делают.
+"""
+from __future__ import annotations
+
+import logging
+import re
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_TABLE = "message"
+DEFAULT_PARTITION = "message_default"
+MONTHS_AHEAD = 2
+
+_PARTITION_NAME = re.compile(r"^message_y(\d{4})m(\d{2})$")
+
+
+def month_start(moment: datetime, shift: int = 0) -> datetime:
+    """Начало месяца `moment`, сдвинутого на `shift` месяцев (без часового пояса, как в колонке)."""
+    index = moment.year * 12 + moment.month - 1 + shift
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"message_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> datetime | None:
+    """Месяц партиции по её имени; None — не помесячная партиция."""
+    match = _PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1)
+
+
+def partition_ddl(month: datetime) -> str:
+    upper = month_start(month, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {MESSAGE_TABLE} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+    )
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    kind = await conn.scalar(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": MESSAGE_TABLE},
+    )
+    return kind == "p"
+
+
+async def list_partitions(conn: AsyncConnection) -> List[Tuple[str, datetime]]:
+    """Помесячные партиции `message`: (имя, начало месяца), по возрастанию."""
+    names = await conn.scalars(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(:table)"
+        ),
+        {"table": MESSAGE_TABLE},
+    )
+    months = [(name, partition_month(name)) for name in names]
+    return sorted((name, month) for name, month in months if month is not None)
+
+
+async def ensure_message_partitions(
+    conn: AsyncConnection, now: datetime, months_ahead: int = MONTHS_AHEAD
+) -> List[str]:
+    """Создать партиции с текущего месяца на `months_ahead` вперёд. Возвращает имена созданных."""
+    if not await is_partitioned(conn):
+        return []
+    existing = {name for name, _ in await list_partitions(conn)}
+    created = []
+    for shift in range(months_ahead + 1):
+        month = month_start(now, shift)
+        if partition_name(month) in existing:
+            continue
+        # Строки этого месяца, попавшие в DEFAULT, не дают создать партицию —
+        # такое бывает, только если обслуживание долго не запускалось
+        await conn.execute(text(partition_ddl(month)))
+        created.append(partition_name(month))
+    if created:
+        logger.info("Созданы партиции message: %s", ", ".join(created))
+    return created
+
+
+async def drop_expired_message_partitions(conn: AsyncConnection, now: datetime, keep_months: int) -> List[str]:
+    """Удалить партиции месяцев старше `keep_months` (текущий месяц считается). Возвращает имена удалённых."""
+    if keep_months < 1 or not await is_partitioned(conn):
+        return []
+    oldest_kept = month_start(now, 1 - keep_months)
+    dropped = []
+    for name, month in await list_partitions(conn):
+        if month >= oldest_kept:
+            break
+        await conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    if dropped:
+        logger.info("Удалены партиции message старше %s: %s", f"{oldest_kept:%Y-%m}", ", ".join(dropped))
+    return dropped
@@ -8,8 +8,12 @@ from datetime import date, datetime, timezone
 from enum import Enum
 from typing import Optional
 
+from sqlalchemy import JSON, BigInteger, Column, Index, LargeBinary, String
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import Field, SQLModel
 
+from src.db.memory_search import install_search_ddl
+
 
 class ReportStatus(str, Enum):
     PENDING = "pending"
@@ -29,20 +33,34 @@ class User(SQLModel, table=True):
 
 
 class Dialog(SQLModel, table=True):
+    # Последний диалог пользователя — обратный проход по индексу
+    __table_args__ = (Index("ix_dialog_user_id_id", "user_id", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="user.id", index=True)
+    user_id: int = Field(foreign_key="user.id")
     started_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class Message(SQLModel, table=True):
+    # Последние K сообщений диалога и постраничная история по (dialog_id, id).
+    # В PostgreSQL таблица секционирована по месяцам created_at (см. миграцию
+    # и src/db/message_partitions.py), первичный ключ там — (id, created_at)
+    __table_args__ = (Index("ix_message_dialog_id_id", "dialog_id", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    dialog_id: int = Field(foreign_key="dialog.id", index=True)
+    dialog_id: int = Field(foreign_key="dialog.id")
     role: str = Field(description="user|assistant")
     content: str = Field(description="Текст сообщения")
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class ReportRequest(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_reportrequest_status_run_after", "status", "run_after"),
+        # Повторный такой же анализ пользователя обновляет строку, а не добавляет новую
+        Index("ux_reportrequest_user_id_content_hash", "user_id", "content_hash", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", index=True)
 
@@ -53,12 +71,42 @@ class ReportRequest(SQLModel, table=True):
     # Технические поля
     status: ReportStatus = Field(default=ReportStatus.PENDING)
     result_text: Optional[str] = Field(default=None, description="Готовый текстовый отчет")
+    result_json: Optional[dict] = Field(
+        default=None,
+        sa_column=Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True),
+        description="Структурированный результат анализа; отчёт строится из него при чтении",
+    )
+    content_hash: Optional[str] = Field(
+        default=None,
+        sa_column=Column(String(64), nullable=True),
+        description="sha256 нормализованных (дата рождения, имя латиницей)",
+    )
     error: Optional[str] = Field(default=None, description="Текст ошибки, если возникла")
 
+    # Очередь генерации (ReportQueue)
+    chat_id: Optional[int] = Field(
+        default=None,
+        sa_column=Column(BigInteger, nullable=True),
+        description="Чат, куда доставить отчёт",
+    )
+    attempts: int = Field(default=0, description="Число попыток генерации")
+    run_after: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        description="Не раньше этого времени (задержка повтора)",
+    )
+    locked_until: Optional[datetime] = Field(
+        default=None,
+        description="Таймаут видимости: после него заявку может забрать другой воркер",
+    )
+
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
+# Анализы пользователя по курсору: порядок выдачи совпадает с индексом
+Index("ix_reportrequest_user_id_created_at", ReportRequest.user_id, ReportRequest.created_at.desc(), ReportRequest.id)
+
+
 class NameTransliteration(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", index=True)
@@ -83,7 +131,7 @@ class Memory(SQLModel, table=True):
     
     # Метаданные
     importance: int = Field(default=1, description="Важность от 1 до 10")
-    tags: Optional[str] = Field(default=None, description="Теги через запятую")
+    tags: Optional[str] = Field(default=None, description="Теги через запятую (для показа; запросы — по memory_tag)")
     
     # Временные метки
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -91,7 +139,53 @@ class Memory(SQLModel, table=True):
     last_accessed: Optional[datetime] = Field(default=None, description="Последний доступ к памяти")
     
     # Связи
-    related_memories: Optional[str] = Field(default=None, description="ID связанных воспоминаний через запятую")
+    related_memories: Optional[str] = Field(
+        default=None, description="ID связанных воспоминаний через запятую (для показа; запросы — по memory_link)"
+    )
+
+
+# Список воспоминаний пользователя по курсору: порядок выдачи совпадает с индексом
+Index(
+    "ix_memory_user_id_importance_updated_at",
+    Memory.user_id,
+    Memory.importance.desc(),
+    Memory.updated_at.desc(),
+    Memory.id,
+)
+
+# Полнотекстовый индекс (tsvector/pg_trgm или FTS5) создаётся вместе с таблицей
+install_search_ddl(Memory.__table__)
+
+
+class MemoryTag(SQLModel, table=True):
+    """Тег воспоминания (нормализованный: без пробелов по краям, в нижнем регистре)."""
+    __tablename__ = "memory_tag"
+    __table_args__ = (Index("ix_memory_tag_user_tag", "user_id", "tag", "memory_id"),)
+
+    memory_id: int = Field(foreign_key="memory.id", primary_key=True)
+    tag: str = Field(primary_key=True)
+    # Копия Memory.user_id: фильтр по тегу не читает саму таблицу memory
+    user_id: int = Field(foreign_key="user.id")
+
+
+class MemoryLink(SQLModel, table=True):
+    """Связь между воспоминаниями одного пользователя (обходится в обе стороны)."""
+    __tablename__ = "memory_link"
+    __table_args__ = (Index("ix_memory_link_target_source", "target_id", "source_id"),)
+
+    source_id: int = Field(foreign_key="memory.id", primary_key=True)
+    target_id: int = Field(foreign_key="memory.id", primary_key=True)
+
+
+class MemoryStats(SQLModel, table=True):
+    """Счётчики Memory Bank пользователя (поддерживаются MemoryBankService)."""
+    __tablename__ = "memory_stats"
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    total: int = Field(default=0, description="Всего воспоминаний")
+    by_type: str = Field(default="{}", description="Количество по типам (JSON)")
+    recent: str = Field(default="[]", description="Последние изменённые воспоминания (JSON)")
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class MemoryAccess(SQLModel, table=True):
@@ -104,3 +198,42 @@ class MemoryAccess(SQLModel, table=True):
     context: Optional[str] = Field(default=None, description="Контекст доступа")
     
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class RateLimitBucket(SQLModel, table=True):
+    """Общее ведро токенов лимитера запросов (для нескольких воркеров)."""
+    __tablename__ = "rate_limit_bucket"
+
+    key: str = Field(primary_key=True, description="Ключ ведра (ID пользователя)")
+    tokens: float = Field(description="Остаток токенов")
+    updated_at: float = Field(index=True, description="Время последнего пополнения (epoch, сек)")
+
+
+class UserState(SQLModel, table=True):
+    """Состояние пользователя в общем хранилище (UserStateStore)."""
+    __tablename__ = "user_state"
+
+    key: str = Field(primary_key=True, description="Пространство имён и ID пользователя")
+    value: bytes = Field(sa_column=Column(LargeBinary, nullable=False), description="Компактный JSON")
+    expires_at: float = Field(index=True, description="Время истечения (epoch, сек)")
+
+
+class FsmState(SQLModel, table=True):
+    """Состояние и данные FSM aiogram (PostgresFSMStorage)."""
+    __tablename__ = "fsm_state"
+
+    key: str = Field(primary_key=True, description="Ключ FSM (бот, чат, пользователь, destiny)")
+    state: Optional[str] = Field(default=None, description="Текущее состояние сценария")
+    data: str = Field(default="{}", description="Данные сценария (JSON)")
+    expires_at: float = Field(index=True, description="Время истечения (epoch, сек)")
+
+
+class ProcessedUpdate(SQLModel, table=True):
+    """Обработанный апдейт Telegram (дедупликация повторных доставок)."""
+    __tablename__ = "processed_update"
+
+    update_id: int = Field(
+        sa_column=Column(BigInteger, primary_key=True, autoincrement=False),
+        description="update_id из Telegram",
+    )
+    seen_at: float = Field(index=True, description="Время первого получения (epoch, сек)")
@@ -4,6 +4,7 @@
 from __future__ import annotations
 
 import json
+from collections import deque
 from typing import Dict, List, Any
 from aiogram import Router, types
 from aiogram.filters import CommandStart
@@ -11,12 +12,16 @@ from aiogram.filters.callback_data import CallbackData
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
 from src.services.openai_context_service import OpenAIContextService
+from src.services.memory_bank_service import MemoryBankService
+from src.services.response_handle import ResponseHandle
 from src.config import Settings
 from src.db.connection import get_db_manager
 from src.services.analytics.chs import calc_chs
 from src.services.analytics.chd import calc_chd
 from src.services.analytics.name_number import calc_name_number
 from src.services.analytics.matrix import build_matrix
+from src.services.user_state_store import get_user_state_store
+from src.services.conversation_repository import get_conversation_repository
 from datetime import datetime
 
 router = Router()
@@ -47,20 +52,29 @@ data_management_keyboard = InlineKeyboardMarkup(
     ]
 )
 
+# Контекст хранится кольцевым буфером: 20 сообщений (10 пар)
+CONTEXT_MAX_MESSAGES = 20
+
+# Состояние пользователей: ограниченный L1 в памяти + общее хранилище (USER_STATE_BACKEND)
+state_store = get_user_state_store()
+
 # Хранилище контекста для каждого пользователя
-user_contexts: Dict[int, List[Dict[str, Any]]] = {}
+user_contexts = state_store.namespace("contexts", ring_size=CONTEXT_MAX_MESSAGES)
+
+# История диалогов в БД: пишется в фоне, контекст восстанавливается из неё после перезапуска
+conversations = get_conversation_repository()
 
 # Хранилище данных пользователей (имя, дата рождения)
-user_data: Dict[int, Dict[str, str]] = {}
+user_data = state_store.namespace("user_data")
 
 # Хранилище дополнительных данных для совместимости
-additional_data: Dict[int, List[Dict[str, str]]] = {}
+additional_data = state_store.namespace("additional_data")
 
 # Хранилище закрепленных сообщений
-pinned_messages: Dict[int, int] = {}
+pinned_messages = state_store.namespace("pinned_messages")
 
 # Флаг что данные только что обновлены
-data_just_updated: Dict[int, bool] = {}
+data_just_updated = state_store.namespace("data_just_updated")
 
 # Приветственное сообщение
 WELCOME_MESSAGE = """🌟 ПРИВЕТ! Я ТВОЙ ЦИФРОВОЙ ПСИХОЛОГ ПО СИСТЕМЕ МИЛАНЫ ТАРБА.
@@ -90,7 +104,8 @@ async def on_start(message: types.Message) -> None:
         del user_contexts[user_id]
     
     # Инициализируем новый контекст
-    user_contexts[user_id] = []
+    user_contexts[user_id] = deque(maxlen=CONTEXT_MAX_MESSAGES)
+    conversations.start_dialog(user_id)
     
     # Проверяем, есть ли уже ВАЛИДНЫЕ данные пользователя
     if user_id in user_data and _has_valid_user_data(user_id):
@@ -139,29 +154,6 @@ async def show_help(message: types.Message) -> None:
     await message.answer(help_text)
 
 
-async def send_typing_status(message: types.Message) -> None:
-    """Отправляет индикатор печати."""
-    try:
-        await message.bot.send_chat_action(message.chat.id, "typing")
-    except Exception:
-        pass  # Игнорируем ошибки при отправке статуса
-
-async def send_status_message(message: types.Message, status_text: str) -> types.Message:
-    """Отправляет статусное сообщение о процессе."""
-    try:
-        status_msg = await message.answer(f"⏳ {status_text}")
-        return status_msg
-    except Exception:
-        return None
-
-async def update_status_message(status_msg: types.Message, new_text: str) -> None:
-    """Обновляет статусное сообщение."""
-    try:
-        if status_msg:
-            await status_msg.edit_text(f"⏳ {new_text}")
-    except Exception:
-        pass  # Игнорируем ошибки при обновлении
-
 def is_additional_data(message_text: str, user_id: int) -> bool:
     """Проверяет, является ли сообщение дополнительными данными для совместимости."""
     if user_id not in user_data:
@@ -328,32 +320,14 @@ async def handle_data_input(message: types.Message) -> bool:
         name = lines[0]
         birth_date = lines[1]
         
-        # Отправляем индикатор печати
-        await send_typing_status(message)
-        
-        # Отправляем статусное сообщение
-        status_msg = await send_status_message(message, "Проверяю и сохраняю ваши данные...")
-        
         # Валидируем данные
         if await validate_and_save_data(message, name, birth_date):
-            # Удаляем статусное сообщение
-            try:
-                if status_msg:
-                    await status_msg.delete()
-            except Exception:
-                pass
             return True
     
     elif len(lines) == 1:
         # Пользователь ввел что-то в одной строке
         text = lines[0]
         
-        # Отправляем индикатор печати
-        await send_typing_status(message)
-        
-        # Отправляем статусное сообщение
-        status_msg = await send_status_message(message, "Проверяю введенные данные...")
-        
         # Проверяем, является ли это комбинированным вводом "Имя Дата" или "Дата Имя"
         parts = text.split()
         if len(parts) >= 2:
@@ -365,12 +339,6 @@ async def handle_data_input(message: types.Message) -> bool:
                 if is_name_format(name) and is_date_format(date):
                     # Это комбинированный ввод "Имя Дата"
                     if await validate_and_save_data(message, name, date):
-                        # Удаляем статусное сообщение
-                        try:
-                            if status_msg:
-                                await status_msg.delete()
-                        except Exception:
-                            pass
                         return True
                     break
                 
@@ -381,12 +349,6 @@ async def handle_data_input(message: types.Message) -> bool:
                     if is_date_format(date) and is_name_format(name):
                         # Это комбинированный ввод "Дата Имя"
                         if await validate_and_save_data(message, name, date):
-                            # Удаляем статусное сообщение
-                            try:
-                                if status_msg:
-                                    await status_msg.delete()
-                            except Exception:
-                                pass
                             return True
                         break
         
@@ -396,14 +358,6 @@ async def handle_data_input(message: types.Message) -> bool:
             if user_id not in user_data:
                 user_data[user_id] = {}
             user_data[user_id]["birth_date"] = text
-            
-            # Удаляем статусное сообщение
-            try:
-                if status_msg:
-                    await status_msg.delete()
-            except Exception:
-                pass
-            
             await message.answer("✅ Дата рождения сохранена! Теперь введите ваше имя (только на английском):")
             return True
         
@@ -413,14 +367,6 @@ async def handle_data_input(message: types.Message) -> bool:
             if user_id not in user_data:
                 user_data[user_id] = {}
             user_data[user_id]["name"] = text
-            
-            # Удаляем статусное сообщение
-            try:
-                if status_msg:
-                    await status_msg.delete()
-            except Exception:
-                pass
-            
             await message.answer("✅ Имя сохранено! Теперь введите дату рождения (dd.mm.yyyy):")
             return True
     
@@ -532,9 +478,10 @@ async def process_message(message: types.Message) -> None:
     user_id = message.from_user.id
     user_message = message.text.strip()
     
-    # Инициализируем контекст если его нет
+    # Инициализируем контекст если его нет: последние сообщения текущего диалога из БД
     if user_id not in user_contexts:
-        user_contexts[user_id] = []
+        recent = await conversations.load_recent(user_id, CONTEXT_MAX_MESSAGES)
+        user_contexts[user_id] = deque(recent, maxlen=CONTEXT_MAX_MESSAGES)
     
     # Проверяем, вводит ли пользователь данные
     if await handle_data_input(message):
@@ -560,30 +507,30 @@ async def process_message(message: types.Message) -> None:
         "role": "user",
         "content": user_message
     })
+    conversations.append(user_id, "user", user_message)
     
-    try:
-        # Получаем настройки
-        settings = Settings.from_env()
-        
-        # Получаем сессию БД
-        db_manager = get_db_manager()
-        async with db_manager.get_session() as session:
-            # Создаем сервис OpenAI
+    # Одно сообщение-заглушка на весь ответ; индикатор печати обновляется в фоне
+    async with ResponseHandle(message.bot, message.chat.id) as response_handle:
+        try:
+            # Получаем настройки
+            settings = Settings.from_env()
+            
+            # Сервис OpenAI берёт сессию БД только на время запросов к ней:
+            # соединение не занято, пока модель генерирует ответ
+            db_manager = get_db_manager()
             openai_service = OpenAIContextService(
                 api_key=settings.openai_api_key,
-                db_session=session
+                session_provider=db_manager.get_session,
+                memory_service=MemoryBankService(db_manager),
             )
             
-            # Отправляем индикатор печати
-            await send_typing_status(message)
-            
-            # Отправляем статусное сообщение
-            status_msg = await send_status_message(message, "Анализирую ваш запрос...")
+            # Показываем статус
+            await response_handle.status("Анализирую ваш запрос...")
             
             # Проверяем, являются ли данные дополнительными для совместимости
             if is_additional_data(user_message, user_id):
                 # Обновляем статус
-                await update_status_message(status_msg, "Сохраняю дополнительные данные для сравнения...")
+                await response_handle.status("Сохраняю дополнительные данные для сравнения...")
                 
                 # Сохраняем дополнительные данные
                 additional_info = extract_additional_data(user_message)
@@ -602,52 +549,29 @@ async def process_message(message: types.Message) -> None:
                 enhanced_message = f"Пользователь: {user_message}\n\nДанные пользователя:\nИмя: {user_data_info['name']}\nДата рождения: {user_data_info['birth_date']}\nЧС: {analytics.get('chs', 'N/A')}\nЧД: {analytics.get('chd', 'N/A')}\nЧИ: {analytics.get('name_number', 'N/A')}\nМатрица энергий: {analytics.get('matrix_energies', {})}"
             
             
-            # Обновляем статус
-            await update_status_message(status_msg, "Обрабатываю запрос через ИИ...")
+            # Обновляем статус (частые правки схлопываются)
+            await response_handle.status("Обрабатываю запрос через ИИ...")
             
             # Обрабатываем сообщение
             response = await openai_service.process_message(
                 user_message=enhanced_message,
                 user_id=user_id,
-                context=user_contexts[user_id]
+                context=list(user_contexts[user_id])
             )
             
-            # Удаляем статусное сообщение
-            try:
-                if status_msg:
-                    await status_msg.delete()
-            except Exception:
-                pass
-            
-            # Добавляем ответ бота в контекст
+            # Добавляем ответ бота в контекст (старые сообщения вытесняются буфером)
             user_contexts[user_id].append({
                 "role": "assistant",
                 "content": response
             })
+            conversations.append(user_id, "assistant", response)
             
-            # Ограничиваем контекст 20 сообщениями (10 пар)
-            if len(user_contexts[user_id]) > 20:
-                user_contexts[user_id] = user_contexts[user_id][-20:]
-            
-            # Отправляем ответ с Markdown форматированием
-            await message.answer(response, parse_mode="Markdown")
-    
-    except Exception as e:
-        # Отправляем индикатор печати
-        await send_typing_status(message)
-        
-        # Отправляем статусное сообщение об ошибке
-        status_msg = await send_status_message(message, "Произошла ошибка, обрабатываю...")
-        
-        # Удаляем статусное сообщение
-        try:
-            if status_msg:
-                await status_msg.delete()
-        except Exception:
-            pass
+            # Вписываем ответ в заглушку; не поместившееся уходит следующими сообщениями
+            await response_handle.finish(response)
         
-        error_message = f"❌ Извините, произошла ошибка: {str(e)}"
-        await message.answer(error_message)
+        except Exception as e:
+            error_message = f"❌ Извините, произошла ошибка: {str(e)}"
+            await response_handle.finish(error_message, markdown=False)
 
 
 # Обработчики кнопок
@@ -658,9 +582,6 @@ async def handle_input_data(callback_query: types.CallbackQuery) -> None:
     
     user_id = callback_query.from_user.id
     
-    # Отправляем статусное сообщение
-    status_msg = await send_status_message(callback_query.message, "Подготавливаю форму ввода данных...")
-    
     # Удаляем предыдущее закрепленное сообщение с данными, если есть
     if user_id in pinned_messages and user_id in user_data:
         try:
@@ -672,13 +593,6 @@ async def handle_input_data(callback_query: types.CallbackQuery) -> None:
             pass
         del pinned_messages[user_id]
     
-    # Удаляем статусное сообщение
-    try:
-        if status_msg:
-            await status_msg.delete()
-    except Exception:
-        pass
-    
     # Отправляем инструкции по вводу данных
     instruction_message = """📝 **Введите ваши данные:**
 
@@ -717,9 +631,6 @@ async def handle_update_data(callback_query: types.CallbackQuery) -> None:
     
     user_id = callback_query.from_user.id
     
-    # Отправляем статусное сообщение
-    status_msg = await send_status_message(callback_query.message, "Обновляю данные...")
-    
     # Очищаем ВСЕ данные пользователя
     if user_id in user_data:
         del user_data[user_id]
@@ -733,13 +644,6 @@ async def handle_update_data(callback_query: types.CallbackQuery) -> None:
     if user_id in pinned_messages:
         del pinned_messages[user_id]
     
-    # Удаляем статусное сообщение
-    try:
-        if status_msg:
-            await status_msg.delete()
-    except Exception:
-        pass
-    
     # Показываем приветствие с кнопкой ввода данных
     await callback_query.message.answer(
         WELCOME_MESSAGE,
@@ -754,19 +658,9 @@ async def handle_clear_additional(callback_query: types.CallbackQuery) -> None:
     
     user_id = callback_query.from_user.id
     
-    # Отправляем статусное сообщение
-    status_msg = await send_status_message(callback_query.message, "Очищаю дополнительные данные...")
-    
     # Очищаем дополнительные данные
     clear_additional_data(user_id)
     
-    # Удаляем статусное сообщение
-    try:
-        if status_msg:
-            await status_msg.delete()
-    except Exception:
-        pass
-    
     # Показываем данные пользователя
     await show_user_data_message(callback_query.message)
 
@@ -913,7 +807,7 @@ async def show_user_data_message(message: types.Message) -> None:
 
 def get_user_context(user_id: int) -> List[Dict[str, Any]]:
     """Получить контекст пользователя."""
-    return user_contexts.get(user_id, [])
+    return list(user_contexts.get(user_id, []))
 
 
 def clear_user_context(user_id: int) -> None:
@@ -4,22 +4,55 @@
 from __future__ import annotations
 
 import logging
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 
 from aiogram import Router, F
 from aiogram.filters import Command, CommandStart
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from src.services.memory_bank_service import MemoryBankService
-from src.db.connection import DatabaseManager
+from src.services.memory_bank_service import MemoryBankService, MemoryCursor
+from src.db.connection import get_db_manager
 
 logger = logging.getLogger(__name__)
 
 router = Router()
 
 
+MEMORIES_PAGE_SIZE = 10
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class MemoryPage(CallbackData, prefix="memory_page"):
+    """Кнопка следующей страницы списка: курсор последнего показанного воспоминания.
+    
+    `updated_at` — в микросекундах от эпохи (UTC): callback_data ограничены 64 байтами.
+    """
+    importance: int
+    updated: int
+    id: int
+    shown: int
+    
+    @classmethod
+    def from_cursor(cls, cursor: MemoryCursor, shown: int) -> "MemoryPage":
+        importance, updated_at, memory_id = cursor
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return cls(
+            importance=importance,
+            updated=(updated_at - _EPOCH) // timedelta(microseconds=1),
+            id=memory_id,
+            shown=shown,
+        )
+    
+    def to_cursor(self) -> MemoryCursor:
+        return self.importance, _EPOCH + timedelta(microseconds=self.updated), self.id
+
+
 class MemoryStates(StatesGroup):
     """Состояния для работы с воспоминаниями."""
     waiting_for_title = State()
@@ -175,7 +208,7 @@ async def process_tags(message: Message, state: FSMContext):
     data = await state.get_data()
     
     # Создаем воспоминание
-    db_manager = DatabaseManager()
+    db_manager = get_db_manager()
     memory_service = MemoryBankService(db_manager)
     
     try:
@@ -223,7 +256,7 @@ async def process_search(message: Message, state: FSMContext):
     """Обработать поисковый запрос."""
     query = message.text.strip()
     
-    db_manager = DatabaseManager()
+    db_manager = get_db_manager()
     memory_service = MemoryBankService(db_manager)
     
     try:
@@ -254,35 +287,62 @@ async def process_search(message: Message, state: FSMContext):
         await message.answer("❌ Ошибка при поиске воспоминаний.")
 
 
+async def render_memories_page(
+    user_id: int,
+    after: Optional[MemoryCursor] = None,
+    shown: int = 0,
+) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Текст страницы списка воспоминаний и клавиатура перехода к следующей."""
+    memory_service = MemoryBankService(get_db_manager())
+    memories, next_cursor = await memory_service.get_user_memories_page(
+        user_id, after=after, limit=MEMORIES_PAGE_SIZE
+    )
+    
+    if not memories:
+        return "❌ У вас пока нет воспоминаний.", None
+    
+    result_text = "📋 **Ваши воспоминания**\n\n"
+    
+    for i, memory in enumerate(memories, shown + 1):
+        result_text += (
+            f"{i}. **{memory.title}**\n"
+            f"   📂 {memory.memory_type} | ⭐ {memory.importance}/10\n"
+            f"   📝 {memory.content[:100]}{'...' if len(memory.content) > 100 else ''}\n"
+            f"   🆔 ID: {memory.id}\n\n"
+        )
+    
+    buttons = []
+    if next_cursor is not None:
+        next_page = MemoryPage.from_cursor(next_cursor, shown + len(memories))
+        buttons.append(InlineKeyboardButton(text="➡️ Дальше", callback_data=next_page.pack()))
+    if after is not None:
+        buttons.append(InlineKeyboardButton(text="⏮ В начало", callback_data="memory_list"))
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+    return result_text, keyboard
+
+
 @router.callback_query(F.data == "memory_list")
 async def list_memories(callback: CallbackQuery):
-    """Показать список воспоминаний."""
+    """Показать список воспоминаний (первая страница)."""
     await callback.answer()
-    
-    db_manager = DatabaseManager()
-    memory_service = MemoryBankService(db_manager)
-    
+    await _show_memories_page(callback)
+
+
+@router.callback_query(MemoryPage.filter())
+async def list_memories_page(callback: CallbackQuery, callback_data: MemoryPage):
+    """Показать следующую страницу списка воспоминаний."""
+    await callback.answer()
+    await _show_memories_page(callback, callback_data.to_cursor(), callback_data.shown)
+
+
+async def _show_memories_page(
+    callback: CallbackQuery,
+    after: Optional[MemoryCursor] = None,
+    shown: int = 0,
+) -> None:
     try:
-        memories = await memory_service.get_user_memories(
-            user_id=callback.from_user.id,
-            limit=10
-        )
-        
-        if not memories:
-            await callback.message.edit_text("❌ У вас пока нет воспоминаний.")
-            return
-        
-        result_text = "📋 **Ваши воспоминания**\n\n"
-        
-        for i, memory in enumerate(memories, 1):
-            result_text += (
-                f"{i}. **{memory.title}**\n"
-                f"   📂 {memory.memory_type} | ⭐ {memory.importance}/10\n"
-                f"   📝 {memory.content[:100]}{'...' if len(memory.content) > 100 else ''}\n"
-                f"   🆔 ID: {memory.id}\n\n"
-            )
-        
-        await callback.message.edit_text(result_text, parse_mode="Markdown")
+        result_text, keyboard = await render_memories_page(callback.from_user.id, after, shown)
+        await callback.message.edit_text(result_text, reply_markup=keyboard, parse_mode="Markdown")
         
     except Exception as e:
         logger.error(f"Ошибка получения списка воспоминаний: {e}")
@@ -294,7 +354,7 @@ async def show_stats(callback: CallbackQuery):
     """Показать статистику воспоминаний."""
     await callback.answer()
     
-    db_manager = DatabaseManager()
+    db_manager = get_db_manager()
     memory_service = MemoryBankService(db_manager)
     
     try:
@@ -332,7 +392,12 @@ async def cancel_memory_operation(callback: CallbackQuery, state: FSMContext):
 @router.message(Command("memories"))
 async def quick_memories_list(message: Message):
     """Быстрый список воспоминаний."""
-    await list_memories(message)
+    try:
+        result_text, keyboard = await render_memories_page(message.from_user.id)
+        await message.answer(result_text, reply_markup=keyboard, parse_mode="Markdown")
+    except Exception as e:
+        logger.error(f"Ошибка получения списка воспоминаний: {e}")
+        await message.answer("❌ Ошибка при получении списка воспоминаний.")
 
 
 @router.message(Command("memsearch"))
@@ -2,18 +2,20 @@
 Обработчик /start: приветствие и запрос входных данных согласно спецификации.
 """
 from __future__ import annotations
-import asyncio
+from datetime import date
+from typing import Optional
 
-from aiogram import Router, types
+from aiogram import Bot, Router, types
 from aiogram.filters import CommandStart
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.services.analytics.analytics_service import AnalyticsService
 from src.services.user_service import UserService
-from src.services.analytics_storage import AnalyticsStorageService
 from src.services.openai_service import OpenAIService
-from src.db.connection import get_db_manager
+from src.services.report_queue import GeneratedReport, ReportJob, ReportQueue, ReportWorker
+from src.services.telegram_format import MESSAGE_LIMIT, send_formatted
+from src.db.connection import DatabaseManager, get_db_manager
 from src.config import Settings
 
 router = Router()
@@ -125,36 +127,15 @@ def convert_markdown_to_html(text: str) -> str:
     return text.strip()
 
 
-async def send_long_message(message: types.Message, text: str, max_length: int = 4000) -> None:
+async def send_long_text(bot: Bot, chat_id: int, text: str, max_length: int = MESSAGE_LIMIT) -> None:
+    """Отправляет длинный текст в чат частями."""
+    # Темп отправки задаёт лимитер исходящих сообщений бота
+    await send_formatted(bot, chat_id, text, limit=max_length)
+
+
+async def send_long_message(message: types.Message, text: str, max_length: int = MESSAGE_LIMIT) -> None:
     """Отправляет длинное сообщение частями."""
-    if len(text) <= max_length:
-        await message.answer(text, parse_mode="Markdown")
-        return
-    
-    # Разбиваем по разделам
-    sections = text.split('\n\n')
-    current_message = ""
-    
-    for section in sections:
-        # Если добавление раздела превысит лимит
-        if len(current_message) + len(section) + 2 > max_length:
-            # Отправляем текущее сообщение
-            if current_message.strip():
-                await message.answer(current_message.strip(), parse_mode="Markdown")
-                await asyncio.sleep(0.5)  # Небольшая пауза между сообщениями
-            
-            # Начинаем новое сообщение с текущего раздела
-            current_message = section
-        else:
-            # Добавляем раздел к текущему сообщению
-            if current_message:
-                current_message += "\n\n" + section
-            else:
-                current_message = section
-    
-    # Отправляем последнее сообщение
-    if current_message.strip():
-        await message.answer(current_message.strip(), parse_mode="Markdown")
+    await send_long_text(message.bot, message.chat.id, text, max_length)
 
 @router.message()
 async def process_user_input(message: types.Message) -> None:
@@ -215,96 +196,89 @@ async def process_user_input(message: types.Message) -> None:
         )
 
 
+def _actions_keyboard(telegram_user_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура дополнительных действий после отчёта."""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📊 Подробная Матрица", callback_data=f"matrix_{telegram_user_id}")],
+        [InlineKeyboardButton(text="🔄 Новый анализ", callback_data="new_analysis")],
+        [InlineKeyboardButton(text="❓ Помощь", callback_data="help")]
+    ])
+
+
 async def perform_analysis_with_data(message: types.Message, birth_date: str, name: str = None) -> None:
-    """Выполнить анализ с готовыми данными."""
+    """Поставить заявку на отчёт и сразу ответить; отчёт доставит воркер очереди."""
     try:
-        # Выполняем анализ
-        await message.answer("🔄 **Выполняю расчёты...**", parse_mode="Markdown")
-        
-        if name:
-            analysis = analytics_service.analyze_person(birth_date, name)
-        else:
-            # Анализ только по дате рождения
-            analysis = analytics_service.analyze_person_date_only(birth_date)
-        
-        # Сохраняем результат в базу данных
-        try:
-            db_manager = get_db_manager()
-            async with db_manager.get_session() as session:
-                # Получаем или создаём пользователя
-                user_service = UserService(session)
-                user = await user_service.get_or_create_user(
-                    telegram_user_id=message.from_user.id,
-                    username=message.from_user.username,
-                    full_name=message.from_user.full_name
-                )
-                
-                # Debug: проверяем user.id
-                print(f"🔍 DEBUG: user.id = {user.id}, user.telegram_user_id = {user.telegram_user_id}")
-                
-                if user.id is None:
-                    print("❌ ERROR: user.id is None! Committing and refreshing...")
-                    await session.commit()
-                    await session.refresh(user)
-                    print(f"🔍 DEBUG after refresh: user.id = {user.id}")
-                
-                # Сохраняем анализ
-                storage_service = AnalyticsStorageService(session)
-                from datetime import date
-                from src.db.models import ReportStatus
-                
-                # Парсим дату
-                day, month, year = map(int, birth_date.split('.'))
-                birth_date_obj = date(year, month, day)
-                
-                await storage_service.save_analysis_result(
-                    user_id=user.id,
-                    full_name=name or "Не указано",
-                    birth_date=birth_date_obj,
-                    analysis_result=analysis,
-                    status=ReportStatus.DONE
-                )
-                
-        except Exception as db_error:
-            # Логируем ошибку, но не прерываем выполнение
-            print(f"⚠️ Ошибка сохранения в БД: {db_error}")
-        
-        # Пытаемся получить персонализированный анализ от OpenAI
-        try:
-            settings = Settings.from_env()
-            openai_service = OpenAIService(
-                api_key=settings.openai_api_key,
-                assistant_id=settings.openai_assistant_id
+        # Парсим дату
+        day, month, year = map(int, birth_date.split('.'))
+        birth_date_obj = date(year, month, day)
+
+        db_manager = get_db_manager()
+        async with db_manager.get_session() as session:
+            # Получаем или создаём пользователя
+            user_id = await UserService(session).ensure_user(
+                telegram_user_id=message.from_user.id,
+                username=message.from_user.username,
+                full_name=message.from_user.full_name
             )
-            
-            # Получаем персонализированный анализ
-            await message.answer("🤖 **Получаю персонализированный анализ от цифрового психолога...**", parse_mode="Markdown")
-            
-            personalized_report = await openai_service.analyze_person(
-                birth_date=birth_date,
-                full_name=name,
-                analysis_data=analysis
+
+            await ReportQueue(db_manager).enqueue(
+                session,
+                user_id=user_id,
+                chat_id=message.chat.id,
+                full_name=name or "",
+                birth_date=birth_date_obj,
             )
-            
-            # Разбиваем длинные сообщения на части (используем Markdown)
-            await send_long_message(message, personalized_report)
-            
-        except Exception as e:
-            # Если OpenAI недоступен, используем стандартный отчёт
-            print(f"⚠️ OpenAI недоступен: {e}")
-            report = _format_analysis_report(analysis)
-            await message.answer(report, parse_mode="Markdown")
-        
-        # Создаём клавиатуру для дополнительных действий
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📊 Подробная Матрица", callback_data=f"matrix_{message.from_user.id}")],
-            [InlineKeyboardButton(text="🔄 Новый анализ", callback_data="new_analysis")],
-            [InlineKeyboardButton(text="❓ Помощь", callback_data="help")]
-        ])
-        
-        await message.answer("Выберите дополнительное действие:", reply_markup=keyboard)
-        
+    except Exception as queue_error:
+        # Без очереди формируем отчёт сразу, как раньше
+        print(f"⚠️ Не удалось поставить заявку в очередь: {queue_error}")
+        await _perform_analysis_inline(message, birth_date, name)
+        return
+
+    await message.answer(
+        "🔄 **Отчёт в работе.** Пришлю его сюда, как только он будет готов.",
+        parse_mode="Markdown"
+    )
+
+
+def _analyze(birth_date: str, name: str = None) -> dict:
+    """Расчёт по дате рождения и имени (если указано)."""
+    if name:
+        return analytics_service.analyze_person(birth_date, name)
+    # Анализ только по дате рождения
+    return analytics_service.analyze_person_date_only(birth_date)
+
+
+async def _build_report(birth_date: str, name: str = None) -> str:
+    """Расчёт и персонализированный отчёт (стандартный — если OpenAI недоступен)."""
+    return await _render_report(birth_date, name, _analyze(birth_date, name))
+
+
+async def _render_report(birth_date: str, name: Optional[str], analysis: dict) -> str:
+    """Персонализированный отчёт по готовому расчёту."""
+    try:
+        settings = Settings.from_env()
+        openai_service = OpenAIService(
+            api_key=settings.openai_api_key,
+            assistant_id=settings.openai_assistant_id
+        )
+        return await openai_service.analyze_person(
+            birth_date=birth_date,
+            full_name=name,
+            analysis_data=analysis
+        )
+    except Exception as e:
+        # Если OpenAI недоступен, используем стандартный отчёт
+        print(f"⚠️ OpenAI недоступен: {e}")
+        return _format_analysis_report(analysis)
+
+
+async def _perform_analysis_inline(message: types.Message, birth_date: str, name: str = None) -> None:
+    """Сформировать и отправить отчёт в хендлере (без очереди)."""
+    try:
+        await message.answer("🔄 **Выполняю расчёты...**", parse_mode="Markdown")
+        report = await _build_report(birth_date, name)
+        await send_long_message(message, report)
+        await message.answer("Выберите дополнительное действие:", reply_markup=_actions_keyboard(message.from_user.id))
     except Exception as e:
         await message.answer(
             f"❌ Ошибка при выполнении анализа: {str(e)}\n\n"
@@ -312,6 +286,37 @@ async def perform_analysis_with_data(message: types.Message, birth_date: str, na
         )
 
 
+async def generate_report(job: ReportJob) -> GeneratedReport:
+    """Сформировать отчёт по заявке из очереди: расчёт сохраняется, текст доставляется."""
+    birth_date = job.birth_date.strftime("%d.%m.%Y")
+    name = job.full_name or None
+    analysis = _analyze(birth_date, name)
+    return GeneratedReport(analysis=analysis, text=await _render_report(birth_date, name, analysis))
+
+
+async def deliver_report(bot: Bot, job: ReportJob, report: str) -> None:
+    """Доставить готовый отчёт в чат заявки."""
+    if job.chat_id is None:
+        raise ValueError(f"У заявки {job.id} не указан чат для доставки")
+    await send_long_text(bot, job.chat_id, report)
+    # В личном чате ID чата совпадает с ID пользователя Telegram
+    await bot.send_message(
+        job.chat_id,
+        "Выберите дополнительное действие:",
+        reply_markup=_actions_keyboard(job.chat_id),
+    )
+
+
+def create_report_worker(bot: Bot, db_manager: DatabaseManager, settings: Settings) -> ReportWorker:
+    """Воркер очереди отчётов: генерация через OpenAI и доставка ботом."""
+    return ReportWorker(
+        ReportQueue(db_manager),
+        generate=generate_report,
+        deliver=lambda job, report: deliver_report(bot, job, report),
+        concurrency=settings.report_worker_concurrency,
+    )
+
+
 def _format_analysis_report(analysis: dict) -> str:
     """Форматировать отчёт анализа."""
     input_data = analysis["input_data"]
@@ -3,7 +3,6 @@
 """
 from __future__ import annotations
 
-import asyncio
 from typing import Dict, Any, Optional
 from aiogram import Router, types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
@@ -12,6 +11,7 @@ from src.services.analytics.analytics_service import AnalyticsService
 from src.services.user_service import UserService
 from src.services.analytics_storage import AnalyticsStorageService
 from src.services.openai_service import OpenAIService
+from src.services.telegram_format import MESSAGE_LIMIT, send_formatted
 from src.db.connection import get_db_manager
 from src.config import Settings
 
@@ -22,115 +22,9 @@ analytics_service = AnalyticsService()
 user_data: Dict[int, Dict[str, Any]] = {}
 
 
-def format_openai_response(text: str) -> str:
-    """Форматирует ответ от OpenAI для красивого отображения в Telegram."""
-    import re
-    
-    # Убираем лишние пробелы и переносы
-    text = text.strip()
-    
-    # Удаляем HTML теги (на всякий случай, если OpenAI их вернет)
-    text = re.sub(r'<[^>]+>', '', text)
-    
-    # Убираем HTML entities
-    text = text.replace('&nbsp;', ' ')
-    text = text.replace('&amp;', '&')
-    text = text.replace('&lt;', '<')
-    text = text.replace('&gt;', '>')
-    text = text.replace('&quot;', '"')
-    
-    # Убираем проблемные Markdown символы, которые могут вызвать ошибки парсинга
-    text = re.sub(r'```[^`]*```', '', text)  # Убираем блоки кода
-    text = re.sub(r'`[^`]*`', '', text)      # Убираем inline код
-    text = re.sub(r'#{1,6}\s+', '', text)    # Убираем заголовки
-    text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)  # Убираем списки
-    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)  # Убираем нумерованные списки
-    text = re.sub(r'\[([^\]]*)\]\([^)]*\)', r'\1', text)  # Убираем ссылки, оставляем текст
-    
-    # Исправляем некорректные Markdown символы
-    text = re.sub(r'\*\*([^*]+)\*\*', r'**\1**', text)  # Исправляем жирный текст
-    text = re.sub(r'\*([^*]+)\*', r'*\1*', text)        # Исправляем курсив
-    
-    # Убираем одиночные звездочки и подчеркивания, которые могут сломать парсинг
-    text = re.sub(r'(?<!\*)\*(?!\*)', '', text)  # Убираем одиночные *
-    text = re.sub(r'(?<!_)_(?!_)', '', text)     # Убираем одиночные _
-    text = re.sub(r'(?<!`)`(?!`)', '', text)     # Убираем одиночные `
-    
-    # Добавляем эмоджи к заголовкам
-    text = text.replace("✨ Твой персональный профиль", "✨ **Твой персональный профиль**")
-    text = text.replace("❤️ Глубокий анализ чисел", "❤️ **Глубокий анализ чисел**")
-    text = text.replace("💎 Матрица твоих энергий", "💎 **Матрица твоих энергий**")
-    text = text.replace("💡 Твои точки роста и практики", "💡 **Твои точки роста и практики**")
-    
-    # Добавляем жирный текст к подзаголовкам
-    text = text.replace("➡️ Практика", "➡️ **Практика**")
-    text = text.replace("➡️ Если появится желание", "➡️ **Если появится желание**")
-    
-    # Добавляем курсив к важным фразам
-    text = text.replace("Дорогая", "*Дорогая")
-    text = text.replace("С теплом и заботой,", "*С теплом и заботой,*")
-    text = text.replace("Милана", "Милана*")
-    
-    # Финальная очистка - убираем множественные пробелы и переносы
-    text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)  # Максимум 2 переноса подряд
-    text = re.sub(r' +', ' ', text)               # Убираем множественные пробелы
-    
-    return text
-
-async def send_long_message(message: types.Message, text: str, max_length: int = 4000) -> None:
-    """Отправляет длинное сообщение частями с красивым форматированием."""
-    import re
-    
-    # Форматируем текст
-    formatted_text = format_openai_response(text)
-    
-    if len(formatted_text) <= max_length:
-        try:
-            await message.answer(formatted_text, parse_mode="Markdown")
-            return
-        except Exception as e:
-            print(f"⚠️ Markdown parsing error, sending as plain text: {e}")
-            # Fallback: отправляем как обычный текст без форматирования
-            plain_text = re.sub(r'[*_`]', '', formatted_text)  # Убираем все Markdown символы
-            await message.answer(plain_text)
-            return
-    
-    # Разбиваем по разделам
-    sections = formatted_text.split('\n\n')
-    current_message = ""
-    
-    for section in sections:
-        # Если добавление раздела превысит лимит
-        if len(current_message) + len(section) + 2 > max_length:
-            # Отправляем текущее сообщение
-            if current_message.strip():
-                try:
-                    await message.answer(current_message.strip(), parse_mode="Markdown")
-                except Exception as e:
-                    print(f"⚠️ Markdown parsing error, sending as plain text: {e}")
-                    # Fallback: отправляем как обычный текст
-                    plain_text = re.sub(r'[*_`]', '', current_message.strip())
-                    await message.answer(plain_text)
-                await asyncio.sleep(0.5)  # Небольшая пауза между сообщениями
-            
-            # Начинаем новое сообщение с текущего раздела
-            current_message = section
-        else:
-            # Добавляем раздел к текущему сообщению
-            if current_message:
-                current_message += "\n\n" + section
-            else:
-                current_message = section
-    
-    # Отправляем последнее сообщение
-    if current_message.strip():
-        try:
-            await message.answer(current_message.strip(), parse_mode="Markdown")
-        except Exception as e:
-            print(f"⚠️ Markdown parsing error, sending as plain text: {e}")
-            # Fallback: отправляем как обычный текст
-            plain_text = re.sub(r'[*_`]', '', current_message.strip())
-            await message.answer(plain_text)
+async def send_long_message(message: types.Message, text: str, max_length: int = MESSAGE_LIMIT) -> None:
+    """Отправляет ответ модели с форматированием, при необходимости частями."""
+    await send_formatted(message.bot, message.chat.id, text, limit=max_length)
 
 
 @router.message()
@@ -0,0 +1,78 @@
+"""src/middlewares/idempotency.py
+Middleware идемпотентности: повторно доставленный апдейт отбрасывается.
+
+Проверка разделена на два outer-middleware на `dp.update`:
+
+- `IdempotencyMiddleware` — перед планировщиком, только локальный LRU процесса
+  без ожидания: повтор не занимает место в очереди чата, а порядок апдейтов
+  чата не зависит от задержек БД;
+- `SharedIdempotencyMiddleware` — после планировщика, в очереди чата: общий
+  бэкенд (PostgreSQL) видит повторы с других воркеров и после перезапуска.
+
+Отброшенные апдейты считаются в метрике `bot_updates_deduplicated_total`.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from src.services.metrics import counter
+from src.services.update_dedup import UpdateDeduplicator
+
+logger = logging.getLogger(__name__)
+
+DUPLICATES = counter(
+    "bot_updates_deduplicated_total",
+    "Повторно доставленных апдейтов, отброшенных до хендлеров, по типам",
+)
+
+
+def _drop(event: Update) -> None:
+    DUPLICATES.inc(event=event.event_type)
+    logger.info("Повторный апдейт %s отброшен", event.update_id)
+
+
+class IdempotencyMiddleware(BaseMiddleware):
+    """Пропускает апдейт, только если его `update_id` не встречался в процессе.
+
+    Не ожидает ничего: регистрируется перед планировщиком апдейтов.
+    """
+
+    def __init__(self, deduplicator: UpdateDeduplicator) -> None:
+        self._deduplicator = deduplicator
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not self._deduplicator.claim_local(event.update_id):
+            _drop(event)
+            return None
+        return await handler(event, data)
+
+
+class SharedIdempotencyMiddleware(BaseMiddleware):
+    """Отбрасывает апдейт, уже занятый в общем бэкенде другим воркером.
+
+    Обращается к БД, поэтому регистрируется после планировщика: апдейты чата
+    проходят этот шаг по очереди и не могут обогнать друг друга.
+    """
+
+    def __init__(self, deduplicator: UpdateDeduplicator) -> None:
+        self._deduplicator = deduplicator
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not await self._deduplicator.claim_shared(event.update_id):
+            _drop(event)
+            return None
+        return await handler(event, data)
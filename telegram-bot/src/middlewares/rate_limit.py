@@ -0,0 +1,73 @@
+"""src/middlewares/rate_limit.py
+Middleware ограничения частоты запросов на пользователя (Settings.rate_limit_per_minute).
+
+Регистрируется как outer-middleware на сообщения и callback-запросы, чтобы
+отсечь лишние апдейты до фильтров и хендлеров — и, главное, до вызова OpenAI.
+"""
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+
+from src.services.rate_limiter import RateLimitBackend
+
+logger = logging.getLogger(__name__)
+
+THROTTLED_NOTICE = "⏳ Слишком много запросов. Пожалуйста, подождите немного и повторите."
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """Пропускает апдейт, только если в ведре пользователя есть токен.
+
+    Пользователь получает одно уведомление на серию отклонённых запросов;
+    остальные апдейты серии отбрасываются молча.
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        notice_text: str = THROTTLED_NOTICE,
+        max_notified: int = 10_000,
+    ) -> None:
+        self._backend = backend
+        self._notice_text = notice_text
+        self._max_notified = max_notified
+        # Пользователи, которым уже отправлено уведомление в текущей серии
+        self._notified: OrderedDict[int, None] = OrderedDict()
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        if await self._backend.consume(str(user.id)):
+            self._notified.pop(user.id, None)
+            return await handler(event, data)
+
+        if user.id not in self._notified:
+            self._remember_notified(user.id)
+            await self._send_notice(event)
+        return None
+
+    def _remember_notified(self, user_id: int) -> None:
+        self._notified[user_id] = None
+        if len(self._notified) > self._max_notified:
+            self._notified.popitem(last=False)
+
+    async def _send_notice(self, event: Any) -> None:
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(self._notice_text)
+            elif isinstance(event, Message):
+                await event.answer(self._notice_text)
+        except Exception as e:  # noqa: BLE001
+            logger.debug("Не удалось отправить уведомление о лимите: %s", e)
@@ -0,0 +1,161 @@
+"""src/middlewares/scheduler.py
+Планировщик апдейтов: строгий порядок внутри чата, параллельность между чатами.
+
+Регистрируется outer-middleware на `dp.update` перед FSM-middleware, чтобы
+порядок не нарушили последующие middleware с ожиданием (чтение FSM-состояния,
+лимитер, загрузка состояния пользователя, дедупликация в общем бэкенде).
+Middleware перед планировщиком не должны ничего ждать — иначе апдейты чата
+могут дойти до его очереди в другом порядке.
+
+- У каждого чата своя FIFO-очередь; одновременно обрабатывается не больше
+  одного апдейта чата, поэтому ответы не меняются местами.
+- Разные чаты обслуживаются пулом из `workers` исполнителей: чат, у которого
+  есть апдейты, встаёт в общую очередь готовых и после каждого апдейта
+  возвращается в её конец — долгие диалоги не задерживают остальных.
+- Ёмкость ограничена `capacity` апдейтами (в очереди и в работе); при
+  заполнении новые апдейты ждут места (обратное давление на источник).
+
+Исполнитель не вызывает хендлер сам, а выдаёт очередь задаче апдейта:
+хендлер выполняется в исходной задаче со своим контекстом.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from aiogram import BaseMiddleware
+
+from src.services.metrics import gauge, histogram
+
+DEFAULT_WORKERS = 16
+DEFAULT_CAPACITY = 1000
+
+QUEUE_LAG = histogram(
+    "bot_scheduler_queue_lag_seconds",
+    "Время ожидания апдейта в очереди чата до начала обработки",
+)
+QUEUE_DEPTH = gauge("bot_scheduler_queue_depth", "Апдейтов в очереди и в работе")
+PENDING_LAG = gauge(
+    "bot_scheduler_pending_lag_seconds",
+    "Возраст самых старых ожидающих апдейтов чатов: максимум и p95 по чатам",
+)
+WAITING_CHATS = gauge("bot_scheduler_waiting_chats", "Чатов с ожидающими апдейтами")
+
+
+class _Job:
+    """Апдейт в очереди чата."""
+
+    __slots__ = ("turn", "finished", "enqueued_at")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.turn: asyncio.Future = loop.create_future()
+        self.finished: asyncio.Future = loop.create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class UpdateSchedulerMiddleware(BaseMiddleware):
+    """Упорядочивает обработку апдейтов по чатам с ограниченным пулом исполнителей."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.workers = workers
+        self.capacity = capacity
+        self._queues: Dict[Hashable, Deque[_Job]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        # Агрегаты без метки чата: число рядов не растёт с числом пользователей
+        PENDING_LAG.set_collector(self._pending_lag)
+        WAITING_CHATS.set_collector(lambda: [({}, len(self._oldest_waits()))])
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        key = self._key(data)
+        if key is None:
+            return await handler(event, data)
+
+        self._ensure_started()
+        await self._slots.acquire()
+        QUEUE_DEPTH.inc()
+
+        job = _Job(asyncio.get_running_loop())
+        queue = self._queues.get(key)
+        if queue is None:
+            # Чат не обрабатывается и не ждёт — ставим его в очередь готовых
+            self._queues[key] = deque([job])
+            self._ready.put_nowait(key)
+        else:
+            queue.append(job)
+
+        try:
+            await job.turn
+            return await handler(event, data)
+        finally:
+            # Освобождаем чат; если апдейт отменён до начала, исполнитель его пропустит
+            if not job.finished.done():
+                job.finished.set_result(None)
+
+    @staticmethod
+    def _key(data: Dict[str, Any]) -> Optional[Hashable]:
+        chat = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        user = data.get("event_from_user")
+        if user is not None:
+            return ("user", user.id)
+        return None
+
+    def _ensure_started(self) -> None:
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.capacity)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            job = queue.popleft()
+            try:
+                # Апдейт, отменённый до начала обработки, пропускаем
+                if not job.turn.done():
+                    QUEUE_LAG.observe(time.monotonic() - job.enqueued_at)
+                    job.turn.set_result(None)
+                    await asyncio.shield(job.finished)
+            finally:
+                self._slots.release()
+                QUEUE_DEPTH.dec()
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._queues[key]
+
+    def _oldest_waits(self) -> List[float]:
+        """Сколько ждёт самый старый апдейт каждого чата с непустой очередью."""
+        now = time.monotonic()
+        return sorted(now - queue[0].enqueued_at for queue in self._queues.values() if queue)
+
+    def _pending_lag(self):
+        waits = self._oldest_waits()
+        if not waits:
+            return [({"stat": "max"}, 0.0), ({"stat": "p95"}, 0.0)]
+        p95 = waits[min(len(waits) - 1, int(0.95 * len(waits)))]
+        return [({"stat": "max"}, waits[-1]), ({"stat": "p95"}, p95)]
+
+    @property
+    def pending(self) -> int:
+        """Апдейтов в очередях чатов (без выполняющихся)."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def close(self) -> None:
+        """Остановить исполнителей."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
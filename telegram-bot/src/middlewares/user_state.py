@@ -0,0 +1,32 @@
+"""src/middlewares/user_state.py
+Middleware подгрузки состояния пользователя (UserStateStore) перед хендлерами.
+
+Хендлеры работают с пространствами имён хранилища как с обычными словарями;
+middleware гарантирует, что состояние пользователя уже лежит в L1 —
+после перезапуска или если апдейт пришёл на другой воркер.
+"""
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+
+from src.services.user_state_store import UserStateStore
+
+
+class UserStateMiddleware(BaseMiddleware):
+    """Вызывает `store.hydrate(user_id)` для автора апдейта."""
+
+    def __init__(self, store: UserStateStore) -> None:
+        self._store = store
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None:
+            await self._store.hydrate(user.id)
+        return await handler(event, data)
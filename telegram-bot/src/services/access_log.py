@@ -0,0 +1,109 @@
+"""src/services/access_log.py
+Отложенная (write-behind) запись журнала доступа к воспоминаниям.
+
+Чтение воспоминаний не ждёт записи журнала: `record()` только кладёт
+событие в ограниченный буфер процесса. Фоновая задача раз в
+`flush_interval` секунд (или сразу, как набралось `batch_size` событий)
+пишет накопленное одним многострочным INSERT в `memoryaccess`
+(см. `BatchWriter`). Строки вставляются только для воспоминаний, которые
+ещё существуют: `discard()` чистит буфер лишь своего процесса, а удалить
+воспоминание мог и другой.
+
+Журнал — вспомогательные данные: при переполнении буфера отбрасываются
+самые старые события, пачка, которую не удалось записать, теряется
+(с предупреждением в логе и счётчиком в метриках). При остановке
+приложения `close()` дописывает остаток.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Integer, String, column, exists, insert, select, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.connection import SessionProvider
+from src.db.models import Memory, MemoryAccess
+from src.services.batch_writer import BatchWriter
+from src.services.metrics import counter
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_MAX_BUFFER = 10_000
+
+_COLUMNS = ("memory_id", "user_id", "access_type", "context", "created_at")
+
+ACCESS_LOG_EVENTS = counter("bot_memory_access_log_total", "События журнала доступа к воспоминаниям по результату")
+ACCESS_LOG_FLUSHES = counter("bot_memory_access_log_flushes_total", "Пачечных записей журнала доступа по результату")
+
+
+class AccessLogWriter(BatchWriter[Dict[str, Any]]):
+    """Буфер событий доступа к воспоминаниям с пачечной записью в БД."""
+
+    def __init__(
+        self,
+        session_provider: Optional[SessionProvider] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_buffer: int = DEFAULT_MAX_BUFFER,
+    ) -> None:
+        super().__init__(
+            session_provider, batch_size, flush_interval, max_buffer, ACCESS_LOG_EVENTS, ACCESS_LOG_FLUSHES
+        )
+
+    def record(
+        self,
+        memory_id: int,
+        user_id: int,
+        access_type: str,
+        context: Optional[str] = None,
+    ) -> None:
+        """Поставить событие в очередь на запись. Не обращается к БД."""
+        self._enqueue(
+            {
+                "memory_id": memory_id,
+                "user_id": user_id,
+                "access_type": access_type,
+                "context": context,
+                "created_at": datetime.now(timezone.utc),
+            }
+        )
+
+    def discard(self, memory_id: int) -> None:
+        """Убрать из очереди события удалённого воспоминания (иначе нарушится внешний ключ)."""
+        kept = [event for event in self._buffer if event["memory_id"] != memory_id]
+        self._buffer.clear()
+        self._buffer.extend(kept)
+
+    async def _write(self, session: AsyncSession, batch: List[Dict[str, Any]]) -> None:
+        # WITH rows AS (VALUES ...) INSERT ... SELECT ... WHERE EXISTS: один запрос на пачку,
+        # события удалённых воспоминаний пропускаются без нарушения внешнего ключа
+        rows = (
+            values(
+                column("memory_id", Integer),
+                column("user_id", Integer),
+                column("access_type", String),
+                column("context", String),
+                column("created_at", MemoryAccess.__table__.c.created_at.type),
+                name="rows",
+            )
+            .data([tuple(event[name] for name in _COLUMNS) for event in batch])
+            .cte("rows")
+        )
+        statement = insert(MemoryAccess).from_select(
+            list(_COLUMNS),
+            select(*(rows.c[name] for name in _COLUMNS)).where(exists().where(Memory.id == rows.c.memory_id)),
+        )
+        await session.execute(statement)
+
+
+# Общий для процесса экземпляр: БД подключается при запуске приложения
+_access_log_writer: Optional[AccessLogWriter] = None
+
+
+def get_access_log_writer() -> AccessLogWriter:
+    """Получить общий для процесса журнал доступа к воспоминаниям."""
+    global _access_log_writer
+    if _access_log_writer is None:
+        _access_log_writer = AccessLogWriter()
+    return _access_log_writer
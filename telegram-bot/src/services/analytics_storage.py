@@ -1,22 +1,48 @@
 """src/services/analytics_storage.py
 Сервис для сохранения результатов аналитики в базу данных.
+
+Результат хранится структурой (`result_json`, JSONB в PostgreSQL), текстовый
+отчёт строится из неё при чтении (`render_report`). Анализ одного и того же
+человека идентифицируется `content_hash` — sha256 нормализованных даты
+рождения и имени латиницей: повторный такой же анализ пользователя обновляет
+существующую строку (upsert по `(user_id, content_hash)`), а не добавляет новую,
+и поднимает её в начало списка. Неудачный повтор (не DONE) не затирает уже
+готовый результат.
 """
 from __future__ import annotations
 
+import hashlib
+import json
 from datetime import date, datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
+from src.db.connection import SessionProvider
 from src.db.models import ReportRequest, ReportStatus, User
 
 
+# Курсор списка анализов: (created_at, id) последнего показанного
+ReportCursor = Tuple[datetime, int]
+
+
+def analysis_content_hash(birth_date: date, latin_name: Optional[str]) -> str:
+    """Ключ анализа: регистр и лишние пробелы в имени не создают новый анализ."""
+    name = " ".join((latin_name or "").split()).lower()
+    return hashlib.sha256(f"{birth_date.isoformat()}|{name}".encode("utf-8")).hexdigest()
+
+
 class AnalyticsStorageService:
-    """Сервис для сохранения результатов аналитики."""
+    """Сервис для сохранения результатов аналитики.
     
-    def __init__(self, session: AsyncSession):
-        self.session = session
+    Каждый метод берёт сессию у `session_provider` только на время своего
+    запроса: соединение не удерживается, пока идёт генерация ответа.
+    """
+    
+    def __init__(self, session_provider: SessionProvider):
+        self.session_provider = session_provider
     
     async def save_analysis_result(
         self,
@@ -27,23 +53,50 @@ class AnalyticsStorageService:
         status: ReportStatus = ReportStatus.DONE,
         error_message: Optional[str] = None,
     ) -> ReportRequest:
-        """Сохранить результат анализа в базу данных."""
-        
-        # Формируем текстовый отчёт
-        report_text = self._format_analysis_for_storage(analysis_result)
-        
-        # Создаём запись о запросе отчёта
-        report_request = ReportRequest(
-            user_id=user_id,
-            full_name=full_name,
-            birth_date=birth_date,
-            status=status,
-            result_text=report_text if status == ReportStatus.DONE else None,
-            error=error_message if status == ReportStatus.ERROR else None,
-        )
+        """Сохранить результат анализа в базу данных (повторный анализ — обновить)."""
+        latin_name = analysis_result.get("input_data", {}).get("latin_name") or full_name
+        # Через JSON: ключи и значения приводятся к тому, что вернёт колонка при чтении
+        result_json = json.loads(json.dumps(analysis_result, ensure_ascii=False, default=str))
+        content_hash = analysis_content_hash(birth_date, latin_name)
+        now = datetime.now(timezone.utc)
+        values = {
+            "full_name": full_name,
+            "status": status,
+            "result_json": result_json if status == ReportStatus.DONE else None,
+            "error": error_message if status == ReportStatus.ERROR else None,
+            # Повторный анализ поднимается в начало списка (порядок — по created_at)
+            "created_at": now,
+            "updated_at": now,
+        }
         
-        self.session.add(report_request)
-        return report_request
+        async with self.session_provider() as session:
+            dialect = session.bind.dialect.name if session.bind is not None else "postgresql"
+            insert = sqlite_insert if dialect == "sqlite" else pg_insert
+            statement = insert(ReportRequest).values(
+                user_id=user_id,
+                birth_date=birth_date,
+                content_hash=content_hash,
+                run_after=now,
+                **values,
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=[ReportRequest.user_id, ReportRequest.content_hash],
+                set_=values,
+                # Неудачный повтор не затирает готовый результат
+                where=or_(ReportRequest.status != ReportStatus.DONE, statement.excluded.status == ReportStatus.DONE),
+            ).returning(ReportRequest)
+            result = await session.execute(statement, execution_options={"populate_existing": True})
+            saved = result.scalar_one_or_none()
+            if saved is None:
+                saved = (
+                    await session.execute(
+                        select(ReportRequest).where(
+                            ReportRequest.user_id == user_id,
+                            ReportRequest.content_hash == content_hash,
+                        )
+                    )
+                ).scalar_one()
+            return saved
     
     async def get_user_analyses(
         self,
@@ -51,17 +104,50 @@ class AnalyticsStorageService:
         limit: int = 10,
         offset: int = 0,
     ) -> list[ReportRequest]:
-        """Получить последние анализы пользователя."""
+        """Получить последние анализы пользователя.
+        
+        Для постраничного показа — `get_user_analyses_page` (без OFFSET).
+        """
+        stmt = self._user_analyses_query(user_id).limit(limit).offset(offset)
+        
+        async with self.session_provider() as session:
+            result = await session.execute(stmt)
+            return list(result.scalars().all())
+    
+    async def get_user_analyses_page(
+        self,
+        user_id: int,
+        after: Optional[ReportCursor] = None,
+        limit: int = 10,
+    ) -> Tuple[List[ReportRequest], Optional[ReportCursor]]:
+        """Страница анализов после курсора и курсор следующей (None — страница последняя)."""
+        stmt = self._user_analyses_query(user_id, after).limit(limit + 1)
+        
+        async with self.session_provider() as session:
+            result = await session.execute(stmt)
+            reports = list(result.scalars().all())
+        
+        page = reports[:limit]
+        return page, (page[-1].created_at, page[-1].id) if len(reports) > limit else None
+    
+    @staticmethod
+    def _user_analyses_query(user_id: int, after: Optional[ReportCursor] = None):
+        # Порядок совпадает с индексом ix_reportrequest_user_id_created_at
         stmt = (
             select(ReportRequest)
             .where(ReportRequest.user_id == user_id)
-            .order_by(ReportRequest.created_at.desc())
-            .limit(limit)
-            .offset(offset)
+            .order_by(ReportRequest.created_at.desc(), ReportRequest.id)
         )
-        
-        result = await self.session.execute(stmt)
-        return list(result.scalars().all())
+        if after is not None:
+            created_at, report_id = after
+            stmt = stmt.where(
+                ReportRequest.created_at <= created_at,
+                or_(
+                    ReportRequest.created_at < created_at,
+                    and_(ReportRequest.created_at == created_at, ReportRequest.id > report_id),
+                ),
+            )
+        return stmt
     
     async def get_analysis_by_id(
         self,
@@ -74,11 +160,33 @@ class AnalyticsStorageService:
             ReportRequest.user_id == user_id,
         )
         
-        result = await self.session.execute(stmt)
-        return result.scalar_one_or_none()
+        async with self.session_provider() as session:
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+    
+    async def get_analytics_by_user_id(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Последние анализы пользователя в виде словарей с готовым текстом отчёта."""
+        return [
+            {
+                "id": report.id,
+                "full_name": report.full_name,
+                "birth_date": report.birth_date.isoformat(),
+                "status": report.status.value if isinstance(report.status, ReportStatus) else report.status,
+                "updated_at": report.updated_at.isoformat(),
+                "result": report.result_json,
+                "report": self.render_report(report),
+            }
+            for report in await self.get_user_analyses(user_id, limit=limit)
+        ]
+    
+    def render_report(self, report: ReportRequest) -> Optional[str]:
+        """Текст отчёта: строится из `result_json`; у старых строк — сохранённый `result_text`."""
+        if report.result_json is not None:
+            return self._format_analysis_for_storage(report.result_json)
+        return report.result_text
     
     def _format_analysis_for_storage(self, analysis_result: Dict[str, Any]) -> str:
-        """Форматировать результат анализа для хранения в БД."""
+        """Форматировать результат анализа в текстовый отчёт."""
         input_data = analysis_result.get("input_data", {})
         calculations = analysis_result.get("calculations", {})
         matrix = analysis_result.get("matrix", {})
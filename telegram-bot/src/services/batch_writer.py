@@ -0,0 +1,133 @@
+"""src/services/batch_writer.py
+Базовый буфер отложенной (write-behind) записи в БД пачками.
+
+`_enqueue()` только кладёт элемент в ограниченный буфер процесса и не
+обращается к БД. Фоновая задача раз в `flush_interval` секунд (или сразу,
+как набралось `batch_size` элементов) передаёт накопленное в `_write()`
+одной транзакцией. При переполнении буфера отбрасываются самые старые
+элементы; пачка, которую не удалось записать, теряется с предупреждением
+в логе. `close()` дописывает остаток при остановке приложения: фоновая
+задача не отменяется посреди записи, а доводит текущую пачку и выходит.
+
+Подклассы: `AccessLogWriter` (журнал доступа к воспоминаниям),
+`ConversationRepository` (история диалогов).
+"""
+from __future__ import annotations
+
+import abc
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Generic, List, Optional, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.connection import SessionProvider
+from src.services.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BatchWriter(abc.ABC, Generic[T]):
+    """Ограниченный буфер с фоновой пачечной записью."""
+
+    def __init__(
+        self,
+        session_provider: Optional[SessionProvider],
+        batch_size: int,
+        flush_interval: float,
+        max_buffer: int,
+        events: Counter,
+        flushes: Counter,
+    ) -> None:
+        self.session_provider = session_provider
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: Deque[T] = deque(maxlen=max_buffer)
+        self._events = events
+        self._flushes = flushes
+        self._wakeup = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def set_session_provider(self, session_provider: SessionProvider) -> None:
+        """Подключить БД (при запуске приложения, до обработки апдейтов)."""
+        self.session_provider = session_provider
+
+    def _enqueue(self, item: T) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            # deque с maxlen сам вытеснит самый старый элемент
+            self._events.inc(result="dropped")
+        self._buffer.append(item)
+        self._events.inc(result="queued")
+        self._ensure_flusher()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    @abc.abstractmethod
+    async def _write(self, session: AsyncSession, batch: List[T]) -> None:
+        """Записать пачку в открытой сессии (коммит делает вызывающий)."""
+
+    async def flush(self) -> int:
+        """Записать всё накопленное пачками по `batch_size`. Возвращает число записанных элементов."""
+        if self.session_provider is None:
+            return 0
+        written = 0
+        async with self._flush_lock:
+            while self._buffer:
+                batch: List[T] = []
+                while self._buffer and len(batch) < self.batch_size:
+                    batch.append(self._buffer.popleft())
+                try:
+                    async with self.session_provider() as session:
+                        await self._write(session, batch)
+                except Exception as e:  # noqa: BLE001
+                    logger.warning("%s: не удалось записать пачку (%d): %s", type(self).__name__, len(batch), e)
+                    self._flushes.inc(result="error")
+                    self._events.inc(len(batch), result="lost")
+                    continue
+                self._flushes.inc(result="ok")
+                self._events.inc(len(batch), result="written")
+                written += len(batch)
+        return written
+
+    def _ensure_flusher(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # Вне цикла событий (скрипты): запишется при явном flush()/close()
+                return
+            self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def close(self) -> None:
+        """Остановить фоновую запись и дописать оставшееся.
+
+        Отмена задачи посреди `_write()` потеряла бы пачку, уже снятую
+        с буфера, поэтому цикл получает сигнал и завершается сам.
+        """
+        self._closing = True
+        try:
+            if self._flush_task is not None:
+                self._wakeup.set()
+                await self._flush_task
+                self._flush_task = None
+            await self.flush()
+        finally:
+            self._closing = False
+
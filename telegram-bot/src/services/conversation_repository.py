@@ -0,0 +1,226 @@
+"""src/services/conversation_repository.py
+История диалогов в `dialog`/`message`.
+
+Запись не задерживает ответ пользователю: `append()` и `start_dialog()`
+только ставят событие в очередь процесса, фоновая задача раз в
+`flush_interval` (или по набору `batch_size`) пишет накопленное одним
+многострочным INSERT в `message` (см. `BatchWriter`). Текущий диалог
+пользователя кешируется; без кеша это последний диалог по
+`ix_dialog_user_id_id`, `/start` открывает новый.
+
+Чтение — по индексу `(dialog_id, id)`: последние K сообщений текущего
+диалога (восстановление контекста после перезапуска) и постраничная
+история по курсору `(dialog_id, id)` без OFFSET. Ещё не записанные
+события из очереди добавляются к результату `load_recent()`.
+
+Срок хранения в PostgreSQL — помесячные партиции `message`
+(`maintain_partitions()`, src/db/message_partitions.py); приложение
+вызывает обслуживание при запуске и раз в `PARTITION_MAINTENANCE_INTERVAL`.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.connection import SessionProvider
+from src.db.message_partitions import drop_expired_message_partitions, ensure_message_partitions
+from src.db.models import Dialog, Message, User
+from src.services.batch_writer import BatchWriter
+from src.services.metrics import counter
+from src.services.user_service import UserCache, UserService
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_MAX_BUFFER = 10_000
+DEFAULT_DIALOG_CACHE_SIZE = 10_000
+DEFAULT_PAGE_SIZE = 50
+PARTITION_MAINTENANCE_INTERVAL = 24 * 3600.0  # секунды между обслуживаниями партиций
+
+CONVERSATION_EVENTS = counter("bot_conversation_messages_total", "Сообщений истории диалогов по результату записи")
+CONVERSATION_FLUSHES = counter("bot_conversation_flushes_total", "Пачечных записей истории диалогов по результату")
+
+# Курсор постраничной истории: (dialog_id, id) последнего показанного сообщения
+Cursor = Tuple[int, int]
+
+
+@dataclass(slots=True)
+class ConversationEvent:
+    """Событие в очереди: сообщение или начало нового диалога (`role is None`)."""
+
+    telegram_user_id: int
+    role: Optional[str] = None
+    content: str = ""
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class ConversationRepository(BatchWriter[ConversationEvent]):
+    """Сохранение и загрузка истории диалогов с пачечной записью."""
+
+    def __init__(
+        self,
+        session_provider: Optional[SessionProvider] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_buffer: int = DEFAULT_MAX_BUFFER,
+        dialog_cache_size: int = DEFAULT_DIALOG_CACHE_SIZE,
+        user_cache: Optional[UserCache] = None,
+    ) -> None:
+        super().__init__(
+            session_provider, batch_size, flush_interval, max_buffer, CONVERSATION_EVENTS, CONVERSATION_FLUSHES
+        )
+        self.dialog_cache_size = dialog_cache_size
+        self.user_cache = user_cache
+        # Telegram ID → ID текущего диалога (только зафиксированные в БД)
+        self._dialogs: OrderedDict[int, int] = OrderedDict()
+
+    def append(self, telegram_user_id: int, role: str, content: str) -> None:
+        """Поставить сообщение в очередь на запись. Не обращается к БД."""
+        self._enqueue(ConversationEvent(telegram_user_id, role, content))
+
+    def start_dialog(self, telegram_user_id: int) -> None:
+        """Следующие сообщения пользователя пойдут в новый диалог."""
+        self._enqueue(ConversationEvent(telegram_user_id))
+
+    def _remember_dialog(self, telegram_user_id: int, dialog_id: int) -> None:
+        self._dialogs[telegram_user_id] = dialog_id
+        self._dialogs.move_to_end(telegram_user_id)
+        while len(self._dialogs) > self.dialog_cache_size:
+            self._dialogs.popitem(last=False)
+
+    async def _write(self, session: AsyncSession, batch: List[ConversationEvent]) -> None:
+        users = UserService(session, self.user_cache)
+        dialogs: Dict[int, int] = {}
+        rows = []
+        for item in batch:
+            if item.role is None:
+                user_id = await users.ensure_user(item.telegram_user_id)
+                dialogs[item.telegram_user_id] = await self._create_dialog(session, user_id, item.created_at)
+                continue
+            dialog_id = dialogs.get(item.telegram_user_id) or self._dialogs.get(item.telegram_user_id)
+            if dialog_id is None:
+                user_id = await users.ensure_user(item.telegram_user_id)
+                dialog_id = await session.scalar(
+                    select(Dialog.id).where(Dialog.user_id == user_id).order_by(Dialog.id.desc()).limit(1)
+                ) or await self._create_dialog(session, user_id, item.created_at)
+            dialogs[item.telegram_user_id] = dialog_id
+            rows.append(
+                {"dialog_id": dialog_id, "role": item.role, "content": item.content, "created_at": item.created_at}
+            )
+        if rows:
+            # executemany: SQLAlchemy собирает один многострочный INSERT
+            await session.execute(insert(Message), rows)
+
+        # В кеш — только после фиксации: при откате новые диалоги не существуют
+        def remember(_session) -> None:
+            for telegram_user_id, dialog_id in dialogs.items():
+                self._remember_dialog(telegram_user_id, dialog_id)
+
+        event.listen(session.sync_session, "after_commit", remember, once=True)
+
+    @staticmethod
+    async def _create_dialog(session: AsyncSession, user_id: int, started_at: datetime) -> int:
+        return await session.scalar(
+            insert(Dialog).values(user_id=user_id, started_at=started_at).returning(Dialog.id)
+        )
+
+    def _pending(self, telegram_user_id: int) -> Tuple[bool, List[Dict[str, str]]]:
+        """Ещё не записанные сообщения пользователя: (начат ли новый диалог, сообщения после начала)."""
+        started = False
+        pending: List[Dict[str, str]] = []
+        for item in self._buffer:
+            if item.telegram_user_id != telegram_user_id:
+                continue
+            if item.role is None:
+                started = True
+                pending = []
+            else:
+                pending.append({"role": item.role, "content": item.content})
+        return started, pending
+
+    async def load_recent(self, telegram_user_id: int, limit: int) -> List[Dict[str, str]]:
+        """Последние `limit` сообщений текущего диалога, от старых к новым."""
+        started, pending = self._pending(telegram_user_id)
+        if started or len(pending) >= limit or self.session_provider is None:
+            return pending[-limit:] if limit > 0 else []
+
+        dialog_id = self._dialogs.get(telegram_user_id)
+        if dialog_id is None:
+            dialog_id = (
+                select(Dialog.id)
+                .join(User, User.id == Dialog.user_id)
+                .where(User.telegram_user_id == str(telegram_user_id))
+                .order_by(Dialog.id.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
+        query = (
+            select(Message.role, Message.content)
+            .where(Message.dialog_id == dialog_id)
+            .order_by(Message.id.desc())
+            .limit(limit - len(pending))
+        )
+        async with self.session_provider() as session:
+            rows = (await session.execute(query)).all()
+        stored = [{"role": role, "content": content} for role, content in reversed(rows)]
+        return stored + pending
+
+    async def history_page(
+        self,
+        telegram_user_id: int,
+        before: Optional[Cursor] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> Tuple[List[Dict[str, object]], Optional[Cursor]]:
+        """Страница истории всех диалогов пользователя, от новых к старым.
+
+        Возвращает сообщения и курсор следующей страницы (None — страниц больше нет).
+        """
+        if self.session_provider is None:
+            return [], None
+        query = (
+            select(Message.dialog_id, Message.id, Message.role, Message.content, Message.created_at)
+            .join(Dialog, Dialog.id == Message.dialog_id)
+            .join(User, User.id == Dialog.user_id)
+            .where(User.telegram_user_id == str(telegram_user_id))
+            .order_by(Message.dialog_id.desc(), Message.id.desc())
+            .limit(limit)
+        )
+        if before is not None:
+            query = query.where(tuple_(Message.dialog_id, Message.id) < tuple_(*before))
+        async with self.session_provider() as session:
+            rows = (await session.execute(query)).all()
+        page = [
+            {"dialog_id": dialog_id, "id": message_id, "role": role, "content": content, "created_at": created_at}
+            for dialog_id, message_id, role, content, created_at in rows
+        ]
+        cursor = (page[-1]["dialog_id"], page[-1]["id"]) if len(page) == limit else None
+        return page, cursor
+
+    async def maintain_partitions(
+        self, retention_months: Optional[int] = None, now: Optional[datetime] = None
+    ) -> None:
+        """Создать партиции `message` на ближайшие месяцы и удалить старше срока хранения."""
+        if self.session_provider is None:
+            return
+        now = (now or datetime.now(timezone.utc)).replace(tzinfo=None)
+        async with self.session_provider() as session:
+            conn = await session.connection()
+            await ensure_message_partitions(conn, now)
+            if retention_months is not None:
+                await drop_expired_message_partitions(conn, now, retention_months)
+
+
+# Общий для процесса экземпляр: БД подключается при запуске приложения
+_conversation_repository: Optional[ConversationRepository] = None
+
+
+def get_conversation_repository() -> ConversationRepository:
+    """Получить общее для процесса хранилище истории диалогов."""
+    global _conversation_repository
+    if _conversation_repository is None:
+        _conversation_repository = ConversationRepository()
+    return _conversation_repository
@@ -0,0 +1,180 @@
+"""src/services/fsm_storage.py
+Хранилище FSM aiogram в PostgreSQL (таблица `fsm_state`).
+
+- Состояние и данные лежат в одной строке: чтение — один SELECT,
+  запись — один UPSERT (RETURNING возвращает вторую половину строки для кеша).
+- Незавершённые сценарии истекают через `state_ttl`: просроченная строка
+  не читается и не сливается с новой записью, а удаляется лениво.
+- Кеш чтения в процессе: FSM-middleware читает состояние на каждый апдейт,
+  а хендлер затем читает данные — оба чтения обслуживаются из кеша.
+  Записи идут в БД и сразу обновляют кеш, запись без изменений пропускается.
+
+При нескольких воркерах без привязки чата к воркеру уменьшите `cache_ttl`
+(FSM_CACHE_TTL): это верхняя граница устаревания состояния на другом воркере.
+"""
+from __future__ import annotations
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import text
+
+from src.config import Settings
+from src.db.connection import DatabaseManager
+
+DEFAULT_FSM_STATE_TTL = 24 * 3600.0  # незавершённый сценарий, секунды
+DEFAULT_FSM_CACHE_TTL = 30.0
+DEFAULT_FSM_CACHE_SIZE = 10_000
+
+# (state, data, момент загрузки в кеш)
+_CacheRecord = Tuple[Optional[str], Dict[str, Any], float]
+
+
+class PostgresFSMStorage(BaseStorage):
+    """FSM-хранилище aiogram с одной строкой на ключ и кешем чтения."""
+
+    _GET_SQL = text("SELECT state, data FROM fsm_state WHERE key = :key AND expires_at > :now")
+
+    _SET_STATE_SQL = text(
+        """
+        INSERT INTO fsm_state (key, state, data, expires_at)
+        VALUES (:key, :state, '{}', :expires_at)
+        ON CONFLICT (key) DO UPDATE SET
+            state = EXCLUDED.state,
+            data = CASE WHEN fsm_state.expires_at > :now THEN fsm_state.data ELSE '{}' END,
+            expires_at = EXCLUDED.expires_at
+        RETURNING data
+        """
+    )
+
+    _SET_DATA_SQL = text(
+        """
+        INSERT INTO fsm_state (key, state, data, expires_at)
+        VALUES (:key, NULL, :data, :expires_at)
+        ON CONFLICT (key) DO UPDATE SET
+            state = CASE WHEN fsm_state.expires_at > :now THEN fsm_state.state END,
+            data = EXCLUDED.data,
+            expires_at = EXCLUDED.expires_at
+        RETURNING state
+        """
+    )
+
+    _EVICT_SQL = text("DELETE FROM fsm_state WHERE expires_at < :now")
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        state_ttl: float = DEFAULT_FSM_STATE_TTL,
+        cache_ttl: float = DEFAULT_FSM_CACHE_TTL,
+        cache_size: int = DEFAULT_FSM_CACHE_SIZE,
+        key_builder: Optional[KeyBuilder] = None,
+        evict_every: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.db_manager = db_manager
+        self.state_ttl = state_ttl
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.evict_every = evict_every
+        self._clock = clock
+        self._cache: OrderedDict[str, _CacheRecord] = OrderedDict()
+        self._writes = 0
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        db_key = self.key_builder.build(key)
+        cached = self._cached(db_key)
+        if cached is not None and cached[0] == state:
+            return
+        row = await self._write(self._SET_STATE_SQL, {"key": db_key, "state": state})
+        self._remember(db_key, state, json.loads(row.data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self.key_builder.build(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        db_key = self.key_builder.build(key)
+        cached = self._cached(db_key)
+        if cached is not None and cached[1] == data:
+            return
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        row = await self._write(self._SET_DATA_SQL, {"key": db_key, "data": payload})
+        self._remember(db_key, row.state, json.loads(payload))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._load(self.key_builder.build(key)))[1])
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+    # --- внутреннее ---
+
+    def _cached(self, db_key: str) -> Optional[_CacheRecord]:
+        record = self._cache.get(db_key)
+        if record is None:
+            return None
+        if self._clock() - record[2] > self.cache_ttl:
+            del self._cache[db_key]
+            return None
+        self._cache.move_to_end(db_key)
+        return record
+
+    def _remember(self, db_key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        if self.cache_ttl <= 0:
+            return
+        self._cache[db_key] = (state, data, self._clock())
+        self._cache.move_to_end(db_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, db_key: str) -> _CacheRecord:
+        cached = self._cached(db_key)
+        if cached is not None:
+            return cached
+
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(self._GET_SQL, {"key": db_key, "now": self._clock()})
+            row = result.first()
+
+        state, data = (row.state, json.loads(row.data)) if row is not None else (None, {})
+        self._remember(db_key, state, data)
+        return state, data, self._clock()
+
+    async def _write(self, statement, params: Dict[str, Any]) -> Any:
+        """Выполнить UPSERT; RETURNING отдаёт вторую половину строки для кеша."""
+        self._writes += 1
+        now = self._clock()
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(
+                statement, {**params, "now": now, "expires_at": now + self.state_ttl}
+            )
+            row = result.one()
+            # Ленивое удаление брошенных сценариев
+            if self._writes % self.evict_every == 0:
+                await session.execute(self._EVICT_SQL, {"now": now})
+        return row
+
+
+def create_fsm_storage(
+    settings: Settings,
+    db_manager: Optional[DatabaseManager] = None,
+) -> BaseStorage:
+    """Создать FSM-хранилище по настройкам (FSM_STORAGE)."""
+    if settings.fsm_storage == "postgres":
+        if db_manager is None:
+            raise RuntimeError("Для FSM_STORAGE=postgres нужен DatabaseManager")
+        return PostgresFSMStorage(db_manager, cache_ttl=settings.fsm_cache_ttl)
+
+    return MemoryStorage()
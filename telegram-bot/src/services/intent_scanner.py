@@ -0,0 +1,161 @@
+"""src/services/intent_scanner.py
+Однопроходный сканер намерений и сущностей в сообщениях.
+
+Все ключевые фразы (типы запросов, вопросы бота про дату и имя) и шаблоны
+дат собраны в одно скомпилированное регулярное выражение. Сообщение
+просматривается один раз; результат сохраняется в записи контекста
+(`msg["scan"]`), поэтому история повторно не сканируется.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+# Тип запроса -> ключевые фразы (поиск подстрокой без учёта регистра)
+INTENT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "детализация": (
+        "расскажи про", "расскажи об", "подробнее", "детали", "конкретно",
+        "какой", "какая", "какие", "области развития", "области для развития",
+    ),
+    "прогноз": ("прогноз", "предсказание", "что ждет", "что будет"),
+    "совместимость": (
+        "совместимость", "отношения", "пара", "вместе", "идеальный партнер", "найти отношения",
+    ),
+    "реализация": ("реализация", "предназначение", "миссия", "путь", "карьера"),
+    "практики": (
+        "практики", "упражнения", "развитие", "работать", "уверенность", "посоветуй практику",
+    ),
+}
+
+# Порядок важен: при нескольких совпадениях побеждает первый тип
+INTENT_PRIORITY: Tuple[str, ...] = ("детализация", "прогноз", "совместимость", "реализация", "практики")
+
+# Тип запроса, который не наследуется из истории разговора
+CURRENT_ONLY_INTENTS: FrozenSet[str] = frozenset({"детализация"})
+
+# Вопросы бота, на которые пользователь может отвечать датой или именем
+ASK_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "ask_date": ("дата рождения", "дату рождения", "дата", "рождения"),
+    "ask_name": ("имя", "как зовут", "твое имя"),
+}
+
+# dd.mm.yyyy, dd/mm/yyyy, dd-mm-yyyy, dd mm yyyy
+_DATE_PATTERN = r"\d{1,2}(?:\.\d{1,2}\.|/\d{1,2}/|-\d{1,2}-|\s+\d{1,2}\s+)\d{4}"
+
+
+def _build_keyword_tags() -> Dict[str, Tuple[str, ...]]:
+    tags: Dict[str, Tuple[str, ...]] = {}
+    for groups in (INTENT_KEYWORDS, ASK_KEYWORDS):
+        for tag, phrases in groups.items():
+            for phrase in phrases:
+                tags[phrase] = tags.get(phrase, ()) + (tag,)
+    return tags
+
+
+_KEYWORD_TAGS = _build_keyword_tags()
+
+# Фраза, являющаяся префиксом другой фразы, начинается в той же позиции и
+# была бы поглощена более длинной альтернативой — отдаём ей и теги префикса.
+for _phrase in list(_KEYWORD_TAGS):
+    for _other in _KEYWORD_TAGS:
+        if _other != _phrase and _other.startswith(_phrase):
+            _KEYWORD_TAGS[_other] = tuple(dict.fromkeys(_KEYWORD_TAGS[_other] + _KEYWORD_TAGS[_phrase]))
+
+# Опережающая проверка даёт совпадение в каждой позиции, поэтому
+# перекрывающиеся фразы ("расскажи прогноз") не теряются.
+_SCANNER = re.compile(
+    "(?=(?P<date>%s)|(?P<kw>%s))" % (
+        _DATE_PATTERN,
+        "|".join(re.escape(p) for p in sorted(_KEYWORD_TAGS, key=len, reverse=True)),
+    )
+)
+
+
+@dataclass(frozen=True, slots=True)
+class TextScan:
+    """Результат сканирования одного сообщения."""
+
+    tags: FrozenSet[str] = frozenset()
+    dates: Tuple[str, ...] = ()
+    name: Optional[str] = None
+
+    @property
+    def intent(self) -> Optional[str]:
+        """Тип запроса с наивысшим приоритетом или None."""
+        for intent in INTENT_PRIORITY:
+            if intent in self.tags:
+                return intent
+        return None
+
+    @property
+    def looks_like_date(self) -> bool:
+        return bool(self.dates)
+
+    @property
+    def looks_like_name(self) -> bool:
+        return self.name is not None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Представление из примитивов для хранения в записи контекста."""
+        return {"tags": sorted(self.tags), "dates": list(self.dates), "name": self.name}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TextScan":
+        return cls(tags=frozenset(data["tags"]), dates=tuple(data["dates"]), name=data["name"])
+
+
+def _extract_name(text: str) -> Optional[str]:
+    """Одно слово только из букв длиной 2-20 символов считается именем."""
+    text = text.strip()
+    if 2 <= len(text) <= 20 and text.isalpha():
+        return text
+    return None
+
+
+@lru_cache(maxsize=512)
+def scan_text(text: str) -> TextScan:
+    """Просканировать текст за один проход."""
+    if not text:
+        return TextScan()
+    tags = set()
+    dates = []
+    date_end = 0
+    for match in _SCANNER.finditer(text.lower()):
+        keyword = match.group("kw")
+        if keyword is not None:
+            tags.update(_KEYWORD_TAGS[keyword])
+        elif match.start() >= date_end:
+            # Хвосты уже найденной даты ("2.03.2024" в "12.03.2024") пропускаем
+            dates.append(match.group("date"))
+            date_end = match.end("date")
+    return TextScan(tags=frozenset(tags), dates=tuple(dates), name=_extract_name(text))
+
+
+def scan_message(msg: Dict[str, Any]) -> TextScan:
+    """Результат сканирования записи контекста; вычисляется один раз на запись."""
+    cached = msg.get("scan")
+    if cached is not None:
+        return TextScan.from_dict(cached)
+    result = scan_text(msg.get("content") or "")
+    msg["scan"] = result.as_dict()
+    return result
+
+
+def detect_intent(user_message: str, context: Iterable[Dict[str, Any]]) -> str:
+    """Тип запроса: по текущему сообщению, затем по последним репликам пользователя.
+
+    `context` просматривается от новых сообщений к старым.
+    """
+    intent = scan_text(user_message).intent
+    if intent is not None:
+        return intent
+    for msg in context:
+        if msg["role"] != "user":
+            continue
+        tags = scan_message(msg).tags
+        for candidate in INTENT_PRIORITY:
+            if candidate not in CURRENT_ONLY_INTENTS and candidate in tags:
+                return candidate
+    return "анализ"
@@ -1,26 +1,198 @@
 """src/services/memory_bank_service.py
 Сервис для управления Memory Bank - персональными воспоминаниями пользователей.
+
+Доступ к воспоминаниям журналируется через `AccessLogWriter`: события
+пишутся в фоне пачками, чтение не ждёт записи журнала.
+
+Теги и связи хранятся в таблицах `memory_tag` и `memory_link`; строки
+`Memory.tags`/`Memory.related_memories` остаются для показа и
+перезаписываются вместе с ними. Окрестность связанных воспоминаний на
+N шагов выбирается одним рекурсивным CTE.
+
+Статистика пользователя материализована в `memory_stats` и обновляется
+в транзакции каждого изменения (см. `src.services.memory_stats`).
+
+Контекст для AI собирается из кешированного дайджеста воспоминаний
+(см. `src.services.memory_digest`): без запросов к БД на каждое сообщение
+и в пределах бюджета токенов.
 """
 from __future__ import annotations
 
 import logging
+import re
 from datetime import datetime, timezone
-from typing import List, Optional, Dict, Any
-from sqlmodel import select, and_, or_, func
+from typing import Iterable, List, Optional, Dict, Any, Tuple
+from sqlalchemy import Select, insert, literal, literal_column, table, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select, and_, or_, func, delete
 
-from src.db.models import Memory, MemoryAccess, User
+from src.db.models import Memory, MemoryAccess, MemoryLink, MemoryTag
 from src.db.connection import DatabaseManager
+from src.db.memory_search import fts5_query, search_config, search_vector
+from src.services.access_log import AccessLogWriter, get_access_log_writer
+from src.services.memory_digest import (
+    DEFAULT_TOKEN_BUDGET,
+    DIGEST_MAX_MEMORIES,
+    DigestEntry,
+    MemoryDigest,
+    MemoryDigestCache,
+    build_links,
+    get_memory_digest_cache,
+)
+from src.services.memory_stats import (
+    MemorySummary,
+    apply_memory_change,
+    load_memory_stats,
+    rebuild_memory_stats,
+)
 
 
 logger = logging.getLogger(__name__)
 
+_memory_fts = table("memory_fts", literal_column("rowid"))
+
+_MEMORY_ID = re.compile(r"\d+")
+
+# Курсор списка воспоминаний: (importance, updated_at, id) последнего показанного
+MemoryCursor = Tuple[int, datetime, int]
+
+
+def parse_tags(tags: Optional[str]) -> List[str]:
+    """Строка тегов через запятую → уникальные теги в нижнем регистре (порядок сохраняется)."""
+    if not tags:
+        return []
+    parsed = (tag.strip().lower() for tag in tags.split(","))
+    return list(dict.fromkeys(tag for tag in parsed if tag))
+
+
+def parse_memory_ids(related_memories: Optional[str]) -> List[int]:
+    """Строка ID через запятую → уникальные ID; мусор пропускается."""
+    if not related_memories:
+        return []
+    return list(dict.fromkeys(int(match) for match in _MEMORY_ID.findall(related_memories)))
+
+
+def memory_cursor(memory: Memory) -> MemoryCursor:
+    """Курсор, с которого продолжается список после `memory`."""
+    return memory.importance, memory.updated_at, memory.id
+
+
+def after_memory_cursor(cursor: MemoryCursor):
+    """Условие «после курсора» в порядке `importance desc, updated_at desc, id`.
+
+    Раскрыто в OR, а не сравнением кортежей: направления колонок разные, а
+    ведущее `importance <= ...` остаётся диапазоном по индексу.
+    """
+    importance, updated_at, memory_id = cursor
+    return and_(
+        Memory.importance <= importance,
+        or_(
+            Memory.importance < importance,
+            Memory.updated_at < updated_at,
+            and_(Memory.updated_at == updated_at, Memory.id > memory_id),
+        ),
+    )
+
+
+def related_memories_query(user_id: int, seed_ids: Iterable[int], depth: int = 1) -> Select:
+    """Воспоминания в `depth` шагах от `seed_ids` по связям (в обе стороны).
+
+    Один рекурсивный CTE: строки — `(Memory, шаг)`, ближайшие и важные
+    первыми; сами исходные воспоминания не входят.
+    """
+    edges = union_all(
+        select(MemoryLink.source_id.label("from_id"), MemoryLink.target_id.label("to_id")),
+        select(MemoryLink.target_id.label("from_id"), MemoryLink.source_id.label("to_id")),
+    ).subquery("edges")
+
+    neighborhood = (
+        select(Memory.id.label("id"), literal(0).label("depth"))
+        .where(Memory.id.in_(list(seed_ids)), Memory.user_id == user_id)
+        .cte("neighborhood", recursive=True)
+    )
+    # UNION, а не UNION ALL: повторно достигнутые на том же шаге строки отбрасываются
+    neighborhood = neighborhood.union(
+        select(edges.c.to_id, neighborhood.c.depth + 1)
+        .join(edges, edges.c.from_id == neighborhood.c.id)
+        .where(neighborhood.c.depth < depth)
+    )
+    nearest = (
+        select(neighborhood.c.id, func.min(neighborhood.c.depth).label("depth"))
+        .group_by(neighborhood.c.id)
+        .subquery("nearest")
+    )
+    return (
+        select(Memory, nearest.c.depth)
+        .join(nearest, nearest.c.id == Memory.id)
+        .where(Memory.user_id == user_id, nearest.c.depth > 0)
+        .order_by(nearest.c.depth, Memory.importance.desc(), Memory.updated_at.desc())
+    )
+
+
+def build_search_query(
+    dialect: str,
+    user_id: int,
+    query_text: str,
+    memory_type: Optional[str] = None,
+    limit: int = 20,
+) -> Optional[Select]:
+    """Запрос поиска воспоминаний пользователя; None — искать нечего.
+
+    PostgreSQL: совпадение по `search_vector` или по триграммам заголовка и
+    тегов (опечатки); релевантность — `ts_rank` + сходство заголовка,
+    умноженные на важность. SQLite: FTS5 с ранжированием bm25.
+    """
+    if dialect == "sqlite":
+        match = fts5_query(query_text)
+        if not match:
+            return None
+        fts = literal_column("memory_fts")
+        # bm25 отрицателен: чем меньше, тем релевантнее
+        rank = func.bm25(fts) * (1 + Memory.importance / 10.0)
+        query = (
+            select(Memory)
+            .join(_memory_fts, literal_column("memory_fts.rowid") == Memory.id)
+            .where(fts.op("MATCH")(match), Memory.user_id == user_id)
+            .order_by(rank, Memory.updated_at.desc())
+        )
+    else:
+        query_text = query_text.strip()
+        if not query_text:
+            return None
+        tsquery = func.websearch_to_tsquery(search_config, query_text)
+        rank = (func.ts_rank(search_vector, tsquery) + func.similarity(Memory.title, query_text)) * (
+            1 + Memory.importance / 10.0
+        )
+        query = (
+            select(Memory)
+            .where(
+                Memory.user_id == user_id,
+                or_(
+                    search_vector.op("@@")(tsquery),
+                    Memory.title.op("%")(query_text),
+                    Memory.tags.op("%")(query_text),
+                ),
+            )
+            .order_by(rank.desc(), Memory.updated_at.desc())
+        )
+
+    if memory_type:
+        query = query.where(Memory.memory_type == memory_type)
+    return query.limit(limit)
+
 
 class MemoryBankService:
     """Сервис для управления персональными воспоминаниями пользователей."""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        access_log: Optional[AccessLogWriter] = None,
+        digest_cache: Optional[MemoryDigestCache] = None,
+    ):
         self.db_manager = db_manager
+        self.access_log = access_log if access_log is not None else get_access_log_writer()
+        self.digest_cache = digest_cache if digest_cache is not None else get_memory_digest_cache()
     
     async def create_memory(
         self,
@@ -45,11 +217,15 @@ class MemoryBankService:
             )
             
             session.add(memory)
+            await session.flush()
+            await self._replace_tags(session, memory)
+            await self._replace_links(session, memory)
+            await apply_memory_change(session, user_id, added=MemorySummary.of(memory))
             await session.commit()
             await session.refresh(memory)
             
-            # Логируем создание
-            await self._log_access(session, memory.id, user_id, "create")
+            self.digest_cache.invalidate(user_id)
+            self.access_log.record(memory.id, user_id, "create")
             
             logger.info(f"Создано воспоминание {memory.id} для пользователя {user_id}")
             return memory
@@ -57,47 +233,88 @@ class MemoryBankService:
     async def get_memory(self, memory_id: int, user_id: int) -> Optional[Memory]:
         """Получить воспоминание по ID."""
         async with self.db_manager.get_session() as session:
-            result = await session.exec(
+            result = await session.execute(
                 select(Memory).where(
                     and_(Memory.id == memory_id, Memory.user_id == user_id)
                 )
             )
-            memory = result.first()
+            memory = result.scalars().first()
             
             if memory:
                 # Обновляем время последнего доступа
                 memory.last_accessed = datetime.now(timezone.utc)
                 await session.commit()
-                await self._log_access(session, memory_id, user_id, "read")
+                self.access_log.record(memory_id, user_id, "read")
             
             return memory
     
+    @staticmethod
+    def _user_memories_query(
+        user_id: int,
+        memory_type: Optional[str] = None,
+        tag: Optional[str] = None,
+        after: Optional[MemoryCursor] = None,
+    ) -> Select:
+        query = select(Memory).where(Memory.user_id == user_id)
+        if memory_type:
+            query = query.where(Memory.memory_type == memory_type)
+        if tag:
+            # Индекс ix_memory_tag_user_tag: (user_id, tag) → memory_id
+            tagged = select(MemoryTag.memory_id).where(
+                MemoryTag.user_id == user_id, MemoryTag.tag == tag.strip().lower()
+            )
+            query = query.where(Memory.id.in_(tagged))
+        if after is not None:
+            query = query.where(after_memory_cursor(after))
+        # Порядок совпадает с индексом ix_memory_user_id_importance_updated_at
+        return query.order_by(Memory.importance.desc(), Memory.updated_at.desc(), Memory.id)
+    
     async def get_user_memories(
         self,
         user_id: int,
         memory_type: Optional[str] = None,
         limit: int = 50,
-        offset: int = 0
+        offset: int = 0,
+        tag: Optional[str] = None
     ) -> List[Memory]:
-        """Получить воспоминания пользователя с фильтрацией."""
+        """Получить воспоминания пользователя с фильтрацией (по типу и тегу).
+        
+        Для постраничного показа — `get_user_memories_page`: `offset` читает и
+        отбрасывает все предыдущие строки.
+        """
         async with self.db_manager.get_session() as session:
-            query = select(Memory).where(Memory.user_id == user_id)
-            
-            if memory_type:
-                query = query.where(Memory.memory_type == memory_type)
-            
-            query = query.order_by(Memory.importance.desc(), Memory.updated_at.desc())
+            query = self._user_memories_query(user_id, memory_type, tag)
             query = query.offset(offset).limit(limit)
             
-            result = await session.exec(query)
-            memories = result.all()
+            result = await session.execute(query)
+            memories = result.scalars().all()
             
-            # Логируем доступ
             for memory in memories:
-                await self._log_access(session, memory.id, user_id, "read")
+                self.access_log.record(memory.id, user_id, "read")
             
             return memories
     
+    async def get_user_memories_page(
+        self,
+        user_id: int,
+        after: Optional[MemoryCursor] = None,
+        limit: int = 10,
+        memory_type: Optional[str] = None,
+        tag: Optional[str] = None,
+    ) -> Tuple[List[Memory], Optional[MemoryCursor]]:
+        """Страница списка воспоминаний после курсора и курсор следующей (None — страница последняя).
+        
+        Любая страница стоит как первая: поиск по индексу с курсора, без OFFSET.
+        """
+        async with self.db_manager.get_session() as session:
+            query = self._user_memories_query(user_id, memory_type, tag, after).limit(limit + 1)
+            memories = list((await session.execute(query)).scalars().all())
+        
+        page = memories[:limit]
+        for memory in page:
+            self.access_log.record(memory.id, user_id, "read")
+        return page, memory_cursor(page[-1]) if len(memories) > limit else None
+    
     async def search_memories(
         self,
         user_id: int,
@@ -105,31 +322,17 @@ class MemoryBankService:
         memory_type: Optional[str] = None,
         limit: int = 20
     ) -> List[Memory]:
-        """Поиск воспоминаний по тексту."""
+        """Поиск воспоминаний по тексту (полнотекстовый индекс, см. `src.db.memory_search`)."""
         async with self.db_manager.get_session() as session:
-            query = select(Memory).where(
-                and_(
-                    Memory.user_id == user_id,
-                    or_(
-                        Memory.title.ilike(f"%{query_text}%"),
-                        Memory.content.ilike(f"%{query_text}%"),
-                        Memory.tags.ilike(f"%{query_text}%")
-                    )
-                )
-            )
-            
-            if memory_type:
-                query = query.where(Memory.memory_type == memory_type)
-            
-            query = query.order_by(Memory.importance.desc(), Memory.updated_at.desc())
-            query = query.limit(limit)
+            query = build_search_query(session.bind.dialect.name, user_id, query_text, memory_type, limit)
+            if query is None:
+                return []
             
-            result = await session.exec(query)
-            memories = result.all()
+            result = await session.execute(query)
+            memories = result.scalars().all()
             
-            # Логируем доступ
             for memory in memories:
-                await self._log_access(session, memory.id, user_id, "read", f"search: {query_text}")
+                self.access_log.record(memory.id, user_id, "read", f"search: {query_text}")
             
             return memories
     
@@ -146,15 +349,16 @@ class MemoryBankService:
     ) -> Optional[Memory]:
         """Обновить воспоминание."""
         async with self.db_manager.get_session() as session:
-            result = await session.exec(
+            result = await session.execute(
                 select(Memory).where(
                     and_(Memory.id == memory_id, Memory.user_id == user_id)
                 )
             )
-            memory = result.first()
+            memory = result.scalars().first()
             
             if not memory:
                 return None
+            before = MemorySummary.of(memory)
             
             # Обновляем только переданные поля
             if title is not None:
@@ -167,15 +371,20 @@ class MemoryBankService:
                 memory.importance = importance
             if tags is not None:
                 memory.tags = tags
+                await self._replace_tags(session, memory)
             if related_memories is not None:
                 memory.related_memories = related_memories
+                await self._replace_links(session, memory)
             
             memory.updated_at = datetime.now(timezone.utc)
+            await session.flush()
+            await apply_memory_change(session, user_id, added=MemorySummary.of(memory), removed=before)
             
             await session.commit()
             await session.refresh(memory)
             
-            await self._log_access(session, memory_id, user_id, "update")
+            self.digest_cache.invalidate(user_id)
+            self.access_log.record(memory_id, user_id, "update")
             
             logger.info(f"Обновлено воспоминание {memory_id} для пользователя {user_id}")
             return memory
@@ -183,123 +392,137 @@ class MemoryBankService:
     async def delete_memory(self, memory_id: int, user_id: int) -> bool:
         """Удалить воспоминание."""
         async with self.db_manager.get_session() as session:
-            result = await session.exec(
+            result = await session.execute(
                 select(Memory).where(
                     and_(Memory.id == memory_id, Memory.user_id == user_id)
                 )
             )
-            memory = result.first()
+            memory = result.scalars().first()
             
             if not memory:
                 return False
             
+            # Журнал удалённого воспоминания ссылался бы на несуществующую строку
+            self.access_log.discard(memory_id)
+            await session.execute(delete(MemoryAccess).where(MemoryAccess.memory_id == memory_id))
+            await session.execute(delete(MemoryTag).where(MemoryTag.memory_id == memory_id))
+            await session.execute(
+                delete(MemoryLink).where(
+                    or_(MemoryLink.source_id == memory_id, MemoryLink.target_id == memory_id)
+                )
+            )
+            removed = MemorySummary.of(memory)
             await session.delete(memory)
+            await session.flush()
+            await apply_memory_change(session, user_id, removed=removed)
             await session.commit()
             
-            await self._log_access(session, memory_id, user_id, "delete")
+            self.digest_cache.invalidate(user_id)
             
             logger.info(f"Удалено воспоминание {memory_id} для пользователя {user_id}")
             return True
     
     async def get_memory_stats(self, user_id: int) -> Dict[str, Any]:
-        """Получить статистику воспоминаний пользователя."""
+        """Получить статистику воспоминаний пользователя (одна строка `memory_stats`)."""
         async with self.db_manager.get_session() as session:
-            # Общее количество воспоминаний
-            total_result = await session.exec(
-                select(func.count(Memory.id)).where(Memory.user_id == user_id)
-            )
-            total_memories = total_result.first() or 0
-            
-            # Количество по типам
-            type_result = await session.exec(
-                select(Memory.memory_type, func.count(Memory.id))
-                .where(Memory.user_id == user_id)
-                .group_by(Memory.memory_type)
-            )
-            memories_by_type = dict(type_result.all())
-            
-            # Последние воспоминания
-            recent_result = await session.exec(
-                select(Memory)
-                .where(Memory.user_id == user_id)
-                .order_by(Memory.updated_at.desc())
-                .limit(5)
-            )
-            recent_memories = recent_result.all()
-            
-            return {
-                "total_memories": total_memories,
-                "memories_by_type": memories_by_type,
-                "recent_memories": [
-                    {
-                        "id": m.id,
-                        "title": m.title,
-                        "type": m.memory_type,
-                        "updated_at": m.updated_at.isoformat()
-                    }
-                    for m in recent_memories
-                ]
-            }
+            return await load_memory_stats(session, user_id)
     
-    async def get_related_memories(self, memory_id: int, user_id: int) -> List[Memory]:
-        """Получить связанные воспоминания."""
+    async def rebuild_stats(self, user_id: Optional[int] = None) -> int:
+        """Пересчитать статистику с нуля (всех пользователей или одного)."""
         async with self.db_manager.get_session() as session:
-            # Получаем текущее воспоминание
-            result = await session.exec(
-                select(Memory).where(
-                    and_(Memory.id == memory_id, Memory.user_id == user_id)
-                )
-            )
-            memory = result.first()
-            
-            if not memory or not memory.related_memories:
-                return []
-            
-            # Получаем связанные воспоминания
-            related_ids = [int(id_str.strip()) for id_str in memory.related_memories.split(",")]
-            related_result = await session.exec(
-                select(Memory).where(
-                    and_(
-                        Memory.id.in_(related_ids),
-                        Memory.user_id == user_id
-                    )
-                )
-            )
-            
-            return related_result.all()
+            rebuilt = await rebuild_memory_stats(session, user_id)
+        logger.info(f"Пересчитана статистика Memory Bank: {rebuilt} пользователей")
+        return rebuilt
+    
+    async def get_related_memories(self, memory_id: int, user_id: int, depth: int = 1) -> List[Memory]:
+        """Получить воспоминания в `depth` шагах по связям (одним запросом)."""
+        return [memory for memory, _ in await self.get_memory_neighborhood(user_id, [memory_id], depth)]
     
-    async def _log_access(
+    async def get_memory_neighborhood(
         self,
-        session: AsyncSession,
-        memory_id: int,
         user_id: int,
-        access_type: str,
-        context: Optional[str] = None
-    ) -> None:
-        """Логировать доступ к воспоминанию."""
-        access_log = MemoryAccess(
-            memory_id=memory_id,
-            user_id=user_id,
-            access_type=access_type,
-            context=context
+        memory_ids: List[int],
+        depth: int = 1,
+        limit: Optional[int] = None
+    ) -> List[Tuple[Memory, int]]:
+        """Связанные воспоминания нескольких исходных с числом шагов до них."""
+        if not memory_ids or depth < 1:
+            return []
+        async with self.db_manager.get_session() as session:
+            query = related_memories_query(user_id, memory_ids, depth)
+            if limit is not None:
+                query = query.limit(limit)
+            result = await session.execute(query)
+            return [(memory, steps) for memory, steps in result.all()]
+    
+    async def _replace_tags(self, session: AsyncSession, memory: Memory) -> None:
+        """Перезаписать теги воспоминания по строке `memory.tags`."""
+        await session.execute(delete(MemoryTag).where(MemoryTag.memory_id == memory.id))
+        rows = [
+            {"memory_id": memory.id, "tag": tag, "user_id": memory.user_id}
+            for tag in parse_tags(memory.tags)
+        ]
+        if rows:
+            await session.execute(insert(MemoryTag), rows)
+    
+    async def _replace_links(self, session: AsyncSession, memory: Memory) -> None:
+        """Перезаписать связи по строке `memory.related_memories` (только с воспоминаниями того же пользователя)."""
+        await session.execute(delete(MemoryLink).where(MemoryLink.source_id == memory.id))
+        wanted = [i for i in parse_memory_ids(memory.related_memories) if i != memory.id]
+        if not wanted:
+            return
+        result = await session.execute(
+            select(Memory.id).where(Memory.id.in_(wanted), Memory.user_id == memory.user_id)
         )
-        session.add(access_log)
-        await session.commit()
+        existing = set(result.scalars().all())
+        rows = [{"source_id": memory.id, "target_id": i} for i in wanted if i in existing]
+        if rows:
+            await session.execute(insert(MemoryLink), rows)
     
-    async def get_memory_context_for_ai(self, user_id: int, limit: int = 10) -> str:
-        """Получить контекст воспоминаний для передачи в AI."""
-        memories = await self.get_user_memories(user_id, limit=limit)
-        
-        if not memories:
-            return "У пользователя пока нет сохраненных воспоминаний."
+    async def get_memory_context_for_ai(
+        self,
+        user_id: int,
+        query: Optional[str] = None,
+        token_budget: int = DEFAULT_TOKEN_BUDGET
+    ) -> str:
+        """Получить контекст воспоминаний для передачи в AI.
         
-        context_parts = ["Контекст пользователя из Memory Bank:"]
+        Воспоминания выбираются по релевантности `query` (обычно текущее
+        сообщение пользователя) и укладываются в `token_budget`.
+        """
+        digest = await self._get_digest(user_id)
+        context, memory_ids = digest.render(query, token_budget)
+        for memory_id in memory_ids:
+            self.access_log.record(memory_id, user_id, "read", "ai_context")
+        return context
+    
+    async def _get_digest(self, user_id: int) -> MemoryDigest:
+        """Дайджест из кеша или из БД (два запроса: воспоминания и связи между ними)."""
+        digest = self.digest_cache.get(user_id)
+        if digest is not None:
+            return digest
         
-        for memory in memories:
-            context_parts.append(
-                f"- {memory.title} ({memory.memory_type}): {memory.content}"
+        generation = self.digest_cache.generation(user_id)
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(
+                select(
+                    Memory.id, Memory.title, Memory.content, Memory.memory_type, Memory.importance, Memory.tags
+                )
+                .where(Memory.user_id == user_id)
+                .order_by(Memory.importance.desc(), Memory.updated_at.desc())
+                .limit(DIGEST_MAX_MEMORIES)
             )
-            if memory.tags:
-                context_parts.append(f"  Теги: {memory.tags}")
+            entries = [DigestEntry.build(*row) for row in result.all()]
+            pairs = []
+            if entries:
+                ids = [entry.id for entry in entries]
+                links = await session.execute(
+                    select(MemoryLink.source_id, MemoryLink.target_id).where(
+                        MemoryLink.source_id.in_(ids), MemoryLink.target_id.in_(ids)
+                    )
+                )
+                pairs = links.all()
         
-        return "\n".join(context_parts)
+        digest = MemoryDigest(entries, build_links(pairs))
+        self.digest_cache.put(user_id, digest, generation)
+        return digest
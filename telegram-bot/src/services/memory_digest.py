@@ -0,0 +1,225 @@
+"""src/services/memory_digest.py
+Дайджест Memory Bank для контекста AI.
+
+Воспоминания пользователя (до `DIGEST_MAX_MEMORIES` самых важных) и связи
+между ними загружаются один раз и кешируются в процессе (LRU с TTL).
+`MemoryBankService` сбрасывает запись пользователя при любом изменении его
+воспоминаний; другие процессы увидят изменение не позже чем через TTL.
+
+На каждое сообщение дайджест выбирает воспоминания без обращения к БД:
+BM25 по заголовку (двойной вес), тегам и тексту с учётом важности, затем
+связанные с найденными — пока хватает бюджета токенов. Если запроса нет
+или ничего не нашлось, берутся самые важные. Токены оцениваются по длине
+текста (`estimate_tokens`), без токенизатора модели.
+"""
+from __future__ import annotations
+
+import math
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from src.services.metrics import counter
+
+DEFAULT_TOKEN_BUDGET = 600
+DEFAULT_DIGEST_TTL = 600.0
+DEFAULT_DIGEST_CACHE_SIZE = 10_000
+DIGEST_MAX_MEMORIES = 200
+
+# Примерно символов на токен для смеси русского и английского текста
+CHARS_PER_TOKEN = 3
+# Длина основы слова: грубая замена стеммеру для русских окончаний
+STEM_LENGTH = 6
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+CONTEXT_HEADER = "Контекст пользователя из Memory Bank:"
+RELATED_HEADER = "Связанные воспоминания:"
+EMPTY_CONTEXT = "У пользователя пока нет сохраненных воспоминаний."
+
+DIGEST_CACHE = counter("bot_memory_digest_cache_total", "Обращений к кешу дайджестов Memory Bank по результату")
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов по длине текста (с запасом для кириллицы)."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def terms(text: Optional[str]) -> List[str]:
+    """Текст → основы слов для BM25."""
+    if not text:
+        return []
+    return [word[:STEM_LENGTH] for word in _WORD.findall(text.lower())]
+
+
+@dataclass(frozen=True, slots=True)
+class DigestEntry:
+    """Воспоминание в дайджесте: готовая строка для промпта и частоты терминов."""
+
+    id: int
+    importance: int
+    text: str
+    tokens: int
+    term_counts: Dict[str, int]
+    length: int
+
+    @classmethod
+    def build(
+        cls,
+        memory_id: int,
+        title: str,
+        content: str,
+        memory_type: str,
+        importance: int,
+        tags: Optional[str],
+    ) -> "DigestEntry":
+        text = f"- {title} ({memory_type}): {content}"
+        if tags:
+            text += f"\n  Теги: {tags}"
+        words = terms(title) * 2 + terms(tags) + terms(content)
+        return cls(memory_id, importance, text, estimate_tokens(text) + 1, dict(Counter(words)), len(words))
+
+
+@dataclass
+class MemoryDigest:
+    """Снимок воспоминаний пользователя с индексом BM25."""
+
+    entries: List[DigestEntry]
+    links: Dict[int, List[int]] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self._by_id = {entry.id: entry for entry in self.entries}
+        self._doc_freq: Counter = Counter()
+        for entry in self.entries:
+            self._doc_freq.update(entry.term_counts.keys())
+        self._avg_length = (sum(e.length for e in self.entries) / len(self.entries)) if self.entries else 0.0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def score(self, entry: DigestEntry, query_terms: Iterable[str]) -> float:
+        """BM25 воспоминания по запросу, умноженный на важность."""
+        total = len(self.entries)
+        score = 0.0
+        for term in query_terms:
+            frequency = entry.term_counts.get(term)
+            if not frequency:
+                continue
+            df = self._doc_freq[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * entry.length / (self._avg_length or 1))
+            score += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return score * (1 + entry.importance / 10.0)
+
+    def select(
+        self, query: Optional[str], token_budget: int = DEFAULT_TOKEN_BUDGET
+    ) -> Tuple[List[DigestEntry], List[DigestEntry]]:
+        """Выбрать воспоминания в пределах бюджета: (найденные, связанные с ними)."""
+        budget = token_budget - estimate_tokens(CONTEXT_HEADER)
+        query_terms = set(terms(query))
+        scored = [(self.score(entry, query_terms), entry) for entry in self.entries] if query_terms else []
+        ranked = [entry for score, entry in sorted(scored, key=lambda pair: -pair[0]) if score > 0]
+        if not ranked:
+            # Запрос ни с чем не совпал — самые важные (entries уже так упорядочены)
+            ranked = self.entries
+
+        chosen: List[DigestEntry] = []
+        taken: Set[int] = set()
+        for entry in ranked:
+            if entry.tokens <= budget:
+                chosen.append(entry)
+                taken.add(entry.id)
+                budget -= entry.tokens
+
+        related: List[DigestEntry] = []
+        budget -= estimate_tokens(RELATED_HEADER)
+        for entry in chosen:
+            for linked_id in self.links.get(entry.id, ()):
+                linked = self._by_id.get(linked_id)
+                if linked is None or linked.id in taken or linked.tokens > budget:
+                    continue
+                related.append(linked)
+                taken.add(linked.id)
+                budget -= linked.tokens
+        return chosen, related
+
+    def render(self, query: Optional[str], token_budget: int = DEFAULT_TOKEN_BUDGET) -> Tuple[str, List[int]]:
+        """Текст контекста и ID вошедших в него воспоминаний."""
+        if not self.entries:
+            return EMPTY_CONTEXT, []
+        chosen, related = self.select(query, token_budget)
+        parts = [CONTEXT_HEADER] + [entry.text for entry in chosen]
+        if related:
+            parts.append(RELATED_HEADER)
+            parts.extend(entry.text for entry in related)
+        return "\n".join(parts), [entry.id for entry in chosen + related]
+
+
+def build_links(pairs: Sequence[Tuple[int, int]]) -> Dict[int, List[int]]:
+    """Пары связей → соседи в обе стороны."""
+    links: Dict[int, List[int]] = {}
+    for source_id, target_id in pairs:
+        links.setdefault(source_id, []).append(target_id)
+        links.setdefault(target_id, []).append(source_id)
+    return links
+
+
+class MemoryDigestCache:
+    """Ограниченный LRU с TTL: ID пользователя → дайджест."""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_DIGEST_CACHE_SIZE,
+        ttl: float = DEFAULT_DIGEST_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[int, Tuple[float, MemoryDigest]] = OrderedDict()
+        # Поколение пользователя растёт при каждом его сбросе: дайджест, собранный
+        # до сброса, не кладётся в кеш; изменения других пользователей его не трогают
+        self._generations: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[MemoryDigest]:
+        cached = self._entries.get(user_id)
+        if cached is None or self._clock() - cached[0] > self.ttl:
+            self._entries.pop(user_id, None)
+            DIGEST_CACHE.inc(result="miss")
+            return None
+        self._entries.move_to_end(user_id)
+        DIGEST_CACHE.inc(result="hit")
+        return cached[1]
+
+    def generation(self, user_id: int) -> int:
+        """Текущее поколение дайджеста пользователя (снимается до чтения из БД)."""
+        return self._generations.get(user_id, 0)
+
+    def put(self, user_id: int, digest: MemoryDigest, generation: Optional[int] = None) -> None:
+        """Сохранить дайджест; `generation` — значение `generation(user_id)` до чтения из БД."""
+        if generation is not None and generation != self.generation(user_id):
+            return
+        self._entries[user_id] = (self._clock(), digest)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Сбросить дайджест пользователя (после изменения его воспоминаний)."""
+        self._entries.pop(user_id, None)
+        self._generations[user_id] = self.generation(user_id) + 1
+
+
+_digest_cache = MemoryDigestCache()
+
+
+def get_memory_digest_cache() -> MemoryDigestCache:
+    """Общий для процесса кеш дайджестов Memory Bank."""
+    return _digest_cache
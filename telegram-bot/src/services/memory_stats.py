@@ -0,0 +1,214 @@
+"""src/services/memory_stats.py
+Материализованная статистика Memory Bank (таблица `memory_stats`).
+
+Строка на пользователя: всего воспоминаний, количество по типам и
+последние изменённые воспоминания. `MemoryBankService` обновляет её
+в той же транзакции, что и само воспоминание (`apply_memory_change`,
+строка блокируется `FOR UPDATE`), поэтому чтение статистики — один
+поиск по первичному ключу. Строки нет — она вычисляется по `memory`
+и сохраняется. `rebuild_memory_stats` пересчитывает счётчики с нуля
+(см. `rebuild_memory_stats.py`).
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.models import Memory, MemoryStats
+
+RECENT_LIMIT = 5
+
+
+@dataclass(frozen=True, slots=True)
+class MemorySummary:
+    """Поля воспоминания, нужные статистике."""
+
+    id: int
+    title: str
+    memory_type: str
+    updated_at: datetime
+
+    @classmethod
+    def of(cls, memory: Memory) -> "MemorySummary":
+        return cls(memory.id, memory.title, memory.memory_type, memory.updated_at)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "type": self.memory_type,
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+
+def stats_to_dict(stats: MemoryStats) -> Dict[str, Any]:
+    """Строка `memory_stats` → формат `MemoryBankService.get_memory_stats`."""
+    return {
+        "total_memories": stats.total,
+        "memories_by_type": json.loads(stats.by_type),
+        "recent_memories": json.loads(stats.recent),
+    }
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+async def compute_memory_stats(
+    session: AsyncSession,
+    user_ids: Optional[Iterable[int]] = None,
+) -> Dict[int, MemoryStats]:
+    """Посчитать статистику по таблице `memory` (все пользователи или `user_ids`).
+
+    Два запроса при любом числе пользователей: GROUP BY по типам и
+    последние воспоминания через `row_number()` в окне пользователя.
+    """
+    counts = select(Memory.user_id, Memory.memory_type, func.count()).group_by(
+        Memory.user_id, Memory.memory_type
+    )
+    ranked = select(
+        Memory.user_id,
+        Memory.id,
+        Memory.title,
+        Memory.memory_type,
+        Memory.updated_at,
+        func.row_number()
+        .over(partition_by=Memory.user_id, order_by=(Memory.updated_at.desc(), Memory.id.desc()))
+        .label("position"),
+    )
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        counts = counts.where(Memory.user_id.in_(user_ids))
+        ranked = ranked.where(Memory.user_id.in_(user_ids))
+    ranked = ranked.subquery("ranked")
+    recent = (
+        select(ranked.c.user_id, ranked.c.id, ranked.c.title, ranked.c.memory_type, ranked.c.updated_at)
+        .where(ranked.c.position <= RECENT_LIMIT)
+        .order_by(ranked.c.user_id, ranked.c.position)
+    )
+
+    by_type: Dict[int, Dict[str, int]] = {user_id: {} for user_id in user_ids or ()}
+    for user_id, memory_type, count in (await session.execute(counts)).all():
+        by_type.setdefault(user_id, {})[memory_type] = count
+    recent_by_user: Dict[int, List[Dict[str, Any]]] = {}
+    for user_id, *fields in (await session.execute(recent)).all():
+        recent_by_user.setdefault(user_id, []).append(MemorySummary(*fields).to_json())
+
+    now = datetime.now(timezone.utc)
+    return {
+        user_id: MemoryStats(
+            user_id=user_id,
+            total=sum(types.values()),
+            by_type=_dumps(types),
+            recent=_dumps(recent_by_user.get(user_id, [])),
+            updated_at=now,
+        )
+        for user_id, types in by_type.items()
+    }
+
+
+async def _insert_if_absent(session: AsyncSession, stats: MemoryStats) -> bool:
+    """Сохранить вычисленную строку, если её ещё нет. True — вставлена нами."""
+    dialect = session.bind.dialect.name if session.bind is not None else "postgresql"
+    statement = (sqlite_insert if dialect == "sqlite" else pg_insert)(MemoryStats).values(
+        user_id=stats.user_id,
+        total=stats.total,
+        by_type=stats.by_type,
+        recent=stats.recent,
+        updated_at=stats.updated_at,
+    )
+    statement = statement.on_conflict_do_nothing(index_elements=[MemoryStats.user_id]).returning(
+        MemoryStats.user_id
+    )
+    return (await session.execute(statement)).first() is not None
+
+
+async def _locked(session: AsyncSession, user_id: int) -> Optional[MemoryStats]:
+    result = await session.execute(
+        select(MemoryStats).where(MemoryStats.user_id == user_id).with_for_update()
+    )
+    return result.scalars().first()
+
+
+async def load_memory_stats(session: AsyncSession, user_id: int) -> Dict[str, Any]:
+    """Статистика пользователя: поиск по первичному ключу (при первом обращении — расчёт)."""
+    stats = await session.get(MemoryStats, user_id)
+    if stats is None:
+        stats = (await compute_memory_stats(session, [user_id]))[user_id]
+        await _insert_if_absent(session, stats)
+    return stats_to_dict(stats)
+
+
+async def apply_memory_change(
+    session: AsyncSession,
+    user_id: int,
+    added: Optional[MemorySummary] = None,
+    removed: Optional[MemorySummary] = None,
+) -> None:
+    """Учесть в статистике создание (`added`), удаление (`removed`) или изменение (оба).
+
+    Вызывается в транзакции изменения воспоминания, после того как оно
+    отправлено в БД (flush): строка статистики блокируется до коммита.
+    """
+    stats = await _locked(session, user_id)
+    if stats is None:
+        # Расчёт по таблице уже учитывает это изменение
+        if await _insert_if_absent(session, (await compute_memory_stats(session, [user_id]))[user_id]):
+            return
+        # Строку одновременно создала другая транзакция — применяем изменение к ней
+        stats = await _locked(session, user_id)
+
+    by_type: Dict[str, int] = json.loads(stats.by_type)
+    recent: List[Dict[str, Any]] = json.loads(stats.recent)
+    if removed is not None:
+        stats.total -= 1
+        left = by_type.get(removed.memory_type, 0) - 1
+        if left > 0:
+            by_type[removed.memory_type] = left
+        else:
+            by_type.pop(removed.memory_type, None)
+        recent = [item for item in recent if item["id"] != removed.id]
+    if added is not None:
+        stats.total += 1
+        by_type[added.memory_type] = by_type.get(added.memory_type, 0) + 1
+        recent = [added.to_json()] + [item for item in recent if item["id"] != added.id]
+    recent = recent[:RECENT_LIMIT]
+
+    if len(recent) < min(RECENT_LIMIT, stats.total):
+        # Удалили одно из последних — добираем список из таблицы
+        recent = json.loads((await compute_memory_stats(session, [user_id]))[user_id].recent)
+
+    stats.by_type = _dumps(by_type)
+    stats.recent = _dumps(recent)
+    stats.updated_at = datetime.now(timezone.utc)
+
+
+async def rebuild_memory_stats(session: AsyncSession, user_id: Optional[int] = None) -> int:
+    """Пересчитать статистику с нуля (всех пользователей или одного). Возвращает число строк."""
+    computed = await compute_memory_stats(session, None if user_id is None else [user_id])
+    scope = delete(MemoryStats)
+    if user_id is not None:
+        scope = scope.where(MemoryStats.user_id == user_id)
+    await session.execute(scope)
+    if computed:
+        await session.execute(
+            insert(MemoryStats),
+            [
+                {
+                    "user_id": stats.user_id,
+                    "total": stats.total,
+                    "by_type": stats.by_type,
+                    "recent": stats.recent,
+                    "updated_at": stats.updated_at,
+                }
+                for stats in computed.values()
+            ],
+        )
+    return len(computed)
@@ -0,0 +1,190 @@
+"""src/services/metrics.py
+Метрики процесса в текстовом формате Prometheus (без внешних зависимостей).
+
+Счётчики, gauge и гистограммы регистрируются в общем реестре и отдаются
+через `render_metrics()`. Gauge может вычисляться при снятии метрик
+(`set_collector`) — так экспортируются значения, которые дорого обновлять
+на каждое событие.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Монотонно растущий счётчик."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Gauge:
+    """Значение, которое может расти и убывать."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._collector: Optional[Callable[[], Iterable[Tuple[Dict[str, object], float]]]] = None
+
+    def set(self, value: float, **labels: object) -> None:
+        self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+    def remove(self, **labels: object) -> None:
+        self._values.pop(_label_key(labels), None)
+
+    def value(self, **labels: object) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def set_collector(self, collector: Callable[[], Iterable[Tuple[Dict[str, object], float]]]) -> None:
+        """Вычислять значения при снятии метрик: collector() -> [(labels, value), ...]."""
+        self._collector = collector
+
+    def samples(self) -> List[str]:
+        values = dict(self._values)
+        if self._collector is not None:
+            for labels, value in self._collector():
+                values[_label_key(labels)] = value
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in values.items()]
+
+
+class Histogram:
+    """Распределение значений по корзинам (накопительные счётчики)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (счётчики по корзинам, сумма, количество)
+        self._values: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = _label_key(labels)
+        counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] += 1
+        self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: object) -> int:
+        item = self._values.get(_label_key(labels))
+        return item[2] if item else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def _get_or_create(self, cls, name: str, documentation: str, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(name, documentation, **kwargs)
+            self._metrics[name] = metric
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Метрика {name} уже зарегистрирована как {metric.kind}")
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._get_or_create(Counter, name, documentation)
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation)
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# Общий реестр процесса
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, documentation: str) -> Counter:
+    return REGISTRY.counter(name, documentation)
+
+
+def gauge(name: str, documentation: str) -> Gauge:
+    return REGISTRY.gauge(name, documentation)
+
+
+def histogram(name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, documentation, buckets)
+
+
+def render_metrics() -> str:
+    """Снять все метрики процесса в формате Prometheus."""
+    return REGISTRY.render()
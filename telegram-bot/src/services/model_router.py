@@ -0,0 +1,159 @@
+"""src/services/model_router.py
+Выбор модели OpenAI и лимита токенов по типу запроса.
+
+Тип запроса (анализ/прогноз/совместимость/реализация/практики/детализация)
+и ожидаемый объём ответа определяют уровень модели и max_tokens. Если модель
+уровня отвечает медленнее своего SLO или часто ошибается, запрос уходит
+на более быстрый уровень. Небольшая доля запросов всё равно отправляется
+на деградировавший уровень: так он набирает свежую статистику и возвращается
+в работу после восстановления.
+"""
+from __future__ import annotations
+
+import logging
+import random
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.services.openai_resilience import ResilientCaller, get_openai_caller
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class ModelTier:
+    """Уровень модели: от самого качественного к самому быстрому."""
+
+    name: str
+    model: str
+    latency_slo: float  # допустимый p95, секунды
+
+
+@dataclass(frozen=True, slots=True)
+class RouteDecision:
+    """Результат маршрутизации запроса."""
+
+    model: str
+    max_tokens: int
+    tier: str
+    degraded: bool = False
+
+
+# Уровни по убыванию качества (и задержки)
+MODEL_TIERS: Tuple[ModelTier, ...] = (
+    ModelTier(name="flagship", model="gpt-4o", latency_slo=15.0),
+    ModelTier(name="fast", model="gpt-4o-mini", latency_slo=10.0),
+)
+
+# Тип запроса -> (уровень, базовый max_tokens)
+INTENT_POLICY: Dict[str, Tuple[str, int]] = {
+    "анализ": ("flagship", 2000),
+    "прогноз": ("flagship", 1500),
+    "совместимость": ("flagship", 1500),
+    "реализация": ("flagship", 1500),
+    "практики": ("fast", 1200),
+    "детализация": ("fast", 1000),
+}
+
+# Множители лимита токенов по ожидаемому объёму ответа
+SIZE_MULTIPLIERS: Dict[str, float] = {"short": 0.5, "normal": 1.0, "long": 1.5}
+
+MAX_TOKENS_CAP = 3000
+MAX_ERROR_RATE = 0.5
+# Доля запросов, которая идёт на деградировавший уровень как проба
+PROBE_SHARE = 0.05
+
+_LONG_MARKERS = ("подробн", "полный", "полностью", "развернут", "всё о", "все о")
+_SHORT_MARKERS = ("кратко", "коротко", "в двух словах", "одним словом", "да или нет")
+
+
+def estimate_answer_size(user_query: str) -> str:
+    """Оценить ожидаемый объём ответа по тексту запроса: short|normal|long."""
+    text = user_query.lower()
+    if any(marker in text for marker in _SHORT_MARKERS):
+        return "short"
+    if any(marker in text for marker in _LONG_MARKERS):
+        return "long"
+    return "normal"
+
+
+class ModelRouter:
+    """Маршрутизатор запросов по уровням моделей с учётом их здоровья."""
+
+    def __init__(
+        self,
+        caller: Optional[ResilientCaller] = None,
+        tiers: Tuple[ModelTier, ...] = MODEL_TIERS,
+        probe_share: float = PROBE_SHARE,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        self.caller = caller or get_openai_caller()
+        self.tiers = tiers
+        self.probe_share = probe_share
+        self._rng = rng
+        self._tier_index = {tier.name: i for i, tier in enumerate(tiers)}
+
+    def route(self, intent: str, size: str = "normal", prefer_fast: bool = False) -> RouteDecision:
+        """Выбрать модель и max_tokens для запроса."""
+        tier_name, base_tokens = INTENT_POLICY.get(intent, INTENT_POLICY["анализ"])
+        max_tokens = min(MAX_TOKENS_CAP, int(base_tokens * SIZE_MULTIPLIERS.get(size, 1.0)))
+
+        start = len(self.tiers) - 1 if prefer_fast else self._tier_index[tier_name]
+        for index in range(start, len(self.tiers)):
+            tier = self.tiers[index]
+            is_last = index == len(self.tiers) - 1
+            if is_last or self.is_healthy(tier) or self._probe(tier):
+                return RouteDecision(
+                    model=tier.model,
+                    max_tokens=max_tokens,
+                    tier=tier.name,
+                    degraded=index != start,
+                )
+        raise RuntimeError("Не настроены уровни моделей")  # pragma: no cover
+
+    def is_healthy(self, tier: ModelTier) -> bool:
+        """Укладывается ли модель в SLO по задержке и доле ошибок.
+
+        Пока свежих вызовов меньше `min_samples`, модель считается здоровой:
+        одна-две ошибки не повод уводить весь трафик.
+        """
+        tracker = self.caller.tracker(tier.model)
+        p95 = tracker.percentile(0.95)
+        if p95 is not None and p95 > tier.latency_slo:
+            return False
+        if tracker.outcomes < tracker.min_samples:
+            return True
+        return tracker.error_rate <= MAX_ERROR_RATE
+
+    def _probe(self, tier: ModelTier) -> bool:
+        """Отправить ли запрос на деградировавший уровень как пробу."""
+        if self._rng() >= self.probe_share:
+            return False
+        logger.info("Пробный запрос на деградировавшую модель %s", tier.model)
+        return True
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Скользящая статистика по моделям (p50/p95/доля ошибок)."""
+        result = []
+        for tier in self.tiers:
+            tracker = self.caller.tracker(tier.model)
+            result.append({
+                "tier": tier.name,
+                "model": tier.model,
+                "p50": tracker.percentile(0.5),
+                "p95": tracker.percentile(0.95),
+                "error_rate": tracker.error_rate,
+                "healthy": self.is_healthy(tier),
+            })
+        return result
+
+
+_model_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Получить общий для процесса маршрутизатор моделей."""
+    global _model_router
+    if _model_router is None:
+        _model_router = ModelRouter()
+    return _model_router
@@ -1,21 +1,46 @@
 """src/services/openai_context_service.py
 Сервис для работы с OpenAI в контекстном режиме.
+
+Воспоминания пользователя из Memory Bank, относящиеся к текущему сообщению,
+передаются модели отдельным системным сообщением (дайджест кешируется,
+см. `MemoryBankService.get_memory_context_for_ai`).
 """
 from __future__ import annotations
 
-import json
+import asyncio
 from typing import Dict, List, Any, Optional
 from openai import AsyncOpenAI
 
+from src.db.connection import SessionProvider
+from src.services.analytics.analytics_service import AnalyticsService
 from src.services.openai_functions import OpenAIFunctions
+from src.services.openai_resilience import DEFAULT_DEADLINE, get_openai_caller
+from src.services.intent_scanner import detect_intent, scan_message, scan_text
+from src.services.memory_bank_service import MemoryBankService
+from src.services.model_router import ModelRouter, estimate_answer_size
+
+# Общий бюджет времени на ответ (оба обращения к OpenAI), секунды
+RESPONSE_TIME_BUDGET = 40.0
+
+FALLBACK_NOTICE = "⚠️ Сейчас ИИ-сервис отвечает медленно, поэтому отвечаю по базовым расчётам.\n\n"
 
 
 class OpenAIContextService:
     """Сервис для контекстного общения с OpenAI."""
     
-    def __init__(self, api_key: str, db_session):
-        self.client = AsyncOpenAI(api_key=api_key)
-        self.functions = OpenAIFunctions(db_session)
+    def __init__(
+        self,
+        api_key: str,
+        session_provider: SessionProvider,
+        memory_service: Optional[MemoryBankService] = None,
+    ):
+        # Повторы и таймауты контролирует ResilientCaller, а не HTTP-клиент
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0, timeout=DEFAULT_DEADLINE)
+        # Сессии БД берутся только на время вызовов функций, а не на весь ответ
+        self.functions = OpenAIFunctions(session_provider)
+        self.resilience = get_openai_caller()
+        self.router = ModelRouter(self.resilience)
+        self.memory_service = memory_service
         self.system_prompt = self._get_system_prompt()
     
     def _get_system_prompt(self) -> str:
@@ -169,10 +194,26 @@ class OpenAIContextService:
 - Пример с дополнительными данными: 👤 Жаслан | 📅 20.05.1997 + Мария, Иван"""
     
     async def process_message(self, user_message: str, user_id: int, context: List[Dict[str, Any]]) -> str:
-        """Обрабатывает сообщение пользователя с контекстом."""
+        """Обрабатывает сообщение пользователя с контекстом.
+
+        Время ответа ограничено RESPONSE_TIME_BUDGET: при таймауте, ошибке API или
+        разомкнутом circuit breaker отвечаем локальным шаблоном по расчётам.
+        """
+        loop = asyncio.get_running_loop()
+        budget_ends_at = loop.time() + RESPONSE_TIME_BUDGET
+
+        def remaining() -> float:
+            return max(0.0, min(DEFAULT_DEADLINE, budget_ends_at - loop.time()))
+
         try:
-            # Упрощаем - формируем сообщения для OpenAI
-            messages = [{"role": "system", "content": self.system_prompt}]
+            query = self._parse_enhanced_message(user_message)["query"]
+            
+            # Системный промпт и воспоминания пользователя, относящиеся к запросу
+            system_messages = [{"role": "system", "content": self.system_prompt}]
+            memory_context = await self._get_memory_context(user_id, query)
+            if memory_context:
+                system_messages.append({"role": "system", "content": memory_context})
+            messages = list(system_messages)
             
             # Добавляем контекст (последние 10 сообщений)
             for msg in context[-10:]:  # Берем последние 10 сообщений
@@ -187,49 +228,71 @@ class OpenAIContextService:
                 "content": user_message
             })
             
-            # Получаем функции
-            functions = self.functions.get_functions_schema()
+            # Получаем инструменты
+            tools = self.functions.get_tools_schema()
+            
+            # Модель и лимит токенов выбираются по типу запроса и здоровью моделей
+            route = self.router.route(
+                self._detect_request_type_from_context(query, context),
+                estimate_answer_size(query),
+            )
             
             # Отправляем запрос в OpenAI
-            response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                functions=functions,
-                function_call="auto",
-                temperature=0.7,
-                max_tokens=2000
+            response = await self.resilience.call(
+                lambda: self.client.chat.completions.create(
+                    model=route.model,
+                    messages=messages,
+                    tools=tools,
+                    tool_choice="auto",
+                    temperature=0.7,
+                    max_tokens=route.max_tokens
+                ),
+                key=route.model,
+                deadline=remaining(),
             )
             
             message = response.choices[0].message
             
-            # Если есть вызов функции
-            if message.function_call:
-                function_name = message.function_call.name
-                arguments = json.loads(message.function_call.arguments)
-                
-                # Упрощаем - не добавляем сложную логику с типами запросов
-                
-                # Выполняем функцию
-                function_result = await self.functions.execute_function(function_name, arguments)
-                
-                # Упрощаем - возвращаем результат функции как есть, OpenAI сам обработает
-                if function_result.get("error"):
-                    return f"❌ {function_result['error']}"
-                
-                # Формируем сообщение с результатом для OpenAI
-                result_message = f"Результат выполнения функции {function_name}:\n{json.dumps(function_result, ensure_ascii=False, indent=2)}"
+            # Если модель вызвала инструменты (например, по одному на каждого человека)
+            if message.tool_calls:
+                # Выполняем все вызовы конкурентно; ошибки уходят модели как результаты
+                tool_messages = await self.functions.execute_tool_calls(message.tool_calls)
                 
-                # Отправляем результат обратно в OpenAI для генерации ответа
-                messages = [{"role": "system", "content": self.system_prompt}]
+                # Отправляем все результаты обратно в OpenAI одним запросом
+                messages = list(system_messages)
                 messages.append({"role": "user", "content": user_message})
-                messages.append({"role": "assistant", "content": result_message})
+                messages.append({
+                    "role": "assistant",
+                    "content": message.content,
+                    "tool_calls": [
+                        {
+                            "id": tool_call.id,
+                            "type": "function",
+                            "function": {
+                                "name": tool_call.function.name,
+                                "arguments": tool_call.function.arguments,
+                            },
+                        }
+                        for tool_call in message.tool_calls
+                    ],
+                })
+                messages.extend(tool_messages)
                 
-                # Получаем финальный ответ от OpenAI
-                final_response = await self.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                    max_tokens=1000,
-                    temperature=0.7
+                # Получаем финальный ответ от OpenAI: данные уже посчитаны, хватает быстрой модели
+                final_route = self.router.route(
+                    self._detect_request_type_from_context(query, context),
+                    estimate_answer_size(query),
+                    prefer_fast=True,
+                )
+                final_response = await self.resilience.call(
+                    lambda: self.client.chat.completions.create(
+                        model=final_route.model,
+                        messages=messages,
+                        max_tokens=final_route.max_tokens,
+                        temperature=0.7
+                    ),
+                    key=final_route.model,
+                    deadline=remaining(),
                 )
                 
                 content = final_response.choices[0].message.content
@@ -240,8 +303,80 @@ class OpenAIContextService:
             return content
             
         except Exception as e:
+            fallback = await self._generate_local_fallback(user_message, user_id, context)
+            if fallback:
+                return fallback
             return f"Извините, произошла ошибка: {str(e)}"
     
+    async def _get_memory_context(self, user_id: int, query: str) -> Optional[str]:
+        """Дайджест воспоминаний для запроса; без Memory Bank ответ не прерывается."""
+        if self.memory_service is None:
+            return None
+        try:
+            return await self.memory_service.get_memory_context_for_ai(user_id, query=query)
+        except Exception as e:
+            print(f"Ошибка загрузки воспоминаний: {e}")
+            return None
+    
+    async def _generate_local_fallback(self, user_message: str, user_id: int, context: List[Dict[str, Any]]) -> Optional[str]:
+        """Детерминированный ответ без OpenAI по данным пользователя из сообщения.
+
+        Возвращает None, если в сообщении нет даты рождения.
+        """
+        parsed = self._parse_enhanced_message(user_message)
+        name = parsed["name"]
+        birth_date = parsed["birth_date"]
+        query = parsed["query"]
+        
+        if not birth_date:
+            return None
+        
+        try:
+            analytics_service = AnalyticsService()
+            if name:
+                analysis = analytics_service.analyze_person(birth_date, name)
+            else:
+                analysis = analytics_service.analyze_person_date_only(birth_date)
+            
+            request_type = self._detect_request_type_from_context(query, context)
+            if request_type == "прогноз":
+                response = await self._generate_forecast_response(analysis, birth_date, name, user_id)
+            elif request_type == "совместимость":
+                response = await self._generate_compatibility_response(analysis, birth_date, name, user_id)
+            elif request_type == "реализация":
+                response = await self._generate_implementation_response(analysis, birth_date, name, user_id)
+            elif request_type == "практики":
+                response = await self._generate_general_practices_advice(analysis, birth_date, name, query.lower())
+            elif request_type == "детализация":
+                response = await self._generate_detailed_response(analysis, birth_date, name, user_id, query)
+            else:
+                response = await self._generate_standard_response(analysis, birth_date, name, user_id)
+        except Exception as e:
+            print(f"Ошибка локального ответа: {e}")
+            return None
+        
+        return FALLBACK_NOTICE + response
+    
+    def _parse_enhanced_message(self, user_message: str) -> Dict[str, Optional[str]]:
+        """Разбирает сообщение из _enhance_message_with_context.
+
+        Возвращает исходный запрос пользователя, имя и дату рождения
+        (первые вхождения; None, если строки нет). Если строки
+        "Пользователь:" нет, запросом считается всё сообщение.
+        """
+        parsed: Dict[str, Optional[str]] = {"query": None, "name": None, "birth_date": None}
+        prefixes = (("Пользователь:", "query"), ("Имя:", "name"), ("Дата рождения:", "birth_date"))
+        for line in user_message.split('\n'):
+            line = line.strip()
+            for prefix, field in prefixes:
+                if line.startswith(prefix):
+                    if parsed[field] is None:
+                        parsed[field] = line[len(prefix):].strip()
+                    break
+        if not parsed["query"]:
+            parsed["query"] = user_message
+        return parsed
+    
     async def _handle_get_analytics(self, result: Dict[str, Any], user_message: str) -> str:
         """Обрабатывает результат получения анализов."""
         if result.get("error"):
@@ -549,121 +684,40 @@ class OpenAIContextService:
             "looks_like_name": False
         }
         
-        # Проверяем, выглядит ли сообщение как дата
-        if self._looks_like_date(user_message):
+        scan = scan_text(user_message)
+        if scan.looks_like_date:
             result["looks_like_date"] = True
-            
-            # Ищем в контексте, спрашивал ли бот дату
-            for msg in reversed(context[-5:]):  # Смотрим последние 5 сообщений
-                if msg["role"] == "assistant":
-                    content = msg["content"].lower()
-                    if any(phrase in content for phrase in ["дата рождения", "дату рождения", "дата", "рождения"]):
-                        result["is_answer"] = True
-                        result["original_query"] = "дата рождения"
-                        break
-        
-        # Проверяем, выглядит ли сообщение как имя
-        elif self._looks_like_name(user_message):
+            tag, original_query = "ask_date", "дата рождения"
+        elif scan.looks_like_name:
             result["looks_like_name"] = True
-            
-            # Ищем в контексте, спрашивал ли бот имя
-            for msg in reversed(context[-5:]):
-                if msg["role"] == "assistant":
-                    content = msg["content"].lower()
-                    if any(phrase in content for phrase in ["имя", "как зовут", "твое имя"]):
-                        result["is_answer"] = True
-                        result["original_query"] = "имя"
-                        break
+            tag, original_query = "ask_name", "имя"
+        else:
+            return result
+        
+        # Ищем в последних 5 сообщениях, спрашивал ли бот дату или имя
+        for msg in reversed(context[-5:]):
+            if msg["role"] == "assistant" and tag in scan_message(msg).tags:
+                result["is_answer"] = True
+                result["original_query"] = original_query
+                break
         
         return result
     
     def _looks_like_date(self, text: str) -> bool:
         """Проверяет, выглядит ли текст как дата."""
-        import re
-        # Паттерны для дат: dd.mm.yyyy, dd/mm/yyyy, dd-mm-yyyy, dd mm yyyy
-        date_patterns = [
-            r'\d{1,2}\.\d{1,2}\.\d{4}',
-            r'\d{1,2}/\d{1,2}/\d{4}',
-            r'\d{1,2}-\d{1,2}-\d{4}',
-            r'\d{1,2}\s+\d{1,2}\s+\d{4}'
-        ]
-        
-        for pattern in date_patterns:
-            if re.search(pattern, text):
-                return True
-        return False
+        return scan_text(text).looks_like_date
     
     def _looks_like_name(self, text: str) -> bool:
         """Проверяет, выглядит ли текст как имя."""
-        # Простая проверка: только буквы, одно слово, длина 2-20 символов
-        if not text or not text.strip():
-            return False
-        
-        text = text.strip()
-        
-        # Проверяем, что это одно слово (нет пробелов)
-        if ' ' in text:
-            return False
-        
-        # Проверяем, что все символы - буквы
-        if not text.isalpha():
-            return False
-        
-        # Проверяем длину
-        if len(text) < 2 or len(text) > 20:
-            return False
-        
-        return True
-    
+        return scan_text(text).looks_like_name
     
     def _detect_request_type_from_context(self, user_message: str, context: List[Dict[str, Any]]) -> str:
-        """Определяет тип запроса из контекста разговора."""
-        message_lower = user_message.lower()
-        
-        # Сначала проверяем текущее сообщение
-        # Проверяем на детализацию
-        if any(word in message_lower for word in ["расскажи про", "расскажи об", "подробнее", "детали", "конкретно", "какой", "какая", "какие", "области развития", "области для развития"]):
-            return "детализация"
-        
-        # Проверяем на прогноз
-        if any(word in message_lower for word in ["прогноз", "предсказание", "что ждет", "что будет"]):
-            return "прогноз"
-        
-        # Проверяем на совместимость
-        if any(word in message_lower for word in ["совместимость", "отношения", "пара", "вместе", "идеальный партнер", "найти отношения"]):
-            return "совместимость"
-        
-        # Проверяем на реализацию
-        if any(word in message_lower for word in ["реализация", "предназначение", "миссия", "путь", "карьера"]):
-            return "реализация"
-        
-        # Проверяем на практики
-        if any(word in message_lower for word in ["практики", "упражнения", "развитие", "работать", "уверенность", "посоветуй практику"]):
-            return "практики"
-        
-        # Если в текущем сообщении не найдено, ищем в контексте
-        for msg in reversed(context[-10:]):
-            if msg["role"] == "user":
-                content = msg["content"].lower()
-                
-                # Проверяем на прогноз
-                if any(word in content for word in ["прогноз", "предсказание", "что ждет", "что будет"]):
-                    return "прогноз"
-                
-                # Проверяем на совместимость
-                if any(word in content for word in ["совместимость", "отношения", "пара", "вместе", "идеальный партнер", "найти отношения"]):
-                    return "совместимость"
-                
-                # Проверяем на реализацию
-                if any(word in content for word in ["реализация", "предназначение", "миссия", "путь", "карьера"]):
-                    return "реализация"
-                
-                # Проверяем на практики
-                if any(word in content for word in ["практики", "упражнения", "развитие", "работать", "уверенность", "посоветуй практику"]):
-                    return "практики"
+        """Определяет тип запроса из контекста разговора.
         
-        # По умолчанию - анализ
-        return "анализ"
+        Результаты сканирования кешируются в записях контекста, поэтому
+        история не просматривается повторно.
+        """
+        return detect_intent(user_message, reversed(context[-10:]))
     
     async def _generate_practices_response(self, analysis: Dict, birth_date: str, name: str, user_id: int, user_message: str) -> str:
         """Генерирует ответ с практиками."""
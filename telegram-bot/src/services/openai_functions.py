@@ -3,112 +3,155 @@
 """
 from __future__ import annotations
 
+import asyncio
 import json
+from functools import partial
 from typing import Dict, List, Any, Optional
 from datetime import date
 
+from src.db.connection import SessionProvider
 from src.services.analytics.analytics_service import AnalyticsService
 from src.services.analytics_storage import AnalyticsStorageService
 from src.services.user_service import UserService
 
 
-class OpenAIFunctions:
-    """Класс для работы с функциями OpenAI."""
-    
-    def __init__(self, db_session):
-        self.db_session = db_session
-        self.analytics_service = AnalyticsService()
-        self.storage_service = AnalyticsStorageService(db_session)
-        self.user_service = UserService(db_session)
-    
-    def get_functions_schema(self) -> List[Dict[str, Any]]:
-        """Возвращает схему функций для OpenAI."""
-        return [
-            {
-                "name": "get_user_analytics",
-                "description": "Получить сохраненные анализы пользователя из базы данных",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "user_id": {
-                            "type": "integer",
-                            "description": "ID пользователя в Telegram"
-                        }
-                    },
-                    "required": ["user_id"]
+# Схемы функций для OpenAI: описываются один раз при импорте модуля
+FUNCTION_SCHEMAS: List[Dict[str, Any]] = [
+    {
+        "name": "get_user_analytics",
+        "description": "Получить сохраненные анализы пользователя из базы данных",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "user_id": {
+                    "type": "integer",
+                    "description": "ID пользователя в Telegram"
                 }
             },
-            {
-                "name": "calculate_analytics",
-                "description": "Рассчитать новые анализы по дате рождения и имени",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "birth_date": {
-                            "type": "string",
-                            "description": "Дата рождения в формате dd.mm.yyyy"
-                        },
-                        "name": {
-                            "type": "string",
-                            "description": "Полное имя пользователя (может быть на кириллице или латинице)"
-                        },
-                        "request_type": {
-                            "type": "string",
-                            "description": "Тип запроса: анализ, прогноз, совместимость, реализация",
-                            "enum": ["анализ", "прогноз", "совместимость", "реализация"]
-                        }
-                    },
-                    "required": ["birth_date"]
+            "required": ["user_id"]
+        }
+    },
+    {
+        "name": "calculate_analytics",
+        "description": (
+            "Рассчитать новые анализы по дате рождения и имени. "
+            "Для нескольких людей (например, совместимость) вызывай функцию отдельно для каждого"
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "birth_date": {
+                    "type": "string",
+                    "description": "Дата рождения в формате dd.mm.yyyy"
+                },
+                "name": {
+                    "type": "string",
+                    "description": "Полное имя пользователя (может быть на кириллице или латинице)"
+                },
+                "request_type": {
+                    "type": "string",
+                    "description": "Тип запроса: анализ, прогноз, совместимость, реализация",
+                    "enum": ["анализ", "прогноз", "совместимость", "реализация"]
                 }
             },
-            {
-                "name": "save_analytics",
-                "description": "Сохранить результаты анализа в базу данных",
-                "parameters": {
+            "required": ["birth_date"]
+        }
+    },
+    {
+        "name": "save_analytics",
+        "description": "Сохранить результаты анализа в базу данных",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "user_id": {
+                    "type": "integer",
+                    "description": "ID пользователя в Telegram"
+                },
+                "birth_date": {
+                    "type": "string",
+                    "description": "Дата рождения в формате dd.mm.yyyy"
+                },
+                "name": {
+                    "type": "string",
+                    "description": "Полное имя пользователя"
+                },
+                "analysis_result": {
                     "type": "object",
-                    "properties": {
-                        "user_id": {
-                            "type": "integer",
-                            "description": "ID пользователя в Telegram"
-                        },
-                        "birth_date": {
-                            "type": "string",
-                            "description": "Дата рождения в формате dd.mm.yyyy"
-                        },
-                        "name": {
-                            "type": "string",
-                            "description": "Полное имя пользователя"
-                        },
-                        "analysis_result": {
-                            "type": "object",
-                            "description": "Результат анализа"
-                        }
-                    },
-                    "required": ["user_id", "birth_date", "analysis_result"]
+                    "description": "Результат анализа"
                 }
-            }
-        ]
+            },
+            "required": ["user_id", "birth_date", "analysis_result"]
+        }
+    }
+]
+
+# Те же схемы в формате tools API
+TOOLS: List[Dict[str, Any]] = [{"type": "function", "function": schema} for schema in FUNCTION_SCHEMAS]
+
+
+class OpenAIFunctions:
+    """Класс для работы с функциями OpenAI.
+    
+    Сессия БД берётся у `session_provider` только на время запроса, поэтому
+    функции с БД выполняются конкурентно и не держат соединение, пока модель
+    генерирует ответ.
+    """
+    
+    def __init__(self, session_provider: SessionProvider):
+        self.session_provider = session_provider
+        self.analytics_service = AnalyticsService()
+        self.storage_service = AnalyticsStorageService(session_provider)
+    
+    def get_functions_schema(self) -> List[Dict[str, Any]]:
+        """Возвращает схему функций для OpenAI (формат functions)."""
+        return FUNCTION_SCHEMAS
+    
+    def get_tools_schema(self) -> List[Dict[str, Any]]:
+        """Возвращает схему инструментов для OpenAI (формат tools)."""
+        return TOOLS
     
     async def execute_function(self, function_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """Выполняет указанную функцию."""
         try:
             if function_name == "get_user_analytics":
-                return await self._get_user_analytics(arguments)
+                return await self.get_analytics_by_user_id(arguments)
             elif function_name == "calculate_analytics":
-                return await self._calculate_analytics(arguments)
+                return await self.calculate_analytics(arguments)
             elif function_name == "save_analytics":
-                return await self._save_analytics(arguments)
+                return await self.save_analytics(arguments)
             else:
                 return {"error": f"Неизвестная функция: {function_name}"}
         except Exception as e:
             return {"error": f"Ошибка выполнения функции {function_name}: {str(e)}"}
     
-    async def _get_user_analytics(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Получить сохраненные анализы пользователя."""
+    async def execute_tool_calls(self, tool_calls: List[Any]) -> List[Dict[str, Any]]:
+        """Выполняет все вызовы инструментов из ответа OpenAI конкурентно.
+        
+        Возвращает сообщения с ролью "tool" в порядке вызовов. Ошибки
+        отдельных вызовов передаются модели как результат, а не прерывают остальные.
+        """
+        async def run(tool_call) -> Dict[str, Any]:
+            try:
+                arguments = json.loads(tool_call.function.arguments or "{}")
+            except json.JSONDecodeError as e:
+                result = {"error": f"Некорректные аргументы {tool_call.function.name}: {e}"}
+            else:
+                result = await self.execute_function(tool_call.function.name, arguments)
+            return {
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "content": json.dumps(result, ensure_ascii=False, default=str),
+            }
+        
+        return list(await asyncio.gather(*(run(tool_call) for tool_call in tool_calls)))
+    
+    async def get_analytics_by_user_id(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Получить сохраненные анализы пользователя (по ID в Telegram)."""
         user_id = args.get("user_id")
         
         # Получаем пользователя
-        user = await self.user_service.get_user_by_telegram_id(str(user_id))
+        async with self.session_provider() as session:
+            user = await UserService(session).get_user_by_telegram_id(str(user_id))
         if not user:
             return {"error": "Пользователь не найден"}
         
@@ -122,7 +165,7 @@ class OpenAIFunctions:
             "count": len(analytics)
         }
     
-    async def _calculate_analytics(self, args: Dict[str, Any]) -> Dict[str, Any]:
+    async def calculate_analytics(self, args: Dict[str, Any]) -> Dict[str, Any]:
         """Рассчитать новые анализы."""
         birth_date = args.get("birth_date")
         name = args.get("name")
@@ -145,11 +188,13 @@ class OpenAIFunctions:
             return {"error": "Имя должно быть только на английском языке. Например: Ivan"}
         
         try:
-            # Выполняем анализ
+            # Расчёт занимает процессор: выполняем в пуле потоков, чтобы параллельные
+            # вызовы не блокировали цикл событий
             if name:
-                analysis = self.analytics_service.analyze_person(birth_date, name)
+                compute = partial(self.analytics_service.analyze_person, birth_date, name)
             else:
-                analysis = self.analytics_service.analyze_person_date_only(birth_date)
+                compute = partial(self.analytics_service.analyze_person_date_only, birth_date)
+            analysis = await asyncio.get_running_loop().run_in_executor(None, compute)
             
             return {
                 "success": True,
@@ -258,7 +303,7 @@ class OpenAIFunctions:
             "search_terms": search_terms
         }
     
-    async def _save_analytics(self, args: Dict[str, Any]) -> Dict[str, Any]:
+    async def save_analytics(self, args: Dict[str, Any]) -> Dict[str, Any]:
         """Сохранить результаты анализа."""
         user_id = args.get("user_id")
         birth_date = args.get("birth_date")
@@ -269,12 +314,12 @@ class OpenAIFunctions:
             return {"error": "Недостаточно данных для сохранения"}
         
         try:
-            # Получаем или создаем пользователя
-            user = await self.user_service.get_or_create_user(
-                telegram_user_id=str(user_id),
-                username=None,
-                full_name=name
-            )
+            # Получаем или создаем пользователя (один запрос, повторно — из кеша)
+            async with self.session_provider() as session:
+                internal_user_id = await UserService(session).ensure_user(
+                    telegram_user_id=user_id,
+                    full_name=name
+                )
             
             # Парсим дату
             day, month, year = map(int, birth_date.split('.'))
@@ -283,7 +328,7 @@ class OpenAIFunctions:
             # Сохраняем анализ
             from src.db.models import ReportStatus
             await self.storage_service.save_analysis_result(
-                user_id=user.id,
+                user_id=internal_user_id,
                 full_name=name,
                 birth_date=birth_date_obj,
                 analysis_result=analysis_result,
@@ -0,0 +1,280 @@
+"""src/services/openai_resilience.py
+Устойчивые вызовы OpenAI: дедлайн на вызов, хеджирование и circuit breaker.
+
+- Дедлайн: вызов не ждёт дольше заданного времени, даже если HTTP-таймаут больше.
+- Хеджирование: если ответа нет дольше p95 наблюдаемой задержки, запускается
+  второй такой же запрос; используется тот, что ответит первым. Клиенты SDK
+  создаются с max_retries=0: повторы поверх хеджирования умножили бы нагрузку.
+- Circuit breaker (свой на каждую модель): после серии таймаутов, ответов 5xx
+  и 429 вызовы сразу отклоняются, и вызывающий код переходит на локальный
+  ответ без ожидания сети. Прочие ошибки (4xx) — не отказ API и не считаются.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Значения по умолчанию (секунды)
+DEFAULT_DEADLINE = 25.0
+DEFAULT_HEDGE_DELAY = 8.0
+MIN_HEDGE_DELAY = 1.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+SAMPLE_MAX_AGE = 600.0
+
+
+class CircuitOpenError(RuntimeError):
+    """Circuit breaker разомкнут — вызов отклонён без обращения к API."""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Отказ API, а не ошибка запроса: таймаут, обрыв соединения, 5xx или 429."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+class LatencyTracker:
+    """Скользящее окно задержек и исходов вызовов одной модели.
+
+    Окно ограничено и числом вызовов, и временем: исходы старше `max_age`
+    секунд не учитываются, поэтому давний всплеск ошибок не держит модель
+    «больной», когда трафика к ней нет.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        min_samples: int = 20,
+        max_age: float = SAMPLE_MAX_AGE,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self._clock = clock
+        # (время, задержка успешного вызова или None, успех)
+        self._samples: Deque[Tuple[float, Optional[float], bool]] = deque(maxlen=window)
+
+    def record(self, latency: Optional[float], ok: bool) -> None:
+        """Записать исход вызова; задержка учитывается только для успешных."""
+        self._samples.append((self._clock(), latency if ok else None, ok))
+
+    def _recent(self) -> Deque[Tuple[float, Optional[float], bool]]:
+        cutoff = self._clock() - self.max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return self._samples
+
+    def _latencies(self) -> List[float]:
+        return [latency for _, latency, _ in self._recent() if latency is not None]
+
+    @property
+    def samples(self) -> int:
+        """Число свежих задержек успешных вызовов."""
+        return len(self._latencies())
+
+    @property
+    def outcomes(self) -> int:
+        """Число свежих исходов (успехи и отказы)."""
+        return len(self._recent())
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Перцентиль задержки (0 < q < 1) или None, если данных мало."""
+        latencies = self._latencies()
+        if len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    @property
+    def error_rate(self) -> float:
+        recent = self._recent()
+        if not recent:
+            return 0.0
+        return sum(1 for _, _, ok in recent if not ok) / len(recent)
+
+
+class CircuitBreaker:
+    """Размыкается после N подряд неудачных вызовов.
+
+    Через `reset_timeout` секунд пропускает один пробный вызов (half-open):
+    успех замыкает цепь, неудача снова размыкает её.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Можно ли выполнять вызов сейчас."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """Вызов завершился без вердикта (отменён, ошибка запроса): освободить пробный слот."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.warning("OpenAI circuit breaker разомкнут после %s ошибок", self._failures)
+            self._opened_at = self._clock()
+
+
+class ResilientCaller:
+    """Выполняет вызовы API с дедлайном, хеджированием и circuit breaker."""
+
+    def __init__(
+        self,
+        deadline: float = DEFAULT_DEADLINE,
+        default_hedge_delay: float = DEFAULT_HEDGE_DELAY,
+        breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker,
+    ) -> None:
+        self.deadline = deadline
+        self.default_hedge_delay = default_hedge_delay
+        self.breaker_factory = breaker_factory
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def tracker(self, key: str) -> LatencyTracker:
+        """Статистика задержек по ключу (обычно — имя модели)."""
+        if key not in self._trackers:
+            self._trackers[key] = LatencyTracker()
+        return self._trackers[key]
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        """Circuit breaker по ключу: отказ одной модели не отключает остальные."""
+        if key not in self._breakers:
+            self._breakers[key] = self.breaker_factory()
+        return self._breakers[key]
+
+    def hedge_delay(self, key: str, deadline: float) -> float:
+        """Задержка перед хеджирующим запросом: p95 или значение по умолчанию."""
+        p95 = self.tracker(key).percentile(0.95)
+        delay = p95 if p95 is not None else self.default_hedge_delay
+        return min(max(delay, MIN_HEDGE_DELAY), deadline)
+
+    async def call(
+        self,
+        factory: Callable[[], Awaitable[T]],
+        key: str = "default",
+        deadline: Optional[float] = None,
+    ) -> T:
+        """Выполнить вызов `factory()` с дедлайном и хеджированием.
+
+        :raises CircuitOpenError: если breaker разомкнут
+        :raises asyncio.TimeoutError: если ни один запрос не уложился в дедлайн
+        """
+        breaker = self.breaker(key)
+        if not breaker.allow():
+            raise CircuitOpenError("OpenAI временно недоступен")
+
+        deadline = self.deadline if deadline is None else deadline
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        ends_at = started + deadline
+        hedge_at = started + self.hedge_delay(key, deadline)
+
+        tasks = {asyncio.ensure_future(factory())}
+        hedged = False
+        settled = False
+        last_error: Optional[BaseException] = None
+        try:
+            while tasks:
+                now = loop.time()
+                if now >= ends_at:
+                    break
+                wait_until = ends_at if hedged else min(ends_at, hedge_at)
+                done, _ = await asyncio.wait(
+                    tasks,
+                    timeout=max(0.0, wait_until - now),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                for task in done:
+                    tasks.discard(task)
+                    error = task.exception()
+                    if error is None:
+                        self._record(key, loop.time() - started, ok=True)
+                        settled = True
+                        return task.result()
+                    last_error = error
+
+                # Ответа нет дольше p95 — отправляем хеджирующий запрос
+                if not done and not hedged and loop.time() < ends_at:
+                    logger.info("Хеджирующий запрос к %s после %.1f с", key, loop.time() - started)
+                    tasks.add(asyncio.ensure_future(factory()))
+                    hedged = True
+
+            # Дедлайн (last_error is None) или отказ API; ошибка запроса — не отказ
+            if last_error is None or tasks or is_transient_error(last_error):
+                self._record(key, None, ok=False)
+                settled = True
+            if last_error is not None and not tasks:
+                raise last_error
+            raise asyncio.TimeoutError(f"Превышен дедлайн {deadline:.1f} с для {key}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Отмена (остановка, планировщик) или ошибка запроса: пробный слот не должен зависнуть
+            if not settled:
+                breaker.release()
+
+    def _record(self, key: str, latency: Optional[float], ok: bool) -> None:
+        self.tracker(key).record(latency, ok)
+        if ok:
+            self.breaker(key).record_success()
+        else:
+            self.breaker(key).record_failure()
+
+
+# Общий для процесса экземпляр: статистика и breaker-ы переживают создание сервисов
+_openai_caller: Optional[ResilientCaller] = None
+
+
+def get_openai_caller() -> ResilientCaller:
+    """Получить общий для процесса ResilientCaller для OpenAI."""
+    global _openai_caller
+    if _openai_caller is None:
+        _openai_caller = ResilientCaller()
+    return _openai_caller
@@ -8,7 +8,9 @@ from typing import Dict, Any, Optional
 
 from openai import AsyncOpenAI
 
+from .model_router import get_model_router
 from .openai_prompts import create_analysis_prompt
+from .openai_resilience import DEFAULT_DEADLINE
 
 
 class OpenAIService:
@@ -20,8 +22,9 @@ class OpenAIService:
         :param api_key: API ключ OpenAI
         :param assistant_id: ID ассистента OpenAI (опционально)
         """
-        self.client = AsyncOpenAI(api_key=api_key)
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0, timeout=DEFAULT_DEADLINE)
         self.assistant_id = assistant_id
+        self.router = get_model_router()
     
     async def analyze_with_assistant(
         self,
@@ -133,14 +136,18 @@ class OpenAIService:
             exceptions=analysis_data.get('exceptions', {})
         )
         
+        route = self.router.route("анализ")
         try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1500,  # Уменьшаем для Telegram
-                temperature=0.7
+            response = await self.router.caller.call(
+                lambda: self.client.chat.completions.create(
+                    model=route.model,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=route.max_tokens,
+                    temperature=0.7
+                ),
+                key=route.model,
             )
             
             return response.choices[0].message.content
@@ -235,14 +242,18 @@ class OpenAIService:
         from .openai_prompts import create_practices_prompt
         prompt = create_practices_prompt(user_query)
         
+        route = self.router.route("практики")
         try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1500,
-                temperature=0.7
+            response = await self.router.caller.call(
+                lambda: self.client.chat.completions.create(
+                    model=route.model,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=route.max_tokens,
+                    temperature=0.7
+                ),
+                key=route.model,
             )
             
             return response.choices[0].message.content
@@ -0,0 +1,270 @@
+"""src/services/outbound.py
+Исходящие сообщения в пределах лимитов Telegram Bot API.
+
+Middleware сессии бота (`bot.session.middleware(...)`): через него проходят
+все отправки из хендлеров и воркеров, ничего не меняя в их коде.
+
+- Общее ведро токенов (~30 сообщений/с на бота) и ведро на чат
+  (~1 сообщение/с в личке, ~20 в минуту в группе). Отправка ждёт ровно
+  столько, сколько нужно до появления токена, — без слепых пауз.
+- Отправки в один чат идут строго по очереди, поэтому части длинного
+  ответа не меняются местами.
+- `TelegramRetryAfter` (429): чат (или весь бот) блокируется на
+  `retry_after` секунд, запрос повторяется автоматически.
+- Правки одного сообщения (`editMessageText`), ожидающие своей очереди,
+  схлопываются: уходит только последняя, остальные получают её результат.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    CopyMessage,
+    EditMessageCaption,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    ForwardMessage,
+    SendAnimation,
+    SendAudio,
+    SendContact,
+    SendDocument,
+    SendLocation,
+    SendMediaGroup,
+    SendMessage,
+    SendPhoto,
+    SendPoll,
+    SendSticker,
+    SendVideo,
+    SendVoice,
+    TelegramMethod,
+)
+
+from src.config import Settings
+from src.services.metrics import counter, histogram
+from src.services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Методы, которые Telegram учитывает в лимитах на отправку
+LIMITED_METHODS = (
+    SendMessage,
+    SendPhoto,
+    SendDocument,
+    SendAudio,
+    SendVideo,
+    SendVoice,
+    SendAnimation,
+    SendSticker,
+    SendMediaGroup,
+    SendLocation,
+    SendContact,
+    SendPoll,
+    CopyMessage,
+    ForwardMessage,
+    EditMessageText,
+    EditMessageCaption,
+    EditMessageReplyMarkup,
+    EditMessageMedia,
+)
+
+DEFAULT_GLOBAL_RATE = 30.0  # сообщений в секунду на бота
+DEFAULT_CHAT_RATE = 1.0  # сообщений в секунду в личный чат
+DEFAULT_GROUP_RATE = 20.0 / 60.0  # сообщений в секунду в группу
+DEFAULT_CHAT_BURST = 3.0
+DEFAULT_MAX_RETRIES = 3
+
+SEND_WAIT = histogram(
+    "bot_outbound_wait_seconds",
+    "Ожидание токена лимита перед отправкой в Telegram",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+RETRY_AFTER = counter("bot_outbound_retry_after_total", "Ответов 429 (retry_after) от Telegram")
+COALESCED = counter("bot_outbound_coalesced_edits_total", "Правок сообщений, схлопнутых с более поздней")
+
+
+class _ChatLane:
+    """Ведро, очередь и блокировка после 429 для одного чата."""
+
+    __slots__ = ("bucket", "lock", "blocked_until")
+
+    def __init__(self, bucket: TokenBucket) -> None:
+        self.bucket = bucket
+        self.lock = asyncio.Lock()
+        self.blocked_until = 0.0
+
+
+class _PendingEdit:
+    """Правка сообщения, ожидающая отправки; более поздние правки заменяют метод."""
+
+    __slots__ = ("method", "future")
+
+    def __init__(self, method: TelegramMethod, future: asyncio.Future) -> None:
+        self.method = method
+        self.future = future
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """Ограничивает исходящие запросы бота лимитами Telegram."""
+
+    def __init__(
+        self,
+        global_rate: float = DEFAULT_GLOBAL_RATE,
+        chat_rate: float = DEFAULT_CHAT_RATE,
+        group_rate: float = DEFAULT_GROUP_RATE,
+        chat_burst: float = DEFAULT_CHAT_BURST,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        idle_ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        now = clock()
+        self._global = TokenBucket(global_rate, global_rate, global_rate, now)
+        self._global_blocked_until = 0.0
+        self._lanes: OrderedDict[Hashable, _ChatLane] = OrderedDict()
+        self._edits: Dict[Tuple[Hashable, int], _PendingEdit] = {}
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Any:
+        if not isinstance(method, LIMITED_METHODS):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        lane = self._lane(chat_id) if chat_id is not None else None
+        if isinstance(method, EditMessageText) and lane is not None and method.message_id is not None:
+            return await self._edit(make_request, bot, method, lane, (chat_id, method.message_id))
+
+        if lane is None:
+            return await self._send(make_request, bot, method, None)
+        async with lane.lock:
+            return await self._send(make_request, bot, method, lane)
+
+    # --- внутреннее ---
+
+    def _lane(self, chat_id: Hashable) -> _ChatLane:
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            self._evict_idle()
+            # Отрицательный ID — группа или канал: лимит строже
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            lane = _ChatLane(TokenBucket(self.chat_burst, rate, self.chat_burst, self._clock()))
+            self._lanes[chat_id] = lane
+        else:
+            self._lanes.move_to_end(chat_id)
+        return lane
+
+    def _evict_idle(self) -> None:
+        """Забыть простаивающие чаты: их вёдра уже полные."""
+        now = self._clock()
+        while self._lanes:
+            chat_id, lane = next(iter(self._lanes.items()))
+            if lane.lock.locked() or now - lane.bucket.updated_at <= self.idle_ttl:
+                break
+            self._lanes.popitem(last=False)
+
+    async def _acquire(self, lane: Optional[_ChatLane]) -> None:
+        """Дождаться токена в общем ведре и в ведре чата и списать их."""
+        started = self._clock()
+        while True:
+            now = self._clock()
+            wait = max(self._global.wait_time(now), self._global_blocked_until - now)
+            if lane is not None:
+                wait = max(wait, lane.bucket.wait_time(now), lane.blocked_until - now)
+            if wait <= 0:
+                self._global.tokens -= 1
+                if lane is not None:
+                    lane.bucket.tokens -= 1
+                SEND_WAIT.observe(now - started)
+                return
+            await asyncio.sleep(wait)
+
+    async def _send(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+        lane: Optional[_ChatLane],
+        on_acquired: Optional[Callable[[], TelegramMethod]] = None,
+    ) -> Any:
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(lane)
+            if on_acquired is not None:
+                method = on_acquired()
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                RETRY_AFTER.inc()
+                if attempt == self.max_retries:
+                    raise
+                blocked_until = self._clock() + e.retry_after
+                if lane is not None:
+                    lane.blocked_until = blocked_until
+                else:
+                    self._global_blocked_until = blocked_until
+                logger.warning("Telegram просит подождать %s с (%s)", e.retry_after, type(method).__name__)
+
+    async def _edit(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: EditMessageText,
+        lane: _ChatLane,
+        key: Tuple[Hashable, int],
+    ) -> Any:
+        pending = self._edits.get(key)
+        if pending is not None:
+            # Правка этого сообщения уже ждёт очереди — отправится только последняя
+            pending.method = method
+            COALESCED.inc()
+            return await asyncio.shield(pending.future)
+
+        pending = _PendingEdit(method, asyncio.get_running_loop().create_future())
+        self._edits[key] = pending
+
+        def take_latest() -> TelegramMethod:
+            # Токен получен: более поздние правки встанут в очередь заново
+            if self._edits.get(key) is pending:
+                del self._edits[key]
+            return pending.method
+
+        try:
+            async with lane.lock:
+                result = await self._send(make_request, bot, method, lane, on_acquired=take_latest)
+        except BaseException as e:
+            if self._edits.get(key) is pending:
+                del self._edits[key]
+            if not pending.future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    pending.future.cancel()
+                else:
+                    pending.future.set_exception(e)
+                    # Ошибку получает и этот вызов; ожидающие — через future
+                    pending.future.exception()
+            raise
+        pending.future.set_result(result)
+        return result
+
+
+def create_outbound_limiter(settings: Settings) -> OutboundRateLimiter:
+    """Лимитер исходящих сообщений по настройкам (OUTBOUND_*)."""
+    return OutboundRateLimiter(
+        global_rate=settings.outbound_global_rate,
+        chat_rate=settings.outbound_chat_rate,
+    )
@@ -0,0 +1,198 @@
+"""src/services/rate_limiter.py
+Ограничение частоты запросов пользователей (token bucket).
+
+Ведро пользователя хранит только пару (tokens, updated_at) — O(1) памяти
+на активного пользователя. Простаивающие вёдра вытесняются лениво при
+очередных обращениях. Для нескольких воркеров есть общий бэкенд в PostgreSQL.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Protocol
+
+from sqlalchemy import text
+
+from src.config import Settings
+from src.db.connection import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    """Классическое ведро токенов с непрерывным пополнением."""
+
+    capacity: float
+    refill_rate: float  # токенов в секунду
+    tokens: float
+    updated_at: float
+
+    def refill(self, now: float) -> None:
+        """Пополнить ведро за время, прошедшее с последнего обращения."""
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self.updated_at = now
+
+    def try_consume(self, now: float, amount: float = 1.0) -> bool:
+        """Списать токены, если их достаточно."""
+        self.refill(now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def wait_time(self, now: float, amount: float = 1.0) -> float:
+        """Сколько секунд ждать, пока в ведре появится `amount` токенов."""
+        self.refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        if self.refill_rate <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.refill_rate
+
+
+def default_idle_ttl(capacity: float, refill_rate: float) -> float:
+    """Через сколько секунд простоя ведро снова полное; без пополнения — никогда."""
+    if refill_rate <= 0:
+        return float("inf")
+    return capacity / refill_rate
+
+
+class RateLimitBackend(Protocol):
+    """Хранилище вёдер: локальное или общее для всех воркеров."""
+
+    async def consume(self, key: str) -> bool:
+        """Списать токен для ключа. False — лимит исчерпан."""
+        ...
+
+
+class InMemoryRateLimitBackend:
+    """Локальные вёдра в памяти процесса.
+
+    Вёдра упорядочены по времени последнего обращения, поэтому вытеснение
+    простаивающих — это снятие элементов с начала словаря (амортизированно O(1)).
+    Ведро, простоявшее `capacity / refill_rate` секунд, уже полное и ничем
+    не отличается от нового, поэтому его можно забыть без потери точности.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_rate: float,
+        idle_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.idle_ttl = idle_ttl if idle_ttl is not None else default_idle_ttl(capacity, refill_rate)
+        self._clock = clock
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def consume(self, key: str) -> bool:
+        now = self._clock()
+        self._evict_idle(now)
+
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            bucket = TokenBucket(self.capacity, self.refill_rate, self.capacity, now)
+        self._buckets[key] = bucket
+        return bucket.try_consume(now)
+
+    def _evict_idle(self, now: float) -> None:
+        """Удалить вёдра, к которым не обращались дольше idle_ttl."""
+        while self._buckets:
+            oldest = next(iter(self._buckets.values()))
+            if now - oldest.updated_at <= self.idle_ttl:
+                break
+            self._buckets.popitem(last=False)
+
+
+class PostgresRateLimitBackend:
+    """Общие вёдра в PostgreSQL для нескольких воркеров.
+
+    Пополнение и списание выполняются одним UPSERT — один round-trip на запрос.
+    Если токенов не хватает, условие WHERE не выполняется и RETURNING пуст.
+    При недоступности БД лимитер пропускает запрос (fail-open).
+    """
+
+    _CONSUME_SQL = text(
+        """
+        INSERT INTO rate_limit_bucket (key, tokens, updated_at)
+        VALUES (:key, :capacity - 1, EXTRACT(EPOCH FROM now()))
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = LEAST(
+                :capacity,
+                rate_limit_bucket.tokens
+                + (EXTRACT(EPOCH FROM now()) - rate_limit_bucket.updated_at) * :rate
+            ) - 1,
+            updated_at = EXTRACT(EPOCH FROM now())
+        WHERE LEAST(
+            :capacity,
+            rate_limit_bucket.tokens
+            + (EXTRACT(EPOCH FROM now()) - rate_limit_bucket.updated_at) * :rate
+        ) >= 1
+        RETURNING tokens
+        """
+    )
+
+    _EVICT_SQL = text(
+        "DELETE FROM rate_limit_bucket WHERE updated_at < EXTRACT(EPOCH FROM now()) - :idle_ttl"
+    )
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        capacity: float,
+        refill_rate: float,
+        idle_ttl: Optional[float] = None,
+        evict_every: int = 1000,
+    ) -> None:
+        self.db_manager = db_manager
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.idle_ttl = idle_ttl if idle_ttl is not None else default_idle_ttl(capacity, refill_rate)
+        self.evict_every = evict_every
+        self._calls = 0
+
+    async def consume(self, key: str) -> bool:
+        self._calls += 1
+        try:
+            async with self.db_manager.get_session() as session:
+                result = await session.execute(
+                    self._CONSUME_SQL,
+                    {"key": key, "capacity": self.capacity, "rate": self.refill_rate},
+                )
+                allowed = result.first() is not None
+
+                # Ленивое вытеснение простаивающих вёдер
+                if self._calls % self.evict_every == 0 and self.idle_ttl != float("inf"):
+                    await session.execute(self._EVICT_SQL, {"idle_ttl": self.idle_ttl})
+
+                return allowed
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Rate limit backend недоступен, пропускаем запрос: %s", e)
+            return True
+
+
+def create_rate_limit_backend(
+    settings: Settings,
+    db_manager: Optional[DatabaseManager] = None,
+) -> RateLimitBackend:
+    """Создать бэкенд лимитера по настройкам (RATE_LIMIT_BACKEND)."""
+    if settings.rate_limit_per_minute <= 0:
+        raise ValueError("RATE_LIMIT_PER_MINUTE должен быть положительным")
+    capacity = float(settings.rate_limit_per_minute)
+    refill_rate = capacity / 60.0
+
+    if settings.rate_limit_backend == "postgres":
+        if db_manager is None:
+            raise RuntimeError("Для RATE_LIMIT_BACKEND=postgres нужен DatabaseManager")
+        return PostgresRateLimitBackend(db_manager, capacity, refill_rate)
+
+    return InMemoryRateLimitBackend(capacity, refill_rate)
@@ -0,0 +1,324 @@
+"""src/services/report_queue.py
+Очередь генерации отчётов на таблице `reportrequest` (PostgreSQL).
+
+Хендлер ставит заявку (PENDING) и сразу отвечает пользователю, а воркер
+забирает заявки, генерирует отчёт и доставляет его в чат.
+
+- Забор: `UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED)` —
+  несколько процессов-воркеров не блокируют друг друга и не берут одну
+  заявку дважды; пропускная способность растёт добавлением процессов.
+- Таймаут видимости: заявка в PROCESSING с истёкшим `locked_until`
+  (воркер упал) снова доступна для забора, если попытки не исчерпаны;
+  иначе она переводится в ERROR — заявка, роняющая воркер, не крутится вечно.
+- Результат: выполненная заявка сохраняется через `AnalyticsStorageService`
+  (структура в `result_json` и `content_hash`, повтор анализа обновляет
+  прежнюю строку), а сама заявка удаляется из очереди.
+- Повторы: после ошибки заявка возвращается в PENDING с экспоненциальной
+  задержкой (`run_after`), после `max_attempts` попыток — ERROR.
+- Простой: пока очередь пуста, воркер опрашивает её всё реже (интервал
+  удваивается до `max_poll_interval`) и возвращается к `poll_interval`,
+  как только забирает заявку.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.connection import DatabaseManager
+from src.db.models import ReportRequest, ReportStatus
+from src.services.analytics_storage import AnalyticsStorageService
+from src.services.metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VISIBILITY_TIMEOUT = 300.0  # секунды на одну попытку генерации
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_BASE = 10.0
+DEFAULT_BACKOFF_MAX = 600.0
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_POLL_INTERVAL = 15.0
+
+JOBS_FINISHED = counter("bot_report_jobs_total", "Заявок на отчёт, завершённых воркером, по результату")
+JOB_WAIT = histogram(
+    "bot_report_job_wait_seconds",
+    "Время от постановки заявки до начала генерации",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ReportJob:
+    """Заявка, забранная воркером."""
+
+    id: int
+    user_id: int
+    chat_id: Optional[int]
+    full_name: str
+    birth_date: date
+    attempts: int
+    created_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class GeneratedReport:
+    """Результат генерации: расчёт для хранения и текст для доставки."""
+
+    analysis: Dict[str, Any]
+    text: str
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ReportQueue:
+    """Постановка, забор и завершение заявок на отчёт."""
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        clock: Callable[[], datetime] = _utcnow,
+    ) -> None:
+        self.db_manager = db_manager
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self.storage = AnalyticsStorageService(db_manager.get_session)
+
+    async def enqueue(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        chat_id: int,
+        full_name: str,
+        birth_date: date,
+    ) -> ReportRequest:
+        """Поставить заявку в сессии вызывающего (фиксируется вместе с ней)."""
+        now = self._clock()
+        report_request = ReportRequest(
+            user_id=user_id,
+            chat_id=chat_id,
+            full_name=full_name,
+            birth_date=birth_date,
+            status=ReportStatus.PENDING,
+            run_after=now,
+            created_at=now,
+            updated_at=now,
+        )
+        session.add(report_request)
+        await session.flush()
+        return report_request
+
+    async def claim(self, limit: int = 1) -> List[ReportJob]:
+        """Забрать до `limit` готовых к работе заявок."""
+        now = self._clock()
+        expired = and_(ReportRequest.status == ReportStatus.PROCESSING, ReportRequest.locked_until < now)
+        exhausted = (
+            update(ReportRequest)
+            .where(expired, ReportRequest.attempts >= self.max_attempts)
+            .values(
+                status=ReportStatus.ERROR,
+                error="Превышено число попыток (таймаут видимости)",
+                locked_until=None,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        ready = (
+            select(ReportRequest.id)
+            .where(
+                or_(
+                    and_(ReportRequest.status == ReportStatus.PENDING, ReportRequest.run_after <= now),
+                    # Воркер не уложился в таймаут видимости (упал или завис)
+                    and_(expired, ReportRequest.attempts < self.max_attempts),
+                )
+            )
+            .order_by(ReportRequest.run_after)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        statement = (
+            update(ReportRequest)
+            .where(ReportRequest.id.in_(ready.scalar_subquery()))
+            .values(
+                status=ReportStatus.PROCESSING,
+                attempts=ReportRequest.attempts + 1,
+                locked_until=now + timedelta(seconds=self.visibility_timeout),
+                updated_at=now,
+            )
+            .returning(
+                ReportRequest.id,
+                ReportRequest.user_id,
+                ReportRequest.chat_id,
+                ReportRequest.full_name,
+                ReportRequest.birth_date,
+                ReportRequest.attempts,
+                ReportRequest.created_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        async with self.db_manager.get_session() as session:
+            dropped = (await session.execute(exhausted)).rowcount
+            if dropped:
+                logger.warning("Заявок на отчёт с исчерпанными попытками после таймаута: %d", dropped)
+                JOBS_FINISHED.inc(dropped, result="error")
+            result = await session.execute(statement)
+            return [ReportJob(*row) for row in result.all()]
+
+    async def complete(self, job: ReportJob, analysis: Dict[str, Any]) -> None:
+        """Сохранить результат анализа и убрать заявку из очереди.
+
+        Сохранение идемпотентно (upsert по `content_hash`), поэтому результат
+        записывается первым: если воркер упадёт до удаления заявки, повторная
+        попытка не создаст второй строки.
+        """
+        await self.storage.save_analysis_result(
+            user_id=job.user_id,
+            full_name=job.full_name,
+            birth_date=job.birth_date,
+            analysis_result=analysis,
+        )
+        statement = (
+            delete(ReportRequest)
+            # Заявку могли перехватить после таймаута видимости — её удалит новая попытка
+            .where(ReportRequest.id == job.id, ReportRequest.attempts == job.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        async with self.db_manager.get_session() as session:
+            await session.execute(statement)
+
+    async def fail(self, job: ReportJob, error: str) -> bool:
+        """Вернуть заявку в очередь с задержкой. False — попытки исчерпаны (ERROR)."""
+        if job.attempts >= self.max_attempts:
+            await self._finish(job, status=ReportStatus.ERROR, error=error, locked_until=None)
+            return False
+
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (job.attempts - 1))
+        await self._finish(
+            job,
+            status=ReportStatus.PENDING,
+            error=error,
+            run_after=self._clock() + timedelta(seconds=delay),
+            locked_until=None,
+        )
+        return True
+
+    async def _finish(self, job: ReportJob, **values) -> None:
+        statement = (
+            update(ReportRequest)
+            # Заявку могли перехватить после таймаута видимости — не затираем чужую попытку
+            .where(ReportRequest.id == job.id, ReportRequest.attempts == job.attempts)
+            .values(updated_at=self._clock(), **values)
+            .execution_options(synchronize_session=False)
+        )
+        async with self.db_manager.get_session() as session:
+            await session.execute(statement)
+
+
+class ReportWorker:
+    """Забирает заявки и обрабатывает до `concurrency` из них одновременно.
+
+    `generate(job)` возвращает расчёт и текст отчёта (`GeneratedReport`),
+    `deliver(job, text)` отправляет текст пользователю, а расчёт сохраняется.
+    Ошибка любого шага возвращает заявку в очередь с задержкой.
+    """
+
+    def __init__(
+        self,
+        queue: ReportQueue,
+        generate: Callable[[ReportJob], Awaitable[GeneratedReport]],
+        deliver: Callable[[ReportJob, str], Awaitable[None]],
+        concurrency: int = 4,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+    ) -> None:
+        self.queue = queue
+        self.generate = generate
+        self.deliver = deliver
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max(poll_interval, max_poll_interval)
+        self._running: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        """Цикл забора заявок до вызова `stop()`; выполняющиеся заявки дообрабатываются."""
+        idle_interval = self.poll_interval
+        try:
+            while not self._stopping.is_set():
+                if await self.run_once():
+                    idle_interval = self.poll_interval
+                elif self._running:
+                    await self._sleep(self.poll_interval)
+                else:
+                    # Пустая очередь: не опрашиваем БД каждую секунду
+                    await self._sleep(idle_interval)
+                    idle_interval = min(idle_interval * 2, self.max_poll_interval)
+        finally:
+            if self._running:
+                await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def run_once(self) -> int:
+        """Забрать заявки на свободные места и запустить их обработку."""
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            await asyncio.wait(self._running, return_when=asyncio.FIRST_COMPLETED)
+            return 0
+        try:
+            jobs = await self.queue.claim(free)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Не удалось забрать заявки на отчёт: %s", e)
+            await self._sleep(self.poll_interval * 5)
+            return 0
+
+        for job in jobs:
+            task = asyncio.create_task(self._process(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        return len(jobs)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _process(self, job: ReportJob) -> None:
+        created_at = job.created_at if job.created_at.tzinfo else job.created_at.replace(tzinfo=timezone.utc)
+        JOB_WAIT.observe(max(0.0, (_utcnow() - created_at).total_seconds()))
+        try:
+            report = await self.generate(job)
+            await self.deliver(job, report.text)
+        except Exception as e:  # noqa: BLE001
+            logger.exception("Ошибка обработки заявки на отчёт %s (попытка %d)", job.id, job.attempts)
+            try:
+                retried = await self.queue.fail(job, str(e))
+            except Exception:  # noqa: BLE001
+                # Заявка вернётся в очередь по таймауту видимости
+                logger.exception("Не удалось вернуть заявку %s в очередь", job.id)
+                return
+            JOBS_FINISHED.inc(result="retry" if retried else "error")
+            return
+
+        try:
+            await self.queue.complete(job, report.analysis)
+        except Exception:  # noqa: BLE001
+            # Отчёт доставлен; после таймаута видимости возможна повторная доставка
+            logger.exception("Не удалось отметить заявку %s выполненной", job.id)
+            return
+        JOBS_FINISHED.inc(result="done")
@@ -0,0 +1,221 @@
+"""src/services/response_handle.py
+Ответ пользователю одним сообщением, которое правится на месте.
+
+Вместо цепочки «chat action → статус → правка статуса → удаление → ответ»
+(5–6 запросов к Bot API) хендлер держит один `ResponseHandle`:
+
+- пока идёт генерация, индикатор действия (`typing`) обновляется в фоне;
+- первый `status()` отправляет сообщение-заглушку, следующие правят его
+  не чаще `min_edit_interval` (промежуточные статусы схлопываются,
+  показывается последний);
+- `finish()` вписывает ответ в заглушку, а то, что не поместилось
+  в одно сообщение, отправляет следующими сообщениями;
+- заглушка, так и не получившая ответа, удаляется при выходе из блока.
+
+    async with ResponseHandle(bot, chat_id) as response:
+        await response.status("Анализирую ваш запрос...")
+        await response.finish(answer)
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Callable, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from src.services.metrics import counter
+from src.services.telegram_format import MESSAGE_LIMIT, FormattedText, render_markdown, split_formatted
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_EDIT_INTERVAL = 1.0  # секунды между правками заглушки
+DEFAULT_ACTION_INTERVAL = 4.5  # индикатор действия в Telegram гаснет через ~5 с
+STATUS_PREFIX = "⏳ "
+
+STATUS_COALESCED = counter(
+    "bot_response_status_coalesced_total",
+    "Статусов ответа, не отправленных из-за троттлинга правок",
+)
+
+
+class ResponseHandle:
+    """Заглушка ответа с троттлингом правок и фоновым индикатором действия."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        chat_id: int,
+        action: Optional[str] = "typing",
+        min_edit_interval: float = DEFAULT_MIN_EDIT_INTERVAL,
+        action_interval: float = DEFAULT_ACTION_INTERVAL,
+        limit: int = MESSAGE_LIMIT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.bot = bot
+        self.chat_id = chat_id
+        self.action = action
+        self.min_edit_interval = min_edit_interval
+        self.action_interval = action_interval
+        self.limit = limit
+        self._clock = clock
+        self.message_id: Optional[int] = None
+        self.finished = False
+        self._shown: Optional[str] = None
+        self._pending: Optional[str] = None
+        self._last_edit = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._action_task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "ResponseHandle":
+        if self.action is not None:
+            self._action_task = asyncio.create_task(self._renew_action())
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def status(self, text: str) -> None:
+        """Показать статус в заглушке; частые обновления схлопываются."""
+        if self.finished:
+            return
+        text = STATUS_PREFIX + text
+        if self.message_id is None:
+            await self._send_placeholder(text)
+            return
+
+        wait = self._last_edit + self.min_edit_interval - self._clock()
+        if wait <= 0 and self._flush_task is None:
+            await self._edit_status(text)
+            return
+
+        if self._pending is not None:
+            STATUS_COALESCED.inc()
+        self._pending = text
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later(wait))
+
+    async def finish(self, text: str, markdown: bool = True, **kwargs: Any) -> None:
+        """Вписать ответ в заглушку; остаток — следующими сообщениями.
+
+        `kwargs` (например, reply_markup) получает последнее сообщение ответа.
+        Повторный вызов отправляет текст новым сообщением, не трогая ответ.
+        """
+        self.finished = True
+        await self._stop_background()
+
+        formatted = render_markdown(text) if markdown else FormattedText(text.strip())
+        chunks: List[FormattedText] = split_formatted(formatted, self.limit)
+        for index, chunk in enumerate(chunks):
+            extra = kwargs if index == len(chunks) - 1 else {}
+            if index == 0 and self.message_id is not None and await self._edit(chunk, **extra):
+                # Заглушка стала ответом: повторный finish (например, с ошибкой) её не затрёт
+                self.message_id = None
+                continue
+            await self.bot.send_message(
+                self.chat_id,
+                chunk.text,
+                entities=list(chunk.entities),
+                parse_mode=None,
+                **extra,
+            )
+
+        if not chunks:
+            await self._delete_placeholder()
+
+    async def close(self) -> None:
+        """Остановить фоновые задачи; заглушку без ответа удалить."""
+        await self._stop_background()
+        if not self.finished:
+            self.finished = True
+            await self._delete_placeholder()
+
+    # --- внутреннее ---
+
+    async def _send_placeholder(self, text: str) -> None:
+        try:
+            message = await self.bot.send_message(self.chat_id, text, parse_mode=None)
+        except Exception as e:  # noqa: BLE001
+            # Статус необязателен: ответ всё равно будет отправлен
+            logger.warning("Не удалось отправить статус ответа: %s", e)
+            return
+        self.message_id = message.message_id
+        self._shown = text
+        self._last_edit = self._clock()
+
+    async def _edit_status(self, text: str) -> None:
+        if text == self._shown:
+            return
+        self._last_edit = self._clock()
+        try:
+            edited = await self._edit(FormattedText(text))
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Не удалось обновить статус ответа: %s", e)
+            return
+        if edited:
+            self._shown = text
+
+    async def _flush_later(self, delay: float) -> None:
+        """Показать последний отложенный статус, выдерживая интервал правок."""
+        try:
+            while self._pending is not None:
+                await asyncio.sleep(max(0.0, delay))
+                text, self._pending = self._pending, None
+                if text is not None:
+                    await self._edit_status(text)
+                delay = self.min_edit_interval
+        finally:
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+
+    async def _edit(self, chunk: FormattedText, **kwargs: Any) -> bool:
+        """Правка заглушки. False — заглушка удалена, нужно новое сообщение."""
+        try:
+            await self.bot.edit_message_text(
+                text=chunk.text,
+                chat_id=self.chat_id,
+                message_id=self.message_id,
+                entities=list(chunk.entities),
+                parse_mode=None,
+                **kwargs,
+            )
+        except TelegramBadRequest as e:
+            if "message is not modified" in e.message:
+                return True
+            logger.warning("Не удалось изменить сообщение %s: %s", self.message_id, e.message)
+            # Устаревший статус не должен остаться в чате рядом с новым сообщением
+            await self._delete_placeholder()
+            return False
+        return True
+
+    async def _delete_placeholder(self) -> None:
+        if self.message_id is None:
+            return
+        message_id, self.message_id = self.message_id, None
+        try:
+            await self.bot.delete_message(self.chat_id, message_id)
+        except Exception as e:  # noqa: BLE001
+            logger.debug("Не удалось удалить заглушку %s: %s", message_id, e)
+
+    async def _renew_action(self) -> None:
+        while True:
+            try:
+                await self.bot.send_chat_action(self.chat_id, self.action)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.debug("Не удалось отправить chat action: %s", e)
+            await asyncio.sleep(self.action_interval)
+
+    async def _stop_background(self) -> None:
+        tasks = [task for task in (self._flush_task, self._action_task) if task is not None]
+        self._flush_task = self._action_task = None
+        self._pending = None
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
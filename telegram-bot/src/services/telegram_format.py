@@ -0,0 +1,438 @@
+"""src/services/telegram_format.py
+Markdown ответов модели → текст с entities Telegram и разбиение на сообщения.
+
+Ответ переводится в обычный текст и список `MessageEntity` за один проход
+токенизатора, поэтому отправка не зависит от парсера Markdown на стороне
+Telegram: ошибок разбора и повторной отправки без форматирования нет.
+
+Поддерживается то, что реально пишет модель: `**жирный**`/`__жирный__`,
+`*курсив*`/`_курсив_`, `~~зачёркнутый~~`, `` `код` ``, блоки ```кода```,
+`[текст](url)`, заголовки `#`, списки `-`/`*`/`+`, цитаты `>` и
+разделители `---`. Непарные маркеры остаются в тексте как есть.
+
+Смещения entities считаются в UTF-16, как требует Bot API.
+`split_formatted` режет текст на части не длиннее лимита за O(n),
+предпочитая границы абзацев и строк и не разрезая entities.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import MessageEntity
+
+MESSAGE_LIMIT = 4096  # символов (UTF-16) в одном сообщении
+HORIZONTAL_RULE = "─" * 20
+
+# Заголовки разделов отчёта, которые модель пишет без разметки
+SECTION_HEADERS = (
+    "✨ Твой персональный профиль",
+    "❤️ Глубокий анализ чисел",
+    "💎 Матрица твоих энергий",
+    "💡 Твои точки роста и практики",
+    "➡️ Практика",
+    "➡️ Если появится желание",
+)
+
+_HEADING_RE = re.compile(r"#{1,6}\s+")
+_BULLET_RE = re.compile(r"\s*[-*+]\s+")
+_RULE_RE = re.compile(r"\s*(?:-{3,}|\*{3,}|_{3,})\s*")
+_FENCE = "```"
+
+# Маркеры выделения: самые длинные проверяются первыми
+_EMPHASIS = (("**", "bold"), ("__", "bold"), ("~~", "strikethrough"), ("*", "italic"), ("_", "italic"))
+
+
+@dataclass(frozen=True, slots=True)
+class FormattedText:
+    """Текст сообщения и entities со смещениями в UTF-16."""
+
+    text: str
+    entities: Tuple[MessageEntity, ...] = ()
+
+
+@dataclass(slots=True)
+class _Span:
+    """Entity в индексах символов Python (до перевода в UTF-16)."""
+
+    type: str
+    start: int
+    end: int
+    url: Optional[str] = None
+    language: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class _Atom:
+    """Код или ссылка внутри строки: выводится целиком одной entity."""
+
+    type: str
+    text: str
+    url: Optional[str] = None
+
+
+@dataclass(slots=True)
+class _Marker:
+    """Маркер выделения в строке; непарный выводится как текст."""
+
+    kind: str
+    literal: str
+    partner: Optional["_Marker"] = None
+    is_opener: bool = True
+
+
+def utf16_len(text: str) -> int:
+    """Длина строки в единицах UTF-16."""
+    return len(text) + sum(1 for char in text if ord(char) > 0xFFFF)
+
+
+class _Renderer:
+    """Однопроходный перевод Markdown в текст и spans."""
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self.length = 0
+        self.spans: List[_Span] = []
+
+    def emit(self, text: str) -> None:
+        if text:
+            self.parts.append(text)
+            self.length += len(text)
+
+    def render(self, source: str) -> Tuple[str, List[_Span]]:
+        lines = source.replace("\r\n", "\n").split("\n")
+        blank_run = 0
+        fence: Optional[Tuple[int, str, List[str]]] = None
+
+        for index, line in enumerate(lines):
+            newline = "\n" if index < len(lines) - 1 else ""
+            stripped = line.strip()
+
+            if fence is not None:
+                if stripped.startswith(_FENCE):
+                    start, language, body = fence
+                    self.emit("\n".join(body))
+                    self.spans.append(_Span("pre", start, self.length, language=language or None))
+                    fence = None
+                    self.emit(newline)
+                else:
+                    fence[2].append(line)
+                continue
+
+            if stripped.startswith(_FENCE):
+                fence = (self.length, stripped[len(_FENCE):].strip(), [])
+                continue
+
+            # Не больше одной пустой строки подряд
+            if not stripped:
+                blank_run += 1
+                if blank_run <= 1:
+                    self.emit(newline)
+                continue
+            blank_run = 0
+
+            self.render_line(line)
+            self.emit(newline)
+
+        if fence is not None:
+            # Незакрытый блок кода — выводим как есть
+            start, language, body = fence
+            self.emit("\n".join(body))
+            self.spans.append(_Span("pre", start, self.length, language=language or None))
+
+        return "".join(self.parts), self.spans
+
+    def render_line(self, line: str) -> None:
+        if _RULE_RE.fullmatch(line):
+            self.emit(HORIZONTAL_RULE)
+            return
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            self.render_wrapped("bold", line[heading.end():].strip())
+            return
+
+        bullet = _BULLET_RE.match(line)
+        if bullet:
+            self.emit("• ")
+            self.render_inline(line[bullet.end():])
+            return
+
+        if line.startswith(">"):
+            self.render_wrapped("blockquote", line[1:].lstrip())
+            return
+
+        if line.startswith(SECTION_HEADERS):
+            self.render_wrapped("bold", line.strip())
+            return
+
+        self.render_inline(line)
+
+    def render_wrapped(self, entity_type: str, text: str) -> None:
+        start = self.length
+        self.render_inline(text)
+        self.spans.append(_Span(entity_type, start, self.length))
+
+    def render_inline(self, line: str) -> None:
+        """Разобрать выделения строки: маркеры сопоставляются стеком, непарные — текст."""
+        tokens: List[object] = []
+        stack: List[_Marker] = []
+        text_start = 0
+        i = 0
+        n = len(line)
+
+        def flush_text(end: int) -> None:
+            if end > text_start:
+                tokens.append(line[text_start:end])
+
+        while i < n:
+            char = line[i]
+
+            if char == "`":
+                close = line.find("`", i + 1)
+                if close > i + 1:
+                    flush_text(i)
+                    tokens.append(_Atom("code", line[i + 1:close]))
+                    i = text_start = close + 1
+                    continue
+
+            elif char == "[":
+                link = self._match_link(line, i)
+                if link is not None:
+                    label, url, end = link
+                    flush_text(i)
+                    tokens.append(_Atom("text_link", label, url=url))
+                    i = text_start = end
+                    continue
+
+            elif char in "*_~":
+                marker = self._match_marker(line, i, stack)
+                if marker is not None:
+                    flush_text(i)
+                    tokens.append(marker)
+                    i = text_start = i + len(marker.literal)
+                    continue
+
+            i += 1
+
+        flush_text(n)
+        self._emit_tokens(tokens)
+
+    @staticmethod
+    def _match_link(line: str, i: int) -> Optional[Tuple[str, str, int]]:
+        label_end = line.find("](", i + 1)
+        if label_end <= i + 1:
+            return None
+        url_end = line.find(")", label_end + 2)
+        if url_end <= label_end + 2:
+            return None
+        url = line[label_end + 2:url_end].strip()
+        if not url.startswith(("http://", "https://", "tg://")):
+            return None
+        return line[i + 1:label_end], url, url_end + 1
+
+    @staticmethod
+    def _match_marker(line: str, i: int, stack: List[_Marker]) -> Optional[_Marker]:
+        # Сначала закрываем самое внутреннее выделение: `***текст***`
+        if stack and i > 0 and not line[i - 1].isspace() and line.startswith(stack[-1].literal, i):
+            opener = stack.pop()
+            closer = _Marker(opener.kind, opener.literal, partner=opener, is_opener=False)
+            opener.partner = closer
+            return closer
+
+        for literal, kind in _EMPHASIS:
+            if not line.startswith(literal, i):
+                continue
+            before = line[i - 1] if i > 0 else " "
+            after_index = i + len(literal)
+            after = line[after_index] if after_index < len(line) else " "
+
+            # Закрывающий маркер: есть открытый того же вида, перед ним не пробел
+            if not before.isspace():
+                for depth in range(len(stack) - 1, -1, -1):
+                    opener = stack[depth]
+                    if opener.literal == literal:
+                        # Открытые внутри остаются текстом: выделения не пересекаются
+                        del stack[depth:]
+                        closer = _Marker(kind, literal, partner=opener, is_opener=False)
+                        opener.partner = closer
+                        return closer
+
+            # Открывающий маркер: за ним не пробел; `_` внутри слова — не разметка
+            if after.isspace() or (literal[0] == "_" and before.isalnum()):
+                return None
+            marker = _Marker(kind, literal)
+            stack.append(marker)
+            return marker
+        return None
+
+    def _emit_tokens(self, tokens: List[object]) -> None:
+        open_starts: Dict[int, int] = {}
+        for token in tokens:
+            if isinstance(token, str):
+                self.emit(token)
+            elif isinstance(token, _Atom):
+                start = self.length
+                self.emit(token.text)
+                self.spans.append(_Span(token.type, start, self.length, url=token.url))
+            elif token.partner is None:
+                self.emit(token.literal)
+            elif token.is_opener:
+                open_starts[id(token)] = self.length
+            else:
+                start = open_starts.pop(id(token.partner))
+                if self.length > start:
+                    self.spans.append(_Span(token.kind, start, self.length))
+
+
+def _utf16_prefix(text: str) -> List[int]:
+    prefix = [0] * (len(text) + 1)
+    total = 0
+    for index, char in enumerate(text):
+        total += 2 if ord(char) > 0xFFFF else 1
+        prefix[index + 1] = total
+    return prefix
+
+
+def _to_entities(spans: List[_Span], prefix: List[int], start: int, end: int) -> Tuple[MessageEntity, ...]:
+    """Обрезать spans по отрезку [start, end) и перевести в UTF-16 entities."""
+    entities = []
+    for span in spans:
+        left, right = max(span.start, start), min(span.end, end)
+        if right <= left:
+            continue
+        entities.append(
+            MessageEntity(
+                type=span.type,
+                offset=prefix[left] - prefix[start],
+                length=prefix[right] - prefix[left],
+                url=span.url,
+                language=span.language,
+            )
+        )
+    return tuple(entities)
+
+
+def _from_entities(text: str, entities: Tuple[MessageEntity, ...], prefix: List[int]) -> List[_Span]:
+    index_of = {offset: index for index, offset in enumerate(prefix)}
+    return [
+        _Span(
+            entity.type,
+            index_of[entity.offset],
+            index_of[entity.offset + entity.length],
+            url=entity.url,
+            language=entity.language,
+        )
+        for entity in entities
+    ]
+
+
+def _trim(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def render_markdown(source: str) -> FormattedText:
+    """Перевести Markdown ответа модели в текст с entities Telegram."""
+    text, spans = _Renderer().render(source)
+    start, end = _trim(text, 0, len(text))
+    prefix = _utf16_prefix(text)
+    spans.sort(key=lambda span: (span.start, -span.end))
+    return FormattedText(text[start:end], _to_entities(spans, prefix, start, end))
+
+
+def split_formatted(formatted: FormattedText, limit: int = MESSAGE_LIMIT) -> List[FormattedText]:
+    """Разбить текст на сообщения не длиннее `limit` (UTF-16), не разрезая entities.
+
+    Граница ищется по убыванию предпочтения: пустая строка, перевод строки,
+    пробел. Граница внутри entity сдвигается к её началу; entity длиннее
+    лимита (например, большой блок кода) делится на части.
+    """
+    text = formatted.text
+    prefix = _utf16_prefix(text)
+    if prefix[-1] <= limit:
+        return [formatted] if text else []
+
+    spans = sorted(_from_entities(text, formatted.entities, prefix), key=lambda span: span.start)
+
+    # Объединённые отрезки entities: резать можно только снаружи них
+    blocks: List[Tuple[int, int]] = []
+    for span in spans:
+        if blocks and span.start < blocks[-1][1]:
+            blocks[-1] = (blocks[-1][0], max(blocks[-1][1], span.end))
+        else:
+            blocks.append((span.start, span.end))
+
+    chunks: List[FormattedText] = []
+    n = len(text)
+    start, _ = _trim(text, 0, n)
+    hard = start
+    block = 0
+    # Куски идут слева направо, spans отсортированы по началу: каждый span
+    # попадает в `active` и выбывает из него один раз
+    next_span = 0
+    active: List[_Span] = []
+    while start < n:
+        # Самая дальняя граница, укладывающаяся в лимит
+        hard = max(hard, start)
+        while hard < n and prefix[hard + 1] - prefix[start] <= limit:
+            hard += 1
+        cut = hard
+        if hard < n:
+            for separator in ("\n\n", "\n", " "):
+                found = text.rfind(separator, start + 1, hard)
+                if found > start:
+                    cut = found
+                    break
+
+            while block < len(blocks) and blocks[block][1] <= start:
+                block += 1
+            # Граница внутри entity — переносим её перед entity
+            for index in range(block, len(blocks)):
+                block_start, block_end = blocks[index]
+                if block_start >= cut:
+                    break
+                if block_start < cut < block_end:
+                    if block_start > start:
+                        cut = block_start
+                    break
+
+        left, right = _trim(text, start, cut)
+        if right > left:
+            while next_span < len(spans) and spans[next_span].start < right:
+                active.append(spans[next_span])
+                next_span += 1
+            active = [span for span in active if span.end > left]
+            chunks.append(FormattedText(text[left:right], _to_entities(active, prefix, left, right)))
+        start = cut
+        while start < n and text[start].isspace():
+            start += 1
+    return chunks
+
+
+async def send_formatted(
+    bot: Bot,
+    chat_id: int,
+    markdown: str,
+    limit: int = MESSAGE_LIMIT,
+    **kwargs,
+) -> None:
+    """Отправить ответ модели с entities, при необходимости несколькими сообщениями.
+
+    `kwargs` (например, reply_markup) передаются последнему сообщению.
+    """
+    chunks = split_formatted(render_markdown(markdown), limit)
+    for index, chunk in enumerate(chunks):
+        extra = kwargs if index == len(chunks) - 1 else {}
+        await bot.send_message(
+            chat_id,
+            chunk.text,
+            entities=list(chunk.entities),
+            parse_mode=None,
+            **extra,
+        )
@@ -0,0 +1,141 @@
+"""src/services/update_dedup.py
+Дедупликация апдейтов Telegram по `update_id`.
+
+Telegram повторяет доставку, если не получил подтверждение (медленный
+webhook, перезапуск воркера). Повтор — это ещё один вызов OpenAI и ещё одна
+заявка на отчёт, поэтому апдейт «занимается» до запуска хендлеров:
+обработан будет только первый экземпляр.
+
+- Локальный LRU-набор недавних `update_id` отвечает без обращения к БД.
+- Общий бэкенд в PostgreSQL (таблица `processed_update`) видит повторы,
+  пришедшие на другой воркер или после перезапуска: одна вставка
+  `ON CONFLICT DO NOTHING RETURNING` — и проверка, и запись. Этот шаг
+  ждёт БД, поэтому выполняется уже в очереди чата (`claim_shared`), а до
+  планировщика — только синхронная локальная проверка (`claim_local`).
+- Записи старше `ttl` удаляются лениво: Telegram не хранит апдейты дольше суток.
+
+При недоступности БД апдейт обрабатывается (fail-open), как и в лимитере.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Protocol
+
+from sqlalchemy import text
+
+from src.config import Settings
+from src.db.connection import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEDUP_TTL = 24 * 3600.0
+DEFAULT_DEDUP_MAX_ENTRIES = 100_000
+
+
+class UpdateDedupBackend(Protocol):
+    """Общий набор обработанных апдейтов."""
+
+    async def claim(self, update_id: int) -> bool:
+        """Отметить апдейт обработанным. False — он уже был."""
+        ...
+
+
+class PostgresUpdateDedupBackend:
+    """Обработанные апдейты в PostgreSQL, общие для всех воркеров."""
+
+    _CLAIM_SQL = text(
+        """
+        INSERT INTO processed_update (update_id, seen_at)
+        VALUES (:update_id, :now)
+        ON CONFLICT (update_id) DO NOTHING
+        RETURNING update_id
+        """
+    )
+
+    _EVICT_SQL = text("DELETE FROM processed_update WHERE seen_at < :cutoff")
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        ttl: float = DEFAULT_DEDUP_TTL,
+        evict_every: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.db_manager = db_manager
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self._clock = clock
+        self._calls = 0
+
+    async def claim(self, update_id: int) -> bool:
+        self._calls += 1
+        now = self._clock()
+        try:
+            async with self.db_manager.get_session() as session:
+                result = await session.execute(self._CLAIM_SQL, {"update_id": update_id, "now": now})
+                claimed = result.first() is not None
+
+                # Ленивое удаление старых записей
+                if self._calls % self.evict_every == 0:
+                    await session.execute(self._EVICT_SQL, {"cutoff": now - self.ttl})
+
+                return claimed
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Dedup backend недоступен, обрабатываем апдейт: %s", e)
+            return True
+
+
+class UpdateDeduplicator:
+    """LRU недавних `update_id` в процессе перед необязательным общим бэкендом."""
+
+    def __init__(
+        self,
+        backend: Optional[UpdateDedupBackend] = None,
+        max_entries: int = DEFAULT_DEDUP_MAX_ENTRIES,
+    ) -> None:
+        self.backend = backend
+        self.max_entries = max_entries
+        self._seen: OrderedDict[int, None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def claim_local(self, update_id: int) -> bool:
+        """Занять апдейт в процессе без ожидания. False — повтор уже виден локально."""
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            return False
+
+        # Запоминаем до обращения к БД: параллельный повтор отсекается локально
+        self._remember(update_id)
+        return True
+
+    async def claim_shared(self, update_id: int) -> bool:
+        """Занять апдейт в общем бэкенде (если он есть). False — апдейт уже обработан."""
+        if self.backend is None:
+            return True
+        return await self.backend.claim(update_id)
+
+    async def claim(self, update_id: int) -> bool:
+        """True — апдейт встречается впервые и его нужно обработать."""
+        return self.claim_local(update_id) and await self.claim_shared(update_id)
+
+    def _remember(self, update_id: int) -> None:
+        self._seen[update_id] = None
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+
+def create_update_deduplicator(
+    settings: Settings,
+    db_manager: Optional[DatabaseManager] = None,
+) -> UpdateDeduplicator:
+    """Создать дедупликатор по настройкам (UPDATE_DEDUP_BACKEND)."""
+    if settings.update_dedup_backend == "postgres":
+        if db_manager is None:
+            raise RuntimeError("Для UPDATE_DEDUP_BACKEND=postgres нужен DatabaseManager")
+        return UpdateDeduplicator(PostgresUpdateDedupBackend(db_manager))
+
+    return UpdateDeduplicator()
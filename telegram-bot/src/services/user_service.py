@@ -1,60 +1,137 @@
 """src/services/user_service.py
 Сервис для работы с пользователями.
+
+Пользователь создаётся или обновляется одним запросом
+`INSERT ... ON CONFLICT (telegram_user_id) DO UPDATE ... RETURNING id`.
+Внутренний `id` и профиль кешируются в процессе (LRU): пока имя и username
+не меняются, `ensure_user` не обращается к БД вовсе. Кеш знает только об
+изменениях этого процесса: после удаления пользователя вызовите `forget()`.
 """
 from __future__ import annotations
 
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import select
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.db.models import User
+from src.services.metrics import counter
+
+DEFAULT_USER_CACHE_SIZE = 10_000
+
+USER_CACHE = counter("bot_user_cache_total", "Обращений к кешу пользователей по результату")
+
+
+@dataclass(frozen=True, slots=True)
+class CachedUser:
+    """Внутренний ID пользователя и профиль, записанный в БД."""
+
+    id: int
+    username: Optional[str]
+    full_name: Optional[str]
+
+
+class UserCache:
+    """Ограниченный LRU: Telegram ID → внутренний ID и профиль."""
+
+    def __init__(self, max_entries: int = DEFAULT_USER_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedUser] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, telegram_user_id: str) -> Optional[CachedUser]:
+        entry = self._entries.get(telegram_user_id)
+        if entry is not None:
+            self._entries.move_to_end(telegram_user_id)
+        return entry
+
+    def put(self, telegram_user_id: str, entry: CachedUser) -> None:
+        self._entries[telegram_user_id] = entry
+        self._entries.move_to_end(telegram_user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, telegram_user_id: str) -> None:
+        """Убрать запись (например, после удаления пользователя)."""
+        self._entries.pop(telegram_user_id, None)
+
+
+_user_cache = UserCache()
+
+
+def get_user_cache() -> UserCache:
+    """Общий для процесса кеш пользователей."""
+    return _user_cache
 
 
 class UserService:
     """Сервис для работы с пользователями."""
-    
-    def __init__(self, session: AsyncSession):
+
+    def __init__(self, session: AsyncSession, cache: Optional[UserCache] = None):
         self.session = session
-    
-    async def get_or_create_user(
+        self.cache = cache if cache is not None else get_user_cache()
+
+    async def ensure_user(
         self,
         telegram_user_id: int,
         username: Optional[str] = None,
         full_name: Optional[str] = None,
-    ) -> User:
-        """Получить существующего пользователя или создать нового."""
-        # Ищем существующего пользователя
-        stmt = select(User).where(User.telegram_user_id == str(telegram_user_id))
-        result = await self.session.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if user:
-            # Обновляем данные, если они изменились
-            updated = False
-            if username and user.username != username:
-                user.username = username
-                updated = True
-            if full_name and user.full_name != full_name:
-                user.full_name = full_name
-                updated = True
-            
-            if updated:
-                user.updated_at = datetime.now(timezone.utc)
-                self.session.add(user)
-            
-            return user
-        
-        # Создаём нового пользователя
-        user = User(
-            telegram_user_id=str(telegram_user_id),
+    ) -> int:
+        """Вернуть внутренний ID пользователя, создав или обновив его при необходимости.
+
+        Пустые `username`/`full_name` не затирают сохранённые значения.
+        """
+        key = str(telegram_user_id)
+        cached = self.cache.get(key)
+        if (
+            cached is not None
+            and (username is None or username == cached.username)
+            and (full_name is None or full_name == cached.full_name)
+        ):
+            USER_CACHE.inc(result="hit")
+            return cached.id
+
+        USER_CACHE.inc(result="miss" if cached is None else "changed")
+        entry = await self._upsert(key, username, full_name)
+        # В кеш — только после фиксации: при откате новый ID не существует
+        event.listen(
+            self.session.sync_session,
+            "after_commit",
+            lambda _session: self.cache.put(key, entry),
+            once=True,
+        )
+        return entry.id
+
+    async def _upsert(self, telegram_user_id: str, username: Optional[str], full_name: Optional[str]) -> CachedUser:
+        dialect = self.session.bind.dialect.name if self.session.bind is not None else "postgresql"
+        insert = sqlite_insert if dialect == "sqlite" else pg_insert
+        now = datetime.now(timezone.utc)
+        statement = insert(User).values(
+            telegram_user_id=telegram_user_id,
             username=username,
             full_name=full_name,
+            created_at=now,
+            updated_at=now,
         )
-        self.session.add(user)
-        return user
-    
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[User.telegram_user_id],
+            set_={
+                "username": func.coalesce(excluded.username, User.username),
+                "full_name": func.coalesce(excluded.full_name, User.full_name),
+                "updated_at": excluded.updated_at,
+            },
+        ).returning(User.id, User.username, User.full_name)
+        result = await self.session.execute(statement)
+        return CachedUser(*result.one())
+
     async def get_user_by_telegram_id(self, telegram_user_id: int) -> Optional[User]:
         """Получить пользователя по Telegram ID."""
         stmt = select(User).where(User.telegram_user_id == str(telegram_user_id))
@@ -0,0 +1,443 @@
+"""src/services/user_state_store.py
+Ограниченное и переживающее перезапуск хранилище состояния пользователей.
+
+Два уровня:
+- L1 — LRU с TTL простоя в памяти процесса (ограничено `max_entries`);
+- общий уровень — PostgreSQL (таблица `user_state`) или локальный
+  key-value заменитель для одного процесса и тестов.
+
+Значения сериализуются компактным JSON. Запись отложенная (write-behind):
+изменения накапливаются в L1 и сбрасываются фоновой задачей пачками.
+Изменяемые значения (dict/list/deque), прочитанные из L1, считаются
+потенциально изменёнными и при сбросе сравниваются с сохранённой версией —
+поэтому `user_data[uid]["name"] = ...` тоже попадает в общий уровень.
+
+Перед обработкой апдейта состояние пользователя подгружается в L1
+(`await store.hydrate(user_id)`, см. UserStateMiddleware), после чего
+пространства имён работают как обычные синхронные словари.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Protocol, Set, Tuple
+
+from sqlalchemy import bindparam, text
+
+from src.config import Settings
+from src.db.connection import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_L1_TTL = 6 * 3600.0  # простой в памяти процесса, секунды
+DEFAULT_STATE_TTL = 30 * 24 * 3600.0  # хранение в общем уровне, секунды
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+_MUTABLE_TYPES = (dict, list, deque)
+
+
+def dumps_state(value: Any) -> bytes:
+    """Компактная сериализация значения (deque сохраняется как список)."""
+    return json.dumps(
+        value,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=lambda obj: list(obj) if isinstance(obj, deque) else str(obj),
+    ).encode("utf-8")
+
+
+class UserStateBackend(Protocol):
+    """Общий уровень хранилища состояния."""
+
+    # True, если уровень разделяют несколько процессов: тогда L1 обновляется при hydrate
+    shared: bool
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        ...
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float) -> None:
+        ...
+
+    async def delete_many(self, keys: List[str]) -> None:
+        ...
+
+
+class InMemoryStateBackend:
+    """Локальный key-value заменитель общего уровня (один процесс, тесты).
+
+    Хранит сериализованные значения, ограничен по числу ключей (LRU) и TTL.
+    """
+
+    shared = False
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES * 2,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: OrderedDict[str, Tuple[bytes, float]] = OrderedDict()
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        now = self._clock()
+        result = {}
+        for key in keys:
+            item = self._data.get(key)
+            if item is None:
+                continue
+            if item[1] <= now:
+                del self._data[key]
+                continue
+            self._data.move_to_end(key)
+            result[key] = item[0]
+        return result
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float) -> None:
+        expires_at = self._clock() + ttl
+        for key, value in items.items():
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def delete_many(self, keys: List[str]) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class PostgresStateBackend:
+    """Общий уровень в PostgreSQL: таблица `user_state` (key, value, expires_at).
+
+    Чтение — один SELECT на все пространства имён пользователя, запись —
+    пакетный UPSERT. Просроченные строки удаляются лениво.
+    """
+
+    shared = True
+
+    _GET_SQL = text(
+        "SELECT key, value FROM user_state "
+        "WHERE key IN :keys AND expires_at > EXTRACT(EPOCH FROM now())"
+    ).bindparams(bindparam("keys", expanding=True))
+
+    _UPSERT_SQL = text(
+        """
+        INSERT INTO user_state (key, value, expires_at)
+        VALUES (:key, :value, EXTRACT(EPOCH FROM now()) + :ttl)
+        ON CONFLICT (key) DO UPDATE SET
+            value = EXCLUDED.value,
+            expires_at = EXCLUDED.expires_at
+        """
+    )
+
+    _DELETE_SQL = text("DELETE FROM user_state WHERE key IN :keys").bindparams(
+        bindparam("keys", expanding=True)
+    )
+
+    _EVICT_SQL = text("DELETE FROM user_state WHERE expires_at < EXTRACT(EPOCH FROM now())")
+
+    def __init__(self, db_manager: DatabaseManager, evict_every: int = 1000) -> None:
+        self.db_manager = db_manager
+        self.evict_every = evict_every
+        self._writes = 0
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(self._GET_SQL, {"keys": keys})
+            return {row.key: bytes(row.value) for row in result}
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float) -> None:
+        if not items:
+            return
+        self._writes += 1
+        async with self.db_manager.get_session() as session:
+            await session.execute(
+                self._UPSERT_SQL,
+                [{"key": key, "value": value, "ttl": ttl} for key, value in items.items()],
+            )
+            if self._writes % self.evict_every == 0:
+                await session.execute(self._EVICT_SQL)
+
+    async def delete_many(self, keys: List[str]) -> None:
+        if not keys:
+            return
+        async with self.db_manager.get_session() as session:
+            await session.execute(self._DELETE_SQL, {"keys": keys})
+
+
+class _Entry:
+    """Значение в L1 и отпечаток его последней сохранённой версии."""
+
+    __slots__ = ("value", "touched_at", "digest")
+
+    def __init__(self, value: Any, touched_at: float, digest: Optional[int] = None) -> None:
+        self.value = value
+        self.touched_at = touched_at
+        self.digest = digest
+
+
+class StateNamespace(MutableMapping):
+    """Пространство имён хранилища с интерфейсом словаря user_id -> значение.
+
+    Для `ring_size` значения восстанавливаются как deque(maxlen=ring_size).
+    """
+
+    def __init__(self, store: "UserStateStore", name: str, ring_size: Optional[int] = None) -> None:
+        self.store = store
+        self.name = name
+        self.ring_size = ring_size
+
+    def loads(self, data: bytes) -> Any:
+        value = json.loads(data)
+        if self.ring_size is not None:
+            return deque(value, maxlen=self.ring_size)
+        return value
+
+    def __getitem__(self, user_id: int) -> Any:
+        return self.store._get(self.name, user_id)
+
+    def __setitem__(self, user_id: int, value: Any) -> None:
+        self.store._set(self.name, user_id, value)
+
+    def __delitem__(self, user_id: int) -> None:
+        self.store._delete(self.name, user_id)
+
+    def __contains__(self, user_id: object) -> bool:
+        return self.store._contains(self.name, user_id)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([user_id for name, user_id in list(self.store._entries) if name == self.name])
+
+    def __len__(self) -> int:
+        return sum(1 for name, _ in self.store._entries if name == self.name)
+
+
+class UserStateStore:
+    """Двухуровневое хранилище состояния пользователей с отложенной записью."""
+
+    def __init__(
+        self,
+        backend: Optional[UserStateBackend] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        l1_ttl: float = DEFAULT_L1_TTL,
+        state_ttl: float = DEFAULT_STATE_TTL,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.backend: UserStateBackend = backend if backend is not None else InMemoryStateBackend()
+        self.max_entries = max_entries
+        self.l1_ttl = l1_ttl
+        self.state_ttl = state_ttl
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._namespaces: Dict[str, StateNamespace] = {}
+        self._entries: OrderedDict[Tuple[str, int], _Entry] = OrderedDict()
+        # Ключи L1, которые могли измениться с последнего сброса
+        self._dirty: Set[Tuple[str, int]] = set()
+        # Готовые к записи значения вытесненных ключей; None — удаление
+        self._pending: Dict[str, Optional[bytes]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def namespace(self, name: str, ring_size: Optional[int] = None) -> StateNamespace:
+        """Получить (создать) пространство имён."""
+        if name not in self._namespaces:
+            self._namespaces[name] = StateNamespace(self, name, ring_size)
+        return self._namespaces[name]
+
+    def set_backend(self, backend: UserStateBackend) -> None:
+        """Заменить общий уровень (при запуске приложения, до обработки апдейтов)."""
+        self.backend = backend
+
+    @staticmethod
+    def storage_key(name: str, user_id: int) -> str:
+        return f"{name}:{user_id}"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- синхронный доступ к L1 ---
+
+    def _get(self, name: str, user_id: int) -> Any:
+        key = (name, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            raise KeyError(user_id)
+        self._touch(key, entry)
+        if isinstance(entry.value, _MUTABLE_TYPES):
+            self._dirty.add(key)
+        return entry.value
+
+    def _contains(self, name: str, user_id: object) -> bool:
+        return (name, user_id) in self._entries
+
+    def _set(self, name: str, user_id: int, value: Any) -> None:
+        key = (name, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = _Entry(value, self._clock())
+            self._pending.pop(self.storage_key(name, user_id), None)
+            self._evict()
+        else:
+            entry.value = value
+            self._touch(key, entry)
+        self._dirty.add(key)
+
+    def _delete(self, name: str, user_id: int) -> None:
+        key = (name, user_id)
+        if key not in self._entries:
+            raise KeyError(user_id)
+        del self._entries[key]
+        self._dirty.discard(key)
+        self._pending[self.storage_key(name, user_id)] = None
+
+    def _touch(self, key: Tuple[str, int], entry: _Entry) -> None:
+        entry.touched_at = self._clock()
+        self._entries.move_to_end(key)
+
+    def _evict(self) -> None:
+        """Вытеснить лишние и простаивающие записи; несохранённые — в очередь записи."""
+        now = self._clock()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - entry.touched_at <= self.l1_ttl:
+                break
+            self._entries.popitem(last=False)
+            if key in self._dirty:
+                self._dirty.discard(key)
+                data = dumps_state(entry.value)
+                if hash(data) != entry.digest:
+                    self._pending[self.storage_key(*key)] = data
+
+    # --- обмен с общим уровнем ---
+
+    async def hydrate(self, user_id: int) -> None:
+        """Подгрузить состояние пользователя из общего уровня в L1.
+
+        Для разделяемого уровня чистые записи L1 перечитываются, чтобы видеть
+        изменения других воркеров. Ошибки общего уровня не прерывают обработку.
+        """
+        self._ensure_flusher()
+        self._evict()
+
+        keys: Dict[str, Tuple[str, int]] = {}
+        for name in self._namespaces:
+            key = (name, user_id)
+            if key in self._dirty or self.storage_key(name, user_id) in self._pending:
+                continue
+            if key in self._entries and not self.backend.shared:
+                self._touch(key, self._entries[key])
+                continue
+            keys[self.storage_key(name, user_id)] = key
+        if not keys:
+            return
+
+        try:
+            found = await self.backend.get_many(list(keys))
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Общее хранилище состояния недоступно: %s", e)
+            return
+
+        now = self._clock()
+        for storage_key, key in keys.items():
+            if key in self._dirty:
+                continue  # изменено, пока шло чтение
+            data = found.get(storage_key)
+            if data is None:
+                entry = self._entries.get(key)
+                if entry is not None and entry.digest is not None:
+                    del self._entries[key]  # удалено или истекло в общем уровне
+                continue
+            value = self._namespaces[key[0]].loads(data)
+            self._entries[key] = _Entry(value, now, hash(data))
+            self._entries.move_to_end(key)
+        self._evict()
+
+    async def flush(self) -> None:
+        """Сбросить изменённые значения в общий уровень одной пачкой."""
+        async with self._flush_lock:
+            batch = self._pending
+            self._pending = {}
+            written: List[Tuple[_Entry, int]] = []
+            for key in self._dirty:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                data = dumps_state(entry.value)
+                digest = hash(data)
+                if digest != entry.digest:
+                    batch[self.storage_key(*key)] = data
+                    written.append((entry, digest))
+            self._dirty.clear()
+            if not batch:
+                return
+
+            try:
+                await self.backend.set_many(
+                    {k: v for k, v in batch.items() if v is not None}, self.state_ttl
+                )
+                await self.backend.delete_many([k for k, v in batch.items() if v is None])
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Не удалось сохранить состояние пользователей: %s", e)
+                # Повторим при следующем сбросе, не затирая более новые изменения
+                for storage_key, data in batch.items():
+                    self._pending.setdefault(storage_key, data)
+                return
+
+            for entry, digest in written:
+                entry.digest = digest
+
+    def _ensure_flusher(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self) -> None:
+        """Остановить фоновый сброс и записать оставшиеся изменения."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+
+def create_user_state_backend(
+    settings: Settings,
+    db_manager: Optional[DatabaseManager] = None,
+) -> UserStateBackend:
+    """Создать общий уровень хранилища по настройкам (USER_STATE_BACKEND)."""
+    if settings.user_state_backend == "postgres":
+        if db_manager is None:
+            raise RuntimeError("Для USER_STATE_BACKEND=postgres нужен DatabaseManager")
+        return PostgresStateBackend(db_manager)
+
+    return InMemoryStateBackend()
+
+
+# Общий для процесса экземпляр: пространства имён создаются при импорте хендлеров
+_user_state_store: Optional[UserStateStore] = None
+
+
+def get_user_state_store() -> UserStateStore:
+    """Получить общее для процесса хранилище состояния пользователей."""
+    global _user_state_store
+    if _user_state_store is None:
+        _user_state_store = UserStateStore()
+    return _user_state_store
@@ -0,0 +1,143 @@
+"""src/webhook.py
+Приём апдейтов Telegram по webhook: быстрый ответ и обработка в фоне.
+
+- Запрос проверяется по заголовку `X-Telegram-Bot-Api-Secret-Token`
+  (секрет передаётся в setWebhook), чужие запросы получают 401.
+- Каждый принятый апдейт обрабатывается своей задачей (`dp.feed_update`),
+  Telegram сразу получает 200 — время ответа не зависит от OpenAI, и Telegram
+  не повторяет доставку по таймауту.
+- Исполнением управляет планировщик апдейтов (middleware): порядок внутри
+  чата и пул исполнителей между чатами. Общего пула здесь нет, поэтому чат,
+  засыпающий бота сообщениями, не занимает обработку остальных чатов.
+- Принятых, но не обработанных апдейтов не больше `queue_size`; сверх этого
+  отвечаем 503: Telegram повторит доставку позже, апдейт не теряется.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import logging
+from typing import Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from src.services.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_DRAIN_TIMEOUT = 25.0  # секунды на дообработку очереди при остановке
+
+UPDATES_RECEIVED = counter("bot_webhook_updates_total", "Апдейтов принято через webhook")
+UPDATES_REJECTED = counter("bot_webhook_rejected_total", "Запросов webhook отклонено, по причинам")
+UPDATES_FAILED = counter("bot_webhook_failed_total", "Апдейтов webhook, завершившихся ошибкой")
+QUEUE_SIZE = gauge("bot_webhook_queue_size", "Принятых и не обработанных апдейтов webhook")
+
+
+def derive_webhook_secret(bot_token: str) -> str:
+    """Секрет webhook по умолчанию: одинаков во всех процессах и не раскрывает токен.
+
+    Telegram допускает 1–256 символов A-Z, a-z, 0-9, `_` и `-` — hex подходит.
+    """
+    return hashlib.sha256(f"webhook:{bot_token}".encode()).hexdigest()
+
+
+class WebhookUpdateQueue:
+    """Приём апдейтов webhook: задача на апдейт, не больше `queue_size` одновременно."""
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret_token: str,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+    ) -> None:
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.queue_size = queue_size
+        self.drain_timeout = drain_timeout
+        self._tasks: Set[asyncio.Task] = set()
+        self._accepting = False
+        QUEUE_SIZE.set_collector(lambda: [({}, len(self._tasks))])
+
+    def register(self, app: web.Application, path: str) -> None:
+        """Подключить обработчик запросов и жизненный цикл исполнителей к приложению."""
+        app.router.add_post(path, self.handle)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Принять апдейт: проверить секрет, поставить в очередь и сразу ответить."""
+        received = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            UPDATES_REJECTED.inc(reason="secret")
+            return web.Response(status=401)
+        if not self._accepting:
+            UPDATES_REJECTED.inc(reason="stopping")
+            return web.Response(status=503)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Некорректный апдейт webhook: %s", e)
+            UPDATES_REJECTED.inc(reason="invalid")
+            return web.Response(status=400)
+
+        if len(self._tasks) >= self.queue_size:
+            # Telegram повторит доставку — обратное давление вместо потери апдейта
+            UPDATES_REJECTED.inc(reason="queue_full")
+            return web.Response(status=503)
+
+        # Задачи создаются в порядке приёма — планировщик получает апдейты чата по порядку
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        UPDATES_RECEIVED.inc()
+        return web.Response()
+
+    @property
+    def pending(self) -> int:
+        """Принятых и ещё не обработанных апдейтов."""
+        return len(self._tasks)
+
+    async def start(self) -> None:
+        self._accepting = True
+
+    async def stop(self) -> None:
+        """Перестать принимать апдейты и дообработать принятые."""
+        self._accepting = False
+        if not self._tasks:
+            return
+        _, unfinished = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+        if unfinished:
+            logger.warning("Webhook: при остановке не обработано апдейтов: %d", len(unfinished))
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception:  # noqa: BLE001
+            UPDATES_FAILED.inc()
+            logger.exception("Ошибка обработки апдейта %s", update.update_id)
+
+    async def _on_startup(self, app: web.Application) -> None:
+        await self.start()
+
+    async def _on_shutdown(self, app: web.Application) -> None:
+        await self.stop()
+
+
+def resolve_webhook_url(base_url: Optional[str], path: str) -> Optional[str]:
+    """Полный URL webhook: WEBHOOK_URL может быть задан с путём или только доменом."""
+    if not base_url:
+        return None
+    base_url = base_url.rstrip("/")
+    return base_url if base_url.endswith(path) else base_url + path
@@ -41,22 +41,21 @@ async def test_database_connection():
         async with db_manager.get_session() as session:
             user_service = UserService(session)
             
-            # Создаём тестового пользователя
-            test_user = await user_service.get_or_create_user(
+            # Создаём тестового пользователя (ID возвращается тем же запросом)
+            test_user_id = await user_service.ensure_user(
                 telegram_user_id=12345,
                 username="test_user",
                 full_name="Test User"
             )
             
-            # Коммитим пользователя, чтобы получить ID
+            # Фиксируем: анализ сохраняется в отдельной сессии
             await session.commit()
-            await session.refresh(test_user)
             
-            print(f"✅ Пользователь создан: ID={test_user.id}, Telegram ID={test_user.telegram_user_id}")
+            print(f"✅ Пользователь создан: ID={test_user_id}, Telegram ID=12345")
             
             # Тестируем аналитику
             analytics_service = AnalyticsService()
-            storage_service = AnalyticsStorageService(session)
+            storage_service = AnalyticsStorageService(db_manager.get_session)
             
             # Выполняем тестовый анализ
             analysis_result = analytics_service.analyze_person(
@@ -67,7 +66,7 @@ async def test_database_connection():
             
             # Сохраняем результат в БД
             report = await storage_service.save_analysis_result(
-                user_id=test_user.id,
+                user_id=test_user_id,
                 full_name="Иван Петров",
                 birth_date=date(1990, 3, 15),
                 analysis_result=analysis_result
@@ -75,7 +74,7 @@ async def test_database_connection():
             print(f"✅ Результат сохранён в БД: Report ID={report.id}")
             
             # Проверяем, что можем получить сохранённый анализ
-            saved_analyses = await storage_service.get_user_analyses(test_user.id, limit=1)
+            saved_analyses = await storage_service.get_user_analyses(test_user_id, limit=1)
             if saved_analyses:
                 print(f"✅ Получен сохранённый анализ: {saved_analyses[0].status}")
             else:
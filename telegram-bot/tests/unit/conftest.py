@@ -0,0 +1,45 @@
+"""Общие фикстуры unit-тестов: SQLite-БД со всеми таблицами и журнал SQL-запросов."""
+import pytest
+import pytest_asyncio
+import sys
+import os
+
+from sqlalchemy import event
+from sqlmodel import SQLModel
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.config import Settings
+from src.db import models  # noqa: F401  — регистрирует таблицы в metadata
+from src.db.connection import DatabaseManager
+
+
+@pytest_asyncio.fixture
+async def db_manager(tmp_path):
+    """Отдельная SQLite-БД на тест; все таблицы создаются одним create_all."""
+    settings = Settings(
+        telegram_bot_token="test",
+        openai_api_key="test",
+        database_url=f"sqlite+aiosqlite:///{tmp_path / 'test.db'}",
+        environment="test",
+    )
+    manager = DatabaseManager(settings)
+    await manager.initialize()
+    async with manager.engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield manager
+    await manager.close()
+
+
+@pytest.fixture
+def statements(db_manager):
+    """SQL-запросы к БД, выполненные во время теста."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db_manager.engine.sync_engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(db_manager.engine.sync_engine, "before_cursor_execute", record)
@@ -0,0 +1,182 @@
+"""Тесты для отложенной записи журнала доступа к воспоминаниям."""
+import asyncio
+import pytest
+import sys
+import os
+
+from sqlalchemy import func, select
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.db.models import Memory, MemoryAccess, User
+from src.services.access_log import AccessLogWriter
+from src.services.memory_bank_service import MemoryBankService
+
+
+def memoryaccess_inserts(statements):
+    """INSERT-запросы в журнал доступа среди выполненных во время теста."""
+    return [statement for statement in statements if "INSERT INTO memoryaccess" in statement]
+
+
+async def add_memories(db_manager, count):
+    """Воспоминания с id 1..count: журнал пишется только для существующих."""
+    async with db_manager.get_session() as session:
+        session.add(User(id=1, telegram_user_id="42"))
+        session.add_all(
+            [Memory(id=i, user_id=1, title=f"m{i}", content="text", memory_type="general") for i in range(1, count + 1)]
+        )
+
+
+async def count_accesses(db_manager, **filters):
+    async with db_manager.get_session() as session:
+        query = select(func.count()).select_from(MemoryAccess).filter_by(**filters)
+        return (await session.execute(query)).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_reads_do_not_write_until_flush(db_manager, statements):
+    writer = AccessLogWriter(db_manager.get_session, flush_interval=60)
+    service = MemoryBankService(db_manager, access_log=writer)
+    for i in range(5):
+        await service.create_memory(user_id=1, title=f"m{i}", content="text")
+
+    memories = await service.get_user_memories(1)
+
+    assert len(memories) == 5
+    assert memoryaccess_inserts(statements) == []
+    assert len(writer) == 10
+
+    assert await writer.flush() == 10
+    assert len(memoryaccess_inserts(statements)) == 1
+    assert await count_accesses(db_manager, access_type="read") == 5
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_size_limits_rows_per_insert(db_manager, statements):
+    await add_memories(db_manager, 10)
+    writer = AccessLogWriter(db_manager.get_session, batch_size=4, flush_interval=60)
+    for memory_id in range(1, 11):
+        writer.record(memory_id, 1, "read")
+
+    assert await writer.flush() == 10
+    assert len(memoryaccess_inserts(statements)) == 3
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_in_background(db_manager):
+    await add_memories(db_manager, 3)
+    writer = AccessLogWriter(db_manager.get_session, batch_size=3, flush_interval=60)
+    for memory_id in range(1, 4):
+        writer.record(memory_id, 1, "read")
+
+    # Фоновая задача проснулась по размеру пачки, не дожидаясь интервала
+    for _ in range(50):
+        if await count_accesses(db_manager) == 3:
+            break
+        await asyncio.sleep(0.01)
+
+    assert await count_accesses(db_manager) == 3
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_bounded(db_manager):
+    await add_memories(db_manager, 5)
+    writer = AccessLogWriter(db_manager.get_session, flush_interval=60, max_buffer=3)
+    for memory_id in range(1, 6):
+        writer.record(memory_id, 1, "read")
+
+    assert len(writer) == 3
+    await writer.close()
+    async with db_manager.get_session() as session:
+        kept = (await session.execute(select(MemoryAccess.memory_id))).scalars().all()
+    assert sorted(kept) == [3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_close_writes_remaining_events(db_manager):
+    await add_memories(db_manager, 1)
+    writer = AccessLogWriter(db_manager.get_session, flush_interval=60)
+    writer.record(1, 1, "read", "search: кофе")
+
+    await writer.close()
+
+    assert await count_accesses(db_manager, context="search: кофе") == 1
+
+
+class SlowWriter(AccessLogWriter):
+    """Запись пачки ждёт сигнала — можно закрыть writer посреди записи."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def _write(self, session, batch):
+        self.started.set()
+        await self.release.wait()
+        await super()._write(session, batch)
+
+
+@pytest.mark.asyncio
+async def test_close_during_write_keeps_batch(db_manager):
+    await add_memories(db_manager, 2)
+    writer = SlowWriter(db_manager.get_session, batch_size=1, flush_interval=60)
+    writer.record(1, 1, "read")
+    await writer.started.wait()
+
+    closing = asyncio.create_task(writer.close())
+    await asyncio.sleep(0.01)
+    writer.record(2, 1, "read")
+    writer.release.set()
+    await closing
+
+    assert await count_accesses(db_manager) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_dropped(db_manager):
+    writer = AccessLogWriter(db_manager.get_session, flush_interval=60)
+    async with db_manager.engine.begin() as conn:
+        await conn.run_sync(MemoryAccess.__table__.drop)
+    writer.record(1, 1, "read")
+
+    assert await writer.flush() == 0
+    assert len(writer) == 0
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_delete_removes_memory_history(db_manager):
+    writer = AccessLogWriter(db_manager.get_session, flush_interval=60)
+    service = MemoryBankService(db_manager, access_log=writer)
+    memory = await service.create_memory(user_id=1, title="m", content="text")
+    await writer.flush()
+    await service.get_memory(memory.id, 1)
+
+    assert await service.delete_memory(memory.id, 1) is True
+    assert len(writer) == 0
+    await writer.close()
+    assert await count_accesses(db_manager, memory_id=memory.id) == 0
+
+
+@pytest.mark.asyncio
+async def test_events_of_memory_deleted_elsewhere_are_skipped(db_manager, statements):
+    """Воспоминание удалено другим процессом: его события не пишутся, остальные — одним INSERT."""
+    await add_memories(db_manager, 2)
+    writer = AccessLogWriter(db_manager.get_session, flush_interval=60)
+    for memory_id in (1, 2, 3):
+        writer.record(memory_id, 1, "read")
+    async with db_manager.get_session() as session:
+        await session.delete(await session.get(Memory, 2))
+
+    await writer.flush()
+
+    assert len(memoryaccess_inserts(statements)) == 1
+    async with db_manager.get_session() as session:
+        written = (await session.execute(select(MemoryAccess.memory_id))).scalars().all()
+    assert written == [1]
+    await writer.close()
@@ -0,0 +1,112 @@
+"""Тесты для хранения результатов анализа (result_json, дедупликация по content_hash)."""
+import pytest
+import pytest_asyncio
+import sys
+import os
+from datetime import date
+
+from sqlalchemy import func, select
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.db.models import ReportRequest, ReportStatus, User
+from src.services.analytics.analytics_service import AnalyticsService
+from src.services.analytics_storage import AnalyticsStorageService, analysis_content_hash
+
+BIRTH_DATE = date(1990, 3, 15)
+
+
+@pytest_asyncio.fixture
+async def db_manager(db_manager):
+    async with db_manager.get_session() as session:
+        session.add_all([User(id=1, telegram_user_id="42"), User(id=2, telegram_user_id="43")])
+    return db_manager
+
+
+@pytest.fixture
+def storage(db_manager):
+    return AnalyticsStorageService(db_manager.get_session)
+
+
+@pytest.fixture
+def analysis():
+    return AnalyticsService().analyze_person("15.03.1990", "Ivan")
+
+
+async def row_count(db_manager):
+    async with db_manager.get_session() as session:
+        return await session.scalar(select(func.count()).select_from(ReportRequest))
+
+
+def test_content_hash_normalizes_name():
+    assert analysis_content_hash(BIRTH_DATE, " Ivan  Petrov ") == analysis_content_hash(BIRTH_DATE, "ivan petrov")
+    assert analysis_content_hash(BIRTH_DATE, "Ivan") != analysis_content_hash(date(1990, 3, 16), "Ivan")
+    assert analysis_content_hash(BIRTH_DATE, None) == analysis_content_hash(BIRTH_DATE, "")
+
+
+@pytest.mark.asyncio
+async def test_identical_analysis_is_upserted(storage, db_manager, analysis):
+    first = await storage.save_analysis_result(1, "Ivan", BIRTH_DATE, analysis)
+    second = await storage.save_analysis_result(1, "IVAN", BIRTH_DATE, analysis)
+
+    assert second.id == first.id
+    assert second.full_name == "IVAN"
+    assert await row_count(db_manager) == 1
+
+    await storage.save_analysis_result(2, "Ivan", BIRTH_DATE, analysis)
+    await storage.save_analysis_result(1, "Ivan", date(1991, 3, 15), analysis)
+    assert await row_count(db_manager) == 3
+
+
+@pytest.mark.asyncio
+async def test_result_is_stored_as_json_and_rendered_on_read(storage, analysis):
+    saved = await storage.save_analysis_result(1, "Ivan", BIRTH_DATE, analysis)
+
+    assert saved.result_text is None
+    assert saved.result_json["calculations"] == analysis["calculations"]
+
+    [item] = await storage.get_analytics_by_user_id(1)
+    assert item["status"] == "done"
+    assert item["birth_date"] == "1990-03-15"
+    assert item["result"]["input_data"]["latin_name"] == analysis["input_data"]["latin_name"]
+    assert f"Число Сознания (ЧС): {analysis['calculations']['consciousness_number']}" in item["report"]
+
+
+@pytest.mark.asyncio
+async def test_legacy_text_rows_are_still_readable(storage, db_manager):
+    async with db_manager.get_session() as session:
+        session.add(
+            ReportRequest(
+                user_id=1, full_name="Old", birth_date=BIRTH_DATE, status=ReportStatus.DONE, result_text="старый отчёт"
+            )
+        )
+
+    [item] = await storage.get_analytics_by_user_id(1)
+    assert item["result"] is None
+    assert item["report"] == "старый отчёт"
+
+
+@pytest.mark.asyncio
+async def test_failed_repeat_keeps_done_result(storage, db_manager, analysis):
+    done = await storage.save_analysis_result(1, "Ivan", BIRTH_DATE, analysis)
+    failed = await storage.save_analysis_result(
+        1, "Ivan", BIRTH_DATE, analysis, status=ReportStatus.ERROR, error_message="timeout"
+    )
+
+    assert failed.id == done.id
+    assert failed.status == ReportStatus.DONE
+    assert failed.result_json["calculations"] == analysis["calculations"]
+    assert failed.error is None
+    assert await row_count(db_manager) == 1
+
+
+@pytest.mark.asyncio
+async def test_repeated_analysis_moves_to_top(storage):
+    first = await storage.save_analysis_result(1, "Ivan", BIRTH_DATE, {"input_data": {"latin_name": "Ivan"}})
+    await storage.save_analysis_result(1, "Petr", BIRTH_DATE, {"input_data": {"latin_name": "Petr"}})
+    await storage.save_analysis_result(1, "Ivan", BIRTH_DATE, {"input_data": {"latin_name": "Ivan"}})
+
+    page, _ = await storage.get_user_analyses_page(1)
+    assert [report.full_name for report in page] == ["Ivan", "Petr"]
+    assert page[0].id == first.id
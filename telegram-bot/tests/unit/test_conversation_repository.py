@@ -0,0 +1,154 @@
+"""Тесты для истории диалогов (dialog/message) с пачечной записью."""
+import pytest
+import pytest_asyncio
+import sys
+import os
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.db.message_partitions import month_start, partition_ddl, partition_month, partition_name
+from src.db.models import Dialog, Message
+from src.services.conversation_repository import ConversationRepository
+from src.services.user_service import UserCache
+
+
+@pytest_asyncio.fixture
+async def repo(db_manager):
+    repository = ConversationRepository(db_manager.get_session, flush_interval=60, user_cache=UserCache())
+    yield repository
+    await repository.close()
+
+
+async def count(db_manager, model):
+    async with db_manager.get_session() as session:
+        return await session.scalar(select(func.count()).select_from(model))
+
+
+def turns(n):
+    return [("user" if i % 2 == 0 else "assistant", f"m{i}") for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_append_is_buffered_until_flush(repo, db_manager):
+    repo.append(1, "user", "привет")
+    repo.append(1, "assistant", "здравствуйте")
+
+    assert len(repo) == 2
+    assert await count(db_manager, Message) == 0
+
+    assert await repo.flush() == 2
+    assert await count(db_manager, Message) == 2
+    assert await count(db_manager, Dialog) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_is_one_multirow_insert(repo, statements):
+    for user_id in (1, 2):
+        for role, content in turns(10):
+            repo.append(user_id, role, content)
+
+    await repo.flush()
+    message_inserts = [s for s in statements if s.startswith("INSERT INTO message")]
+    assert len(message_inserts) == 1
+
+    # Диалоги уже в кеше: следующая пачка — только INSERT в message
+    statements.clear()
+    repo.append(1, "user", "ещё")
+    await repo.flush()
+    assert [s.split("(")[0].strip() for s in statements if not s.startswith(("BEGIN", "COMMIT"))] == [
+        "INSERT INTO message"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_load_recent_after_restart(repo, db_manager):
+    for role, content in turns(30):
+        repo.append(1, role, content)
+    await repo.close()
+
+    fresh = ConversationRepository(db_manager.get_session, flush_interval=60, user_cache=UserCache())
+    recent = await fresh.load_recent(1, 20)
+
+    assert [m["content"] for m in recent] == [f"m{i}" for i in range(10, 30)]
+    assert recent[0] == {"role": "user", "content": "m10"}
+    assert await fresh.load_recent(2, 20) == []
+
+
+@pytest.mark.asyncio
+async def test_load_recent_includes_pending(repo):
+    repo.append(1, "user", "m0")
+    await repo.flush()
+    repo.append(1, "assistant", "m1")
+
+    assert [m["content"] for m in await repo.load_recent(1, 20)] == ["m0", "m1"]
+    assert [m["content"] for m in await repo.load_recent(1, 1)] == ["m1"]
+
+
+@pytest.mark.asyncio
+async def test_start_opens_new_dialog(repo, db_manager):
+    repo.append(1, "user", "старый")
+    await repo.flush()
+    repo.start_dialog(1)
+    assert await repo.load_recent(1, 20) == []
+
+    repo.append(1, "user", "новый")
+    await repo.flush()
+
+    assert await count(db_manager, Dialog) == 2
+    fresh = ConversationRepository(db_manager.get_session, user_cache=UserCache())
+    assert [m["content"] for m in await fresh.load_recent(1, 20)] == ["новый"]
+
+
+@pytest.mark.asyncio
+async def test_history_pages_by_cursor(repo):
+    for role, content in turns(5):
+        repo.append(1, role, content)
+    repo.start_dialog(1)
+    for role, content in turns(3):
+        repo.append(1, role, f"new-{content}")
+    repo.append(2, "user", "чужое")
+    await repo.flush()
+
+    seen = []
+    page, cursor = await repo.history_page(1, limit=3)
+    seen.extend(page)
+    while cursor is not None:
+        page, cursor = await repo.history_page(1, before=cursor, limit=3)
+        seen.extend(page)
+
+    assert [m["content"] for m in seen] == ["new-m2", "new-m1", "new-m0", "m4", "m3", "m2", "m1", "m0"]
+    assert len({m["dialog_id"] for m in seen}) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_does_not_cache_dialog(repo, db_manager):
+    async with db_manager.engine.begin() as conn:
+        await conn.run_sync(Message.__table__.drop)
+    repo.append(1, "user", "потеряно")
+    assert await repo.flush() == 0
+    assert repo._dialogs == {}
+
+    async with db_manager.engine.begin() as conn:
+        await conn.run_sync(Message.__table__.create)
+    repo.append(1, "user", "записано")
+    assert await repo.flush() == 1
+
+
+@pytest.mark.asyncio
+async def test_partition_maintenance_is_noop_without_postgres(repo):
+    await repo.maintain_partitions(retention_months=1)
+
+
+def test_partition_naming():
+    month = month_start(datetime(2026, 12, 17, 10, 30))
+    assert month == datetime(2026, 12, 1)
+    assert month_start(month, 1) == datetime(2027, 1, 1)
+    assert month_start(month, -12) == datetime(2025, 12, 1)
+    assert partition_name(month) == "message_y2026m12"
+    assert partition_month("message_y2026m12") == month
+    assert partition_month("message_default") is None
+    assert partition_ddl(month).endswith("FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')")
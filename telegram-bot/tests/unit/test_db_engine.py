@@ -0,0 +1,148 @@
+"""Тесты для фабрики движков БД."""
+import pytest
+import sys
+import os
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.config import Settings, _optional_int
+from src.db.engine import (
+    POOL_WAIT,
+    MonitoredPool,
+    PoolKeepalive,
+    create_engine,
+    engine_options,
+    normalize_db_url,
+    warm_pool,
+)
+from src.services.metrics import render_metrics
+
+
+def make_settings(database_url, **kwargs):
+    return Settings(
+        telegram_bot_token="test",
+        openai_api_key="test",
+        database_url=database_url,
+        environment="test",
+        **kwargs,
+    )
+
+
+class TestEngineOptions:
+    """Тесты параметров движка."""
+
+    @pytest.mark.parametrize("url", ["postgresql://u:p@host/db", "postgres://u:p@host/db"])
+    def test_postgres_urls_use_psycopg(self, url):
+        assert normalize_db_url(url) == "postgresql+psycopg://u:p@host/db"
+
+    def test_other_urls_untouched(self):
+        for url in ("postgresql+psycopg://u:p@host/db", "sqlite+aiosqlite:///x.db"):
+            assert normalize_db_url(url) == url
+
+    def test_pool_settings_without_pre_ping(self):
+        settings = make_settings(
+            "postgresql://u:p@host/db",
+            db_pool_size=3,
+            db_max_overflow=2,
+            db_pool_recycle=120,
+            db_prepare_threshold=None,
+        )
+        options = engine_options(settings)
+
+        assert options["pool_size"] == 3
+        assert options["max_overflow"] == 2
+        assert options["pool_recycle"] == 120
+        assert options["pool_pre_ping"] is False
+        assert options["echo"] is False
+        assert options["connect_args"] == {"prepare_threshold": None}
+
+    def test_sqlite_has_no_pool_options(self):
+        options = engine_options(make_settings("sqlite+aiosqlite:///x.db"))
+
+        assert "pool_size" not in options
+
+    def test_async_engine_uses_monitored_pool(self):
+        engine = create_engine(make_settings("postgresql://u:p@host/db", db_pool_size=2, db_max_overflow=2))
+
+        assert isinstance(engine.pool, MonitoredPool)
+        assert engine.url.drivername == "postgresql+psycopg"
+        assert 'bot_db_pool_connections{state="checked_out"} 0' in render_metrics()
+        assert "bot_db_pool_saturation 0" in render_metrics()
+
+    def test_optional_int(self):
+        assert _optional_int("5") == 5
+        assert _optional_int("off") is None
+        assert _optional_int("") is None
+
+
+class TestWarmupAndKeepalive:
+    """Тесты прогрева пула и фоновой проверки соединения."""
+
+    @pytest.mark.asyncio
+    async def test_warm_pool_opens_distinct_connections(self, tmp_path):
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'warm.db'}",
+            poolclass=MonitoredPool,
+            pool_size=3,
+            max_overflow=0,
+        )
+        waits_before = POOL_WAIT.count()
+        try:
+            assert await warm_pool(engine, 2) == 2
+            assert engine.pool.checkedin() == 2
+            assert engine.pool.checkedout() == 0
+            assert POOL_WAIT.count() >= waits_before + 2
+        finally:
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_keepalive_ping(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ping.db'}")
+        broken = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'ping.db'}")
+        try:
+            assert await PoolKeepalive(engine, 60).ping() is True
+
+            keepalive = PoolKeepalive(broken, 60)
+            assert await keepalive.ping() is False
+            assert keepalive.failures == 1
+        finally:
+            await engine.dispose()
+            await broken.dispose()
+
+    @pytest.mark.asyncio
+    async def test_keepalive_pings_every_idle_connection(self, tmp_path):
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'idle.db'}",
+            poolclass=MonitoredPool,
+            pool_size=3,
+            max_overflow=0,
+        )
+        pinged = set()
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            pinged.add(id(conn.connection.dbapi_connection))
+
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            assert await warm_pool(engine, 3) == 3
+            pinged.clear()
+
+            assert await PoolKeepalive(engine, 60).ping() is True
+            assert len(pinged) == 3
+            assert engine.pool.checkedin() == 3
+        finally:
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_keepalive_disabled_with_zero_interval(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'off.db'}")
+        keepalive = PoolKeepalive(engine, 0)
+        keepalive.start()
+
+        assert keepalive._task is None
+        await keepalive.stop()
+        await engine.dispose()
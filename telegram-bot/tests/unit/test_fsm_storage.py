@@ -0,0 +1,80 @@
+"""Тесты для FSM-хранилища в БД (на SQLite вместо PostgreSQL)."""
+import pytest
+import sys
+import os
+
+from aiogram.fsm.storage.base import StorageKey
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from services.fsm_storage import PostgresFSMStorage
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+class FakeClock:
+    """Управляемые часы для тестов."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def count_sessions(db_manager):
+    """Подсчитывать обращения к БД."""
+    calls = []
+    original = db_manager.get_session
+
+    def get_session():
+        calls.append(1)
+        return original()
+
+    db_manager.get_session = get_session
+    return calls
+
+
+class TestPostgresFSMStorage:
+    """Тесты FSM-хранилища."""
+
+    @pytest.mark.asyncio
+    async def test_state_and_data_persisted(self, db_manager):
+        """Состояние и данные переживают пересоздание хранилища."""
+        storage = PostgresFSMStorage(db_manager)
+        await storage.set_state(KEY, "MemoryStates:waiting_for_title")
+        await storage.update_data(KEY, {"title": "Заметка"})
+
+        fresh = PostgresFSMStorage(db_manager)
+        assert await fresh.get_state(KEY) == "MemoryStates:waiting_for_title"
+        assert await fresh.get_data(KEY) == {"title": "Заметка"}
+
+    @pytest.mark.asyncio
+    async def test_reads_served_from_cache(self, db_manager):
+        """После записи чтение состояния и данных не обращается к БД."""
+        storage = PostgresFSMStorage(db_manager)
+        calls = count_sessions(db_manager)
+
+        await storage.set_state(KEY, "s1")
+        await storage.set_data(KEY, {"a": 1})
+        await storage.get_state(KEY)
+        await storage.get_data(KEY)
+        await storage.set_data(KEY, {"a": 1})  # без изменений — запись пропускается
+
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_abandoned_flow_expires(self, db_manager):
+        """Брошенный сценарий истекает и не смешивается с новым."""
+        clock = FakeClock()
+        storage = PostgresFSMStorage(db_manager, state_ttl=60, cache_ttl=0, clock=clock)
+        await storage.set_state(KEY, "s1")
+        await storage.set_data(KEY, {"a": 1})
+
+        clock.now += 61
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_data(KEY) == {}
+
+        await storage.set_state(KEY, "s2")
+        assert await storage.get_data(KEY) == {}
@@ -167,10 +167,8 @@ class TestAdditionalDataHandling:
 class TestMessageProcessing:
     """Тесты обработки сообщений."""
     
-    @patch('handlers.context_handler.send_typing_status')
-    @patch('handlers.context_handler.send_status_message')
-    @patch('handlers.context_handler.update_status_message')
-    def test_message_processing_flow(self, mock_update_status, mock_send_status, mock_typing):
+    @patch('handlers.context_handler.ResponseHandle')
+    def test_message_processing_flow(self, mock_response_handle):
         """Тест потока обработки сообщений."""
         # Этот тест требует более сложной настройки моков
         # для полного тестирования обработки сообщений
@@ -0,0 +1,64 @@
+"""Тесты для однопроходного сканера намерений."""
+import pytest
+import sys
+import os
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from services.intent_scanner import detect_intent, scan_message, scan_text
+
+
+class TestScanText:
+    """Тесты сканирования одного сообщения."""
+
+    @pytest.mark.parametrize("text,intent", [
+        ("Расскажи подробнее про мою матрицу", "детализация"),
+        ("Что ждет меня в этом году?", "прогноз"),
+        ("Хочу найти отношения", "совместимость"),
+        ("В чём моё предназначение?", "реализация"),
+        ("Посоветуй практику", "практики"),
+        ("Привет", None),
+    ])
+    def test_intent(self, text, intent):
+        """Тип запроса определяется с прежним приоритетом."""
+        assert scan_text(text).intent == intent
+
+    def test_overlapping_keywords_found(self):
+        """Перекрывающиеся фразы не теряются ("расскажи про" и "прогноз")."""
+        assert {"детализация", "прогноз"} <= scan_text("расскажи прогноз").tags
+
+    def test_dates_extracted(self):
+        """Даты во всех поддерживаемых форматах извлекаются без дублей."""
+        scan = scan_text("12.03.1990, 1/2/2000, 3-4-2010 и 5 6 2020")
+
+        assert scan.dates == ("12.03.1990", "1/2/2000", "3-4-2010", "5 6 2020")
+
+    def test_name(self):
+        """Одно слово из букв считается именем."""
+        assert scan_text(" Анна ").name == "Анна"
+        assert scan_text("Анна Иванова").name is None
+        assert scan_text("А").name is None
+
+
+class TestDetectIntent:
+    """Тесты определения типа запроса по истории."""
+
+    def test_history_scanned_once(self):
+        """Результат сканирования кешируется в записи контекста."""
+        msg = {"role": "user", "content": "Хочу прогноз"}
+
+        assert detect_intent("ок", [msg]) == "прогноз"
+        assert msg["scan"]["tags"] == ["прогноз"]
+
+        msg["content"] = "другой текст"  # запись уже просканирована
+        assert scan_message(msg).intent == "прогноз"
+
+    def test_detail_not_inherited_from_history(self):
+        """Детализация учитывается только в текущем сообщении."""
+        history = [
+            {"role": "user", "content": "Какой у меня характер?"},
+            {"role": "assistant", "content": "Прогноз на год"},
+        ]
+
+        assert detect_intent("ок", history) == "анализ"
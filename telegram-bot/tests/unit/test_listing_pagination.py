@@ -0,0 +1,122 @@
+"""Тесты постраничных списков по курсору (воспоминания и анализы)."""
+import pytest
+import pytest_asyncio
+import sys
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text, update
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.db.models import Memory, ReportRequest, User
+from src.handlers.memory_handler import MemoryPage
+from src.services.access_log import AccessLogWriter
+from src.services.analytics_storage import AnalyticsStorageService
+from src.services.memory_bank_service import MemoryBankService
+
+
+@pytest_asyncio.fixture
+async def db_manager(db_manager):
+    async with db_manager.get_session() as session:
+        session.add(User(id=1, telegram_user_id="42"))
+    return db_manager
+
+
+@pytest_asyncio.fixture
+async def service(db_manager):
+    writer = AccessLogWriter(flush_interval=60)
+    yield MemoryBankService(db_manager, access_log=writer)
+    await writer.close()
+
+
+async def all_pages(fetch, limit):
+    pages, cursor = [], None
+    while True:
+        page, cursor = await fetch(after=cursor, limit=limit)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.asyncio
+async def test_memory_pages_match_full_listing(service, db_manager, statements):
+    for i in range(11):
+        await service.create_memory(1, f"m{i}", "x", importance=i % 3)
+    # Одинаковые importance и updated_at: порядок решает id
+    async with db_manager.get_session() as session:
+        await session.execute(
+            update(Memory).where(Memory.importance == 1).values(updated_at=datetime(2026, 1, 1, tzinfo=timezone.utc))
+        )
+    await service.create_memory(2, "чужое", "x")
+
+    expected = [m.id for m in await service.get_user_memories(1)]
+    statements.clear()
+    pages = await all_pages(lambda **kw: service.get_user_memories_page(1, **kw), limit=4)
+
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [m.id for page in pages for m in page] == expected
+    # Страница — один запрос с условием по курсору
+    assert len(statements) == len(pages)
+    assert all("memory.id >" in s for s in statements[1:])
+
+
+@pytest.mark.asyncio
+async def test_memory_page_filters_and_access_log(service):
+    for i in range(3):
+        await service.create_memory(1, f"m{i}", "x", tags="еда" if i else None)
+    queued = len(service.access_log)
+
+    page, cursor = await service.get_user_memories_page(1, limit=1, tag="еда")
+    rest, last = await service.get_user_memories_page(1, after=cursor, limit=1, tag="еда")
+
+    assert cursor is not None and last is None
+    assert {m.title for m in page + rest} == {"m1", "m2"}
+    # Лишняя строка, по которой видно следующую страницу, не считается прочитанной
+    assert len(service.access_log) == queued + 2
+
+
+@pytest.mark.asyncio
+async def test_memory_listing_uses_index(db_manager):
+    after = (5, datetime(2026, 1, 1, tzinfo=timezone.utc), 10)
+    query = MemoryBankService._user_memories_query(1, after=after).limit(10)
+    async with db_manager.engine.connect() as conn:
+        compiled = query.compile(conn.sync_engine, compile_kwargs={"literal_binds": True})
+        plan = (await conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_memory_user_id_importance_updated_at" in details
+    assert "TEMP B-TREE" not in details
+
+
+@pytest.mark.asyncio
+async def test_report_pages_match_full_listing(db_manager):
+    storage = AnalyticsStorageService(db_manager.get_session)
+    for i in range(7):
+        await storage.save_analysis_result(1, f"Name{i}", date(1990, 1, i + 1), {"input_data": {}})
+    async with db_manager.get_session() as session:
+        await session.execute(
+            update(ReportRequest)
+            .where(ReportRequest.id <= 3)
+            .values(created_at=datetime(2026, 1, 1, tzinfo=timezone.utc))
+        )
+
+    expected = [r.id for r in await storage.get_user_analyses(1, limit=100)]
+    pages = await all_pages(lambda **kw: storage.get_user_analyses_page(1, **kw), limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [r.id for page in pages for r in page] == expected
+
+
+def test_memory_page_callback_round_trip():
+    cursor = (10, datetime(2026, 10, 18, 12, 0, 0, 123456, tzinfo=timezone.utc), 2_147_483_647)
+    packed = MemoryPage.from_cursor(cursor, shown=1000).pack()
+
+    assert len(packed.encode()) <= 64
+    restored = MemoryPage.unpack(packed)
+    assert restored.to_cursor() == cursor
+    assert restored.shown == 1000
+    # Наивное время из БД считается UTC
+    naive = cursor[1].replace(tzinfo=None) - timedelta(hours=3)
+    assert MemoryPage.from_cursor((1, naive, 1), 0).to_cursor()[1] == cursor[1] - timedelta(hours=3)
@@ -0,0 +1,187 @@
+"""Тесты для кешированного дайджеста Memory Bank."""
+import pytest
+import pytest_asyncio
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.services.access_log import AccessLogWriter
+from src.services.memory_bank_service import MemoryBankService
+from src.services.memory_digest import (
+    DigestEntry,
+    MemoryDigest,
+    MemoryDigestCache,
+    estimate_tokens,
+)
+from src.services.openai_context_service import OpenAIContextService
+from src.services.openai_resilience import ResilientCaller
+
+
+@pytest_asyncio.fixture
+async def writer():
+    writer = AccessLogWriter(flush_interval=60)
+    yield writer
+    await writer.close()
+
+
+@pytest_asyncio.fixture
+async def service(db_manager, writer):
+    return MemoryBankService(db_manager, access_log=writer, digest_cache=MemoryDigestCache())
+
+
+def entry(memory_id, title, content="", importance=5, tags=None):
+    return DigestEntry.build(memory_id, title, content, "personal", importance, tags)
+
+
+class TestDigestSelection:
+    """Выбор воспоминаний без БД."""
+
+    def test_relevant_memories_first(self):
+        digest = MemoryDigest([
+            entry(1, "Работа", "встречи по вторникам", importance=9),
+            entry(2, "Кофе", "пью кофе без сахара", importance=3),
+            entry(3, "Отпуск", "море в августе", importance=8),
+        ])
+
+        chosen, _ = digest.select("Какой кофе я люблю?")
+
+        assert [e.id for e in chosen] == [2]
+
+    def test_word_forms_match(self):
+        digest = MemoryDigest([entry(1, "Путешествия", "люблю путешествовать"), entry(2, "Еда", "суп")])
+
+        chosen, _ = digest.select("путешествие")
+
+        assert [e.id for e in chosen] == [1]
+
+    def test_no_match_falls_back_to_importance(self):
+        digest = MemoryDigest([entry(2, "b", importance=9), entry(1, "a", importance=1)])
+
+        chosen, _ = digest.select("погода")
+
+        assert [e.id for e in chosen] == [2, 1]
+
+    def test_token_budget_is_respected(self):
+        digest = MemoryDigest([entry(i, f"Кофе {i}", "слово " * 40) for i in range(10)])
+
+        context, ids = digest.render("кофе", token_budget=200)
+
+        assert estimate_tokens(context) <= 200
+        assert 0 < len(ids) < 10
+
+    def test_related_memories_fill_remaining_budget(self):
+        digest = MemoryDigest(
+            [entry(1, "Кофе"), entry(2, "Кофейня у дома"), entry(3, "Чай")],
+            links={1: [3], 3: [1]},
+        )
+
+        chosen, related = digest.select("кофе")
+
+        assert [e.id for e in chosen] == [1]
+        assert [e.id for e in related] == [3]
+
+
+class TestDigestCache:
+    def test_ttl_and_invalidation(self):
+        now = [0.0]
+        cache = MemoryDigestCache(ttl=10, clock=lambda: now[0])
+        digest = MemoryDigest([])
+
+        cache.put(1, digest)
+        assert cache.get(1) is digest
+        now[0] = 11
+        assert cache.get(1) is None
+
+        cache.put(1, digest)
+        cache.invalidate(1)
+        assert cache.get(1) is None
+
+    def test_digest_built_before_invalidation_is_not_cached(self):
+        cache = MemoryDigestCache()
+        generation = cache.generation(1)
+        cache.invalidate(1)
+
+        cache.put(1, MemoryDigest([]), generation)
+
+        assert cache.get(1) is None
+
+    def test_other_user_invalidation_does_not_block_put(self):
+        """Сброс дайджеста одного пользователя не мешает кешировать чужой."""
+        cache = MemoryDigestCache()
+        generation = cache.generation(1)
+        cache.invalidate(2)
+
+        digest = MemoryDigest([])
+        cache.put(1, digest, generation)
+
+        assert cache.get(1) is digest
+
+
+@pytest.mark.asyncio
+async def test_repeated_context_reads_no_db(service, statements):
+    await service.create_memory(1, "Кофе", "без сахара")
+    await service.create_memory(1, "Работа", "офис")
+    statements.clear()
+
+    first = await service.get_memory_context_for_ai(1, query="кофе")
+    loaded = len(statements)
+    second = await service.get_memory_context_for_ai(1, query="работа")
+
+    assert loaded == 2
+    assert len(statements) == loaded
+    assert "Кофе" in first and "Работа" not in first
+    assert "Работа" in second
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_digest(service):
+    memory = await service.create_memory(1, "Кофе", "без сахара")
+    assert "без сахара" in await service.get_memory_context_for_ai(1, query="кофе")
+
+    await service.update_memory(memory.id, 1, content="с молоком")
+    assert "с молоком" in await service.get_memory_context_for_ai(1, query="кофе")
+
+    await service.delete_memory(memory.id, 1)
+    assert await service.get_memory_context_for_ai(1, query="кофе") == (
+        "У пользователя пока нет сохраненных воспоминаний."
+    )
+
+
+@pytest.mark.asyncio
+async def test_only_included_memories_are_logged(service, writer):
+    await service.create_memory(1, "Кофе", "без сахара")
+    await service.create_memory(1, "Работа", "офис")
+    queued = len(writer)
+
+    await service.get_memory_context_for_ai(1, query="кофе")
+
+    assert len(writer) == queued + 1
+
+
+@pytest.mark.asyncio
+async def test_digest_is_sent_to_openai(service):
+    """Воспоминания, относящиеся к сообщению, уходят в OpenAI системным сообщением."""
+    await service.create_memory(1, "Кофе", "без сахара")
+    await service.create_memory(1, "Работа", "офис")
+    openai_service = OpenAIContextService(api_key="test", session_provider=Mock(), memory_service=service)
+    reply = SimpleNamespace(message=SimpleNamespace(content="ответ", tool_calls=None))
+    create = AsyncMock(return_value=SimpleNamespace(choices=[reply]))
+    openai_service.client = Mock()
+    openai_service.client.chat.completions.create = create
+    openai_service.resilience = ResilientCaller()
+
+    result = await openai_service.process_message(
+        user_message="Пользователь: какой кофе мне взять?\n\nДанные пользователя:\nИмя: Ivan\nДата рождения: 20.05.1997",
+        user_id=1,
+        context=[],
+    )
+
+    assert result == "ответ"
+    system = [m["content"] for m in create.call_args.kwargs["messages"] if m["role"] == "system"]
+    assert len(system) == 2
+    assert "без сахара" in system[1] and "офис" not in system[1]
@@ -0,0 +1,116 @@
+"""Тесты для тегов и связей воспоминаний (memory_tag, memory_link)."""
+import pytest
+import pytest_asyncio
+import sys
+import os
+
+from sqlalchemy import select
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.db.models import MemoryTag
+from src.services.access_log import AccessLogWriter
+from src.services.memory_bank_service import MemoryBankService, parse_memory_ids, parse_tags
+
+
+@pytest_asyncio.fixture
+async def service(db_manager):
+    writer = AccessLogWriter(flush_interval=60)
+    yield MemoryBankService(db_manager, access_log=writer)
+    await writer.close()
+
+
+async def chain(service, user_id, length):
+    """Цепочка m0 ← m1 ← ... (каждое следующее ссылается на предыдущее)."""
+    memories = []
+    for i in range(length):
+        related = str(memories[-1].id) if memories else None
+        memories.append(
+            await service.create_memory(user_id, f"m{i}", "text", importance=i, related_memories=related)
+        )
+    return memories
+
+
+def test_parsing():
+    assert parse_tags(" Кофе, еда,,кофе ") == ["кофе", "еда"]
+    assert parse_tags(None) == []
+    assert parse_memory_ids("3, 1, x, 3") == [3, 1]
+
+
+@pytest.mark.asyncio
+async def test_tag_filter_uses_tag_table(service, db_manager):
+    await service.create_memory(1, "Кофе", "утром", tags="Еда, привычки")
+    await service.create_memory(1, "Работа", "офис", tags="работа")
+    await service.create_memory(2, "Чужое", "текст", tags="еда")
+
+    found = await service.get_user_memories(1, tag=" ЕДА ")
+
+    assert [m.title for m in found] == ["Кофе"]
+    async with db_manager.get_session() as session:
+        tags = (await session.execute(select(MemoryTag.tag).order_by(MemoryTag.tag))).scalars().all()
+    assert tags == ["еда", "еда", "привычки", "работа"]
+
+
+@pytest.mark.asyncio
+async def test_update_replaces_tags(service):
+    memory = await service.create_memory(1, "Кофе", "утром", tags="еда")
+    await service.update_memory(memory.id, 1, tags="напитки")
+
+    assert await service.get_user_memories(1, tag="еда") == []
+    assert [m.id for m in await service.get_user_memories(1, tag="напитки")] == [memory.id]
+
+
+@pytest.mark.asyncio
+async def test_related_memories_by_depth(service):
+    m = await chain(service, 1, 4)
+
+    assert [r.id for r in await service.get_related_memories(m[1].id, 1)] == [m[2].id, m[0].id]
+    assert {r.id for r in await service.get_related_memories(m[0].id, 1, depth=3)} == {m[1].id, m[2].id, m[3].id}
+
+    neighborhood = await service.get_memory_neighborhood(1, [m[0].id], depth=3)
+    assert [(memory.id, steps) for memory, steps in neighborhood] == [(m[1].id, 1), (m[2].id, 2), (m[3].id, 3)]
+
+
+@pytest.mark.asyncio
+async def test_cycles_terminate(service):
+    m = await chain(service, 1, 3)
+    await service.update_memory(m[0].id, 1, related_memories=str(m[2].id))
+
+    neighborhood = await service.get_memory_neighborhood(1, [m[0].id], depth=10)
+
+    assert sorted((memory.id, steps) for memory, steps in neighborhood) == [(m[1].id, 1), (m[2].id, 1)]
+
+
+@pytest.mark.asyncio
+async def test_links_stay_within_user(service):
+    other = await service.create_memory(2, "Чужое", "текст")
+    memory = await service.create_memory(1, "Моё", "текст", related_memories=f"{other.id}, 999")
+
+    assert await service.get_related_memories(memory.id, 1) == []
+    assert await service.get_related_memories(other.id, 1) == []
+
+
+@pytest.mark.asyncio
+async def test_delete_removes_tags_and_links(service, db_manager):
+    m = await chain(service, 1, 3)
+    await service.update_memory(m[1].id, 1, tags="x")
+
+    assert await service.delete_memory(m[1].id, 1) is True
+
+    assert await service.get_related_memories(m[0].id, 1, depth=2) == []
+    async with db_manager.get_session() as session:
+        assert (await session.execute(select(MemoryTag))).all() == []
+
+
+@pytest.mark.asyncio
+async def test_ai_context_includes_related_memories(service):
+    m = await chain(service, 1, 3)
+    unrelated = await service.create_memory(1, "Отдельное", "text", importance=0)
+
+    context = await service.get_memory_context_for_ai(1, query="m2")
+
+    assert "Связанные воспоминания:" in context
+    related_part = context.split("Связанные воспоминания:")[1]
+    assert m[1].title in related_part
+    assert unrelated.title not in context
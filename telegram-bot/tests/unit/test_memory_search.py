@@ -0,0 +1,92 @@
+"""Тесты для полнотекстового поиска Memory Bank."""
+import pytest
+import pytest_asyncio
+import sys
+import os
+
+from sqlalchemy.dialects.postgresql import psycopg
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.db.memory_search import fts5_query
+from src.services.access_log import AccessLogWriter
+from src.services.memory_bank_service import MemoryBankService, build_search_query
+
+
+@pytest_asyncio.fixture
+async def service(db_manager):
+    writer = AccessLogWriter(flush_interval=60)
+    yield MemoryBankService(db_manager, access_log=writer)
+    await writer.close()
+
+
+async def titles(service, user_id, text, **kwargs):
+    return [m.title for m in await service.search_memories(user_id, text, **kwargs)]
+
+
+@pytest.mark.asyncio
+async def test_search_matches_words_in_any_field(service):
+    await service.create_memory(1, "Любимый напиток", "Пью кофе без сахара", tags="еда")
+    await service.create_memory(1, "Работа", "Встречи по вторникам", tags="кофе,офис")
+    await service.create_memory(1, "Отпуск", "Море в августе")
+
+    assert sorted(await titles(service, 1, "кофе")) == ["Любимый напиток", "Работа"]
+    assert await titles(service, 1, "вторн") == ["Работа"]
+    assert await titles(service, 1, "горы") == []
+
+
+@pytest.mark.asyncio
+async def test_search_is_scoped_to_user_and_type(service):
+    await service.create_memory(1, "Кофе", "утром", memory_type="preference")
+    await service.create_memory(1, "Кофе", "вечером", memory_type="personal")
+    await service.create_memory(2, "Кофе", "чужое")
+
+    found = await service.search_memories(1, "кофе", memory_type="preference")
+
+    assert [(m.user_id, m.content) for m in found] == [(1, "утром")]
+
+
+@pytest.mark.asyncio
+async def test_importance_breaks_relevance_ties(service):
+    await service.create_memory(1, "Кофе", "заметка", importance=2)
+    await service.create_memory(1, "Кофе", "важная заметка", importance=9)
+
+    found = await service.search_memories(1, "кофе")
+
+    assert [m.importance for m in found] == [9, 2]
+
+
+@pytest.mark.asyncio
+async def test_index_follows_updates_and_deletes(service):
+    memory = await service.create_memory(1, "Чай", "зелёный")
+    await service.update_memory(memory.id, 1, content="улун")
+
+    assert await titles(service, 1, "зелёный") == []
+    assert await titles(service, 1, "улун") == ["Чай"]
+
+    await service.delete_memory(memory.id, 1)
+    assert await titles(service, 1, "чай") == []
+
+
+@pytest.mark.asyncio
+async def test_query_syntax_is_not_interpreted(service):
+    await service.create_memory(1, "Кофе", "утром")
+
+    assert await titles(service, 1, 'кофе" -(*:') == ["Кофе"]
+    assert await titles(service, 1, "  ?! ") == []
+
+
+def test_fts5_query_quotes_words():
+    assert fts5_query('кофе "утром" NEAR(x)') == '"кофе"* "утром"* "NEAR"* "x"*'
+    assert fts5_query("!!!") == ""
+
+
+def test_postgres_query_uses_search_indexes():
+    query = build_search_query("postgresql", 1, "кофе утром")
+    sql = str(query.compile(dialect=psycopg.dialect()))
+
+    assert "memory.search_vector @@ websearch_to_tsquery('russian'::regconfig" in sql
+    assert "memory.title %% " in sql
+    assert "ts_rank(memory.search_vector" in sql
+    assert "ILIKE" not in sql.upper()
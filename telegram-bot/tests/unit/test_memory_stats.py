@@ -0,0 +1,103 @@
+"""Тесты для материализованной статистики Memory Bank."""
+import pytest
+import pytest_asyncio
+import sys
+import os
+
+from sqlalchemy import update
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.db.models import MemoryStats
+from src.services.access_log import AccessLogWriter
+from src.services.memory_bank_service import MemoryBankService
+from src.services.memory_stats import compute_memory_stats, stats_to_dict
+
+
+@pytest_asyncio.fixture
+async def service(db_manager):
+    writer = AccessLogWriter(flush_interval=60)
+    yield MemoryBankService(db_manager, access_log=writer)
+    await writer.close()
+
+
+async def recomputed(db_manager, user_id):
+    async with db_manager.get_session() as session:
+        return stats_to_dict((await compute_memory_stats(session, [user_id]))[user_id])
+
+
+def titles(stats):
+    return [item["title"] for item in stats["recent_memories"]]
+
+
+@pytest.mark.asyncio
+async def test_stats_are_one_primary_key_lookup(service, statements):
+    await service.create_memory(1, "a", "x", memory_type="personal")
+    await service.create_memory(1, "b", "x", memory_type="preference")
+    statements.clear()
+
+    stats = await service.get_memory_stats(1)
+
+    assert len(statements) == 1
+    assert "FROM memory_stats" in statements[0]
+    assert stats["total_memories"] == 2
+    assert stats["memories_by_type"] == {"personal": 1, "preference": 1}
+    assert titles(stats) == ["b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_changes(service, db_manager):
+    memories = [await service.create_memory(1, f"m{i}", "x") for i in range(7)]
+    assert titles(await service.get_memory_stats(1)) == ["m6", "m5", "m4", "m3", "m2"]
+
+    await service.update_memory(memories[0].id, 1, memory_type="context")
+    await service.delete_memory(memories[6].id, 1)
+    await service.delete_memory(memories[5].id, 1)
+
+    stats = await service.get_memory_stats(1)
+    assert stats["total_memories"] == 5
+    assert stats["memories_by_type"] == {"personal": 4, "context": 1}
+    assert titles(stats) == ["m0", "m4", "m3", "m2", "m1"]
+    assert stats["memories_by_type"] == (await recomputed(db_manager, 1))["memories_by_type"]
+    assert titles(stats) == titles(await recomputed(db_manager, 1))
+
+
+@pytest.mark.asyncio
+async def test_last_memory_deleted(service):
+    memory = await service.create_memory(1, "a", "x")
+    await service.delete_memory(memory.id, 1)
+
+    assert await service.get_memory_stats(1) == {
+        "total_memories": 0,
+        "memories_by_type": {},
+        "recent_memories": [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_missing_row_is_computed(service, db_manager):
+    await service.create_memory(1, "a", "x")
+    await service.create_memory(2, "b", "x")
+    async with db_manager.get_session() as session:
+        await session.execute(MemoryStats.__table__.delete())
+
+    assert (await service.get_memory_stats(1))["total_memories"] == 1
+    await service.create_memory(2, "c", "x")
+    assert (await service.get_memory_stats(2))["total_memories"] == 2
+
+
+@pytest.mark.asyncio
+async def test_rebuild_repairs_drift(service, db_manager):
+    await service.create_memory(1, "a", "x")
+    await service.create_memory(2, "b", "x")
+    async with db_manager.get_session() as session:
+        await session.execute(update(MemoryStats).values(total=100, by_type="{}", recent="[]"))
+
+    assert await service.rebuild_stats(user_id=1) == 1
+    assert (await service.get_memory_stats(1))["total_memories"] == 1
+    assert (await service.get_memory_stats(2))["total_memories"] == 100
+
+    assert await service.rebuild_stats() == 2
+    assert (await service.get_memory_stats(2))["total_memories"] == 1
+    assert titles(await service.get_memory_stats(2)) == ["b"]
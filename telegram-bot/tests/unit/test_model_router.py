@@ -0,0 +1,109 @@
+"""Тесты для маршрутизатора моделей OpenAI."""
+import pytest
+import sys
+import os
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from services.model_router import ModelRouter, estimate_answer_size
+from services.openai_resilience import LatencyTracker, ResilientCaller
+
+
+def make_router(**kwargs):
+    """Маршрутизатор с отдельной статистикой задержек и без проб."""
+    kwargs.setdefault("probe_share", 0.0)
+    return ModelRouter(ResilientCaller(), **kwargs)
+
+
+class TestModelRouter:
+    """Тесты выбора модели и лимита токенов."""
+
+    def test_route_by_intent(self):
+        """Тяжёлые запросы идут на флагман, уточнения — на быструю модель."""
+        router = make_router()
+
+        analysis = router.route("анализ")
+        details = router.route("детализация")
+
+        assert analysis.model == "gpt-4o"
+        assert details.model == "gpt-4o-mini"
+        assert analysis.max_tokens > details.max_tokens
+
+    def test_answer_size_scales_max_tokens(self):
+        """Ожидаемый объём ответа меняет лимит токенов."""
+        router = make_router()
+
+        short = router.route("прогноз", estimate_answer_size("Кратко: что ждёт меня в этом году?"))
+        long = router.route("прогноз", estimate_answer_size("Дай подробный прогноз на год"))
+
+        assert short.max_tokens < router.route("прогноз").max_tokens < long.max_tokens
+
+    def test_slow_model_degrades_to_faster_tier(self):
+        """Если p95 флагмана выше SLO, запрос уходит на быструю модель."""
+        router = make_router()
+        tracker = router.caller.tracker("gpt-4o")
+        for _ in range(tracker.min_samples):
+            tracker.record(60.0, ok=True)
+
+        route = router.route("анализ")
+
+        assert route.model == "gpt-4o-mini"
+        assert route.degraded
+        assert router.stats()[0]["healthy"] is False
+
+    def test_last_tier_is_used_even_if_unhealthy(self):
+        """Самый быстрый уровень используется всегда как последний вариант."""
+        router = make_router()
+        for model in ("gpt-4o", "gpt-4o-mini"):
+            tracker = router.caller.tracker(model)
+            for _ in range(tracker.min_samples):
+                tracker.record(None, ok=False)
+
+        assert router.route("анализ").model == "gpt-4o-mini"
+
+    def test_few_errors_do_not_degrade(self):
+        """Пока вызовов меньше min_samples, доля ошибок не уводит трафик."""
+        router = make_router()
+        tracker = router.caller.tracker("gpt-4o")
+        tracker.record(None, ok=False)
+
+        assert router.route("анализ").model == "gpt-4o"
+
+        for _ in range(tracker.min_samples):
+            tracker.record(None, ok=False)
+        assert router.route("анализ").model == "gpt-4o-mini"
+
+    def test_old_samples_expire(self):
+        """Давние ошибки перестают учитываться, и модель возвращается в работу."""
+        now = [0.0]
+        router = make_router()
+        tracker = LatencyTracker(min_samples=2, max_age=60, clock=lambda: now[0])
+        router.caller._trackers["gpt-4o"] = tracker
+        for _ in range(3):
+            tracker.record(None, ok=False)
+        assert router.route("анализ").model == "gpt-4o-mini"
+
+        now[0] = 61.0
+        assert tracker.outcomes == 0
+        assert router.route("анализ").model == "gpt-4o"
+
+    def test_probe_share_reaches_degraded_tier(self):
+        """Доля проб всё равно идёт на деградировавшую модель."""
+        draws = iter([0.01, 0.5])
+        router = make_router(probe_share=0.05, rng=lambda: next(draws))
+        tracker = router.caller.tracker("gpt-4o")
+        for _ in range(tracker.min_samples):
+            tracker.record(60.0, ok=True)
+
+        assert router.route("анализ").model == "gpt-4o"
+        assert router.route("анализ").model == "gpt-4o-mini"
+
+    @pytest.mark.parametrize("text,size", [
+        ("Расскажи коротко", "short"),
+        ("Хочу полный разбор", "long"),
+        ("Что значит число 7?", "normal"),
+    ])
+    def test_estimate_answer_size(self, text, size):
+        """Оценка объёма ответа по маркерам в тексте."""
+        assert estimate_answer_size(text) == size
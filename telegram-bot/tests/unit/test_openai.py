@@ -16,10 +16,10 @@ class TestOpenAIContextService:
     def setup_method(self):
         """Настройка перед каждым тестом."""
         self.mock_api_key = "test-api-key"
-        self.mock_db_session = Mock()
+        self.mock_session_provider = Mock()
         self.service = OpenAIContextService(
             api_key=self.mock_api_key,
-            db_session=self.mock_db_session
+            session_provider=self.mock_session_provider
         )
     
     def test_initialization(self):
@@ -141,5 +141,119 @@ class TestOpenAIFunctions:
         assert hasattr(functions, 'save_analytics')
 
 
+class TestParallelToolCalls:
+    """Тесты параллельного выполнения вызовов инструментов."""
+
+    @staticmethod
+    def make_tool_call(call_id, name, arguments):
+        tool_call = Mock()
+        tool_call.id = call_id
+        tool_call.function.name = name
+        tool_call.function.arguments = arguments
+        return tool_call
+
+    def test_tools_schema_is_constant(self):
+        """Схема инструментов не пересобирается на каждый запрос."""
+        from services.openai_functions import OpenAIFunctions
+
+        functions = OpenAIFunctions(Mock())
+
+        assert functions.get_tools_schema() is functions.get_tools_schema()
+        assert all(tool["type"] == "function" for tool in functions.get_tools_schema())
+
+    @pytest.mark.asyncio
+    async def test_all_results_returned_in_order(self):
+        """Каждый вызов получает свой результат, ошибка одного не мешает остальным."""
+        import json
+        from services.openai_functions import OpenAIFunctions
+
+        functions = OpenAIFunctions(Mock())
+        tool_calls = [
+            self.make_tool_call("call_1", "calculate_analytics", '{"birth_date": "20.05.1997", "name": "Maria"}'),
+            self.make_tool_call("call_2", "calculate_analytics", '{"birth_date": "01.01.1990", "name": "Ivan"}'),
+            self.make_tool_call("call_3", "unknown", "{}"),
+            self.make_tool_call("call_4", "calculate_analytics", "{broken"),
+        ]
+
+        messages = await functions.execute_tool_calls(tool_calls)
+        results = [json.loads(message["content"]) for message in messages]
+
+        assert [message["tool_call_id"] for message in messages] == ["call_1", "call_2", "call_3", "call_4"]
+        assert all(message["role"] == "tool" for message in messages)
+        assert results[0]["success"] and results[0]["name"] == "Maria"
+        assert results[1]["success"] and results[1]["name"] == "Ivan"
+        assert "error" in results[2]
+        assert "error" in results[3]
+
+
+
+class TestSessionProvider:
+    """Функции берут сессию БД только на время запроса."""
+
+    @staticmethod
+    def make_provider():
+        import asyncio
+        from contextlib import asynccontextmanager
+
+        state = {"open": 0, "max_open": 0, "opened": 0}
+
+        @asynccontextmanager
+        async def provider():
+            state["open"] += 1
+            state["opened"] += 1
+            state["max_open"] = max(state["max_open"], state["open"])
+            session = Mock()
+            result = Mock()
+            result.scalar_one_or_none.return_value = None
+            session.execute = AsyncMock(return_value=result)
+            session.flush = AsyncMock()
+            try:
+                # Даём конкурентным вызовам пересечься
+                await asyncio.sleep(0.01)
+                yield session
+            finally:
+                state["open"] -= 1
+
+        return provider, state
+
+    @pytest.mark.asyncio
+    async def test_save_uses_short_sessions(self):
+        """Сохранение открывает и закрывает сессии сам, ничего не оставляя открытым."""
+        from services.openai_functions import OpenAIFunctions
+
+        provider, state = self.make_provider()
+        functions = OpenAIFunctions(provider)
+
+        with patch("services.openai_functions.UserService.ensure_user", AsyncMock(return_value=1)):
+            result = await functions.execute_function("save_analytics", {
+                "user_id": 123,
+                "birth_date": "20.05.1997",
+                "name": "Ivan",
+                "analysis_result": {"calculations": {}},
+            })
+
+        assert result["success"]
+        assert state["opened"] == 2
+        assert state["open"] == 0
+
+    @pytest.mark.asyncio
+    async def test_db_functions_run_concurrently(self):
+        """Без общей сессии вызовы с БД не сериализуются."""
+        import asyncio
+        from services.openai_functions import OpenAIFunctions
+
+        provider, state = self.make_provider()
+        functions = OpenAIFunctions(provider)
+
+        results = await asyncio.gather(
+            functions.execute_function("get_user_analytics", {"user_id": 1}),
+            functions.execute_function("get_user_analytics", {"user_id": 2}),
+        )
+
+        assert all(result == {"error": "Пользователь не найден"} for result in results)
+        assert state["max_open"] == 2
+        assert state["open"] == 0
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
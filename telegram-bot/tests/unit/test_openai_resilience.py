@@ -0,0 +1,146 @@
+"""Тесты для устойчивых вызовов OpenAI (дедлайн, хеджирование, circuit breaker)."""
+import asyncio
+import pytest
+import sys
+import os
+from unittest.mock import AsyncMock, Mock
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from services.openai_resilience import CircuitBreaker, CircuitOpenError, ResilientCaller, is_transient_error
+from services.openai_context_service import OpenAIContextService
+
+
+class ApiError(Exception):
+    """Ошибка API с HTTP-статусом, как у исключений SDK."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class TestCircuitBreaker:
+    """Тесты circuit breaker."""
+
+    def test_opens_after_threshold_and_half_opens(self):
+        """Breaker размыкается после серии ошибок и пропускает один пробный вызов."""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        now[0] = 10.0
+        assert breaker.allow()
+        assert not breaker.allow()  # пробный вызов уже выполняется
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+
+class TestResilientCaller:
+    """Тесты вызовов с дедлайном и хеджированием."""
+
+    @pytest.mark.asyncio
+    async def test_hedged_request_wins(self):
+        """Медленный первый запрос обгоняется хеджирующим."""
+        delays = [5.0, 0.01]
+
+        async def call():
+            await asyncio.sleep(delays.pop(0))
+            return "ok"
+
+        caller = ResilientCaller(deadline=2.0, default_hedge_delay=0.05)
+        caller.hedge_delay = lambda key, deadline: 0.05
+
+        assert await caller.call(call, key="m") == "ok"
+        assert caller.tracker("m").error_rate == 0.0
+
+    @pytest.mark.asyncio
+    async def test_deadline_exceeded(self):
+        """Если никто не уложился в дедлайн, выбрасывается TimeoutError."""
+        async def call():
+            await asyncio.sleep(5)
+
+        caller = ResilientCaller(deadline=0.05)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await caller.call(call, key="m")
+        assert caller.tracker("m").error_rate == 1.0
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_rejects_immediately(self):
+        """Разомкнутый breaker отклоняет вызов без обращения к API."""
+        caller = ResilientCaller(breaker_factory=lambda: CircuitBreaker(failure_threshold=1))
+        caller.breaker("m").record_failure()
+        factory = AsyncMock()
+
+        with pytest.raises(CircuitOpenError):
+            await caller.call(factory, key="m")
+        factory.assert_not_called()
+
+        # Отказ одной модели не отключает остальные
+        other = AsyncMock(return_value="ok")
+        assert await caller.call(other, key="other") == "ok"
+
+    @pytest.mark.asyncio
+    async def test_only_transient_errors_open_breaker(self):
+        """4xx — ошибка запроса, а не отказ API: breaker остаётся замкнутым."""
+        caller = ResilientCaller(breaker_factory=lambda: CircuitBreaker(failure_threshold=1))
+
+        for status in (400, 404):
+            with pytest.raises(ApiError):
+                await caller.call(AsyncMock(side_effect=ApiError(status)), key="m")
+        assert caller.breaker("m").state == "closed"
+        assert caller.tracker("m").error_rate == 0.0
+
+        for status in (429, 503):
+            assert is_transient_error(ApiError(status))
+        with pytest.raises(ApiError):
+            await caller.call(AsyncMock(side_effect=ApiError(502)), key="m")
+        assert caller.breaker("m").state == "open"
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_releases_half_open(self):
+        """Отменённый пробный вызов не оставляет breaker в half_open навсегда."""
+        now = [0.0]
+        caller = ResilientCaller(
+            breaker_factory=lambda: CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        )
+        caller.breaker("m").record_failure()
+        now[0] = 10.0
+
+        task = asyncio.create_task(caller.call(lambda: asyncio.sleep(5), key="m"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert await caller.call(AsyncMock(return_value="ok"), key="m") == "ok"
+        assert caller.breaker("m").state == "closed"
+
+
+class TestLocalFallback:
+    """Тесты локального ответа при недоступности OpenAI."""
+
+    @pytest.mark.asyncio
+    async def test_fallback_uses_local_responder(self):
+        """При ошибке API пользователь получает шаблонный ответ по своим данным."""
+        service = OpenAIContextService(api_key="test-api-key", session_provider=Mock())
+        mock_client = Mock()
+        mock_client.chat.completions.create = AsyncMock(side_effect=Exception("API Error"))
+        service.client = mock_client
+        service.resilience = ResilientCaller()
+        service.functions.execute_function = AsyncMock(return_value={"success": True})
+
+        result = await service.process_message(
+            user_message="Пользователь: Дай прогноз на год\n\nДанные пользователя:\nИмя: Ivan\nДата рождения: 20.05.1997",
+            user_id=123,
+            context=[]
+        )
+
+        assert "ПРОГНОЗ" in result
+        assert "Ivan" in result
@@ -0,0 +1,93 @@
+"""Тесты для лимитера исходящих сообщений."""
+import asyncio
+import time
+import pytest
+import sys
+import os
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, GetMe, SendMessage
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.services.outbound import RETRY_AFTER, OutboundRateLimiter
+
+
+class FakeApi:
+    """Запоминает отправленные запросы вместо обращения к Telegram."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.failures = []
+
+    async def __call__(self, bot, method):
+        if self.failures:
+            raise self.failures.pop(0)
+        await asyncio.sleep(self.delay)
+        self.sent.append((time.monotonic(), method))
+        return len(self.sent)
+
+
+class TestOutboundRateLimiter:
+    """Тесты лимитера."""
+
+    @pytest.mark.asyncio
+    async def test_chat_rate_limited_but_chats_independent(self):
+        """Сообщения в один чат идут с темпом лимита, другие чаты не ждут."""
+        limiter = OutboundRateLimiter(global_rate=1000, chat_rate=20, chat_burst=1)
+        api = FakeApi()
+        started = time.monotonic()
+
+        await asyncio.gather(
+            *(limiter(api, None, SendMessage(chat_id=1, text=str(i))) for i in range(3)),
+            limiter(api, None, SendMessage(chat_id=2, text="other")),
+        )
+
+        chat_one = [sent for sent in api.sent if sent[1].chat_id == 1]
+        assert [method.text for _, method in chat_one] == ["0", "1", "2"]
+        # Два ожидания токена по 1/20 с
+        assert chat_one[-1][0] - started >= 0.09
+        other = next(at for at, method in api.sent if method.chat_id == 2)
+        assert other - started < 0.05
+
+    @pytest.mark.asyncio
+    async def test_retry_after_retried(self):
+        """На 429 запрос повторяется после паузы, а не теряется."""
+        limiter = OutboundRateLimiter()
+        api = FakeApi()
+        method = SendMessage(chat_id=1, text="hi")
+        api.failures.append(TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0))
+        before = RETRY_AFTER.value()
+
+        assert await limiter(api, None, method) == 1
+        assert RETRY_AFTER.value() == before + 1
+
+    @pytest.mark.asyncio
+    async def test_waiting_edits_coalesced(self):
+        """Из ожидающих правок одного сообщения отправляется только последняя."""
+        limiter = OutboundRateLimiter(global_rate=1000, chat_rate=1000)
+        api = FakeApi(delay=0.02)
+
+        first = asyncio.create_task(limiter(api, None, SendMessage(chat_id=1, text="answer")))
+        await asyncio.sleep(0)
+        edits = [
+            asyncio.create_task(limiter(api, None, EditMessageText(chat_id=1, message_id=10, text=f"status {i}")))
+            for i in range(3)
+        ]
+        await first
+        results = await asyncio.gather(*edits)
+
+        texts = [method.text for _, method in api.sent]
+        assert texts == ["answer", "status 2"]
+        assert results == [2, 2, 2]
+
+    @pytest.mark.asyncio
+    async def test_other_methods_not_limited(self):
+        """Служебные запросы проходят без лимита."""
+        limiter = OutboundRateLimiter(global_rate=0.001)
+        limiter._global.tokens = 0
+        api = FakeApi()
+
+        assert await asyncio.wait_for(limiter(api, None, GetMe()), timeout=1) == 1
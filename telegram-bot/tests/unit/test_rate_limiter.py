@@ -0,0 +1,113 @@
+"""Тесты для лимитера запросов (token bucket)."""
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from services.rate_limiter import TokenBucket, InMemoryRateLimitBackend, create_rate_limit_backend
+from middlewares.rate_limit import RateLimitMiddleware
+
+
+class FakeClock:
+    """Управляемые часы для тестов."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    """Тесты ведра токенов."""
+
+    def test_consume_until_empty(self):
+        """Ведро отдаёт не больше capacity токенов подряд."""
+        bucket = TokenBucket(capacity=3, refill_rate=1, tokens=3, updated_at=0)
+
+        assert [bucket.try_consume(0) for _ in range(4)] == [True, True, True, False]
+
+    def test_refill_is_capped(self):
+        """Пополнение не превышает ёмкость ведра."""
+        bucket = TokenBucket(capacity=2, refill_rate=1, tokens=0, updated_at=0)
+        bucket.refill(100)
+
+        assert bucket.tokens == 2
+
+    def test_wait_time(self):
+        """Время ожидания рассчитывается по скорости пополнения."""
+        bucket = TokenBucket(capacity=1, refill_rate=2, tokens=0, updated_at=0)
+
+        assert bucket.wait_time(0) == pytest.approx(0.5)
+        assert bucket.wait_time(0.5) == 0.0
+
+
+class TestInMemoryBackend:
+    """Тесты локального бэкенда лимитера."""
+
+    @pytest.mark.asyncio
+    async def test_per_user_limit(self):
+        """Лимит считается отдельно для каждого пользователя."""
+        clock = FakeClock()
+        backend = InMemoryRateLimitBackend(capacity=2, refill_rate=1, clock=clock)
+
+        assert await backend.consume("1")
+        assert await backend.consume("1")
+        assert not await backend.consume("1")
+        assert await backend.consume("2")
+
+        clock.now = 1.0
+        assert await backend.consume("1")
+
+    @pytest.mark.asyncio
+    async def test_idle_buckets_evicted(self):
+        """Простаивающие вёдра вытесняются при следующих обращениях."""
+        clock = FakeClock()
+        backend = InMemoryRateLimitBackend(capacity=2, refill_rate=1, clock=clock)
+
+        await backend.consume("1")
+        await backend.consume("2")
+        assert len(backend) == 2
+
+        clock.now = 10.0
+        await backend.consume("3")
+        assert len(backend) == 1
+
+    @pytest.mark.asyncio
+    async def test_zero_refill_rate(self):
+        """Без пополнения ведро не вытесняется (иначе оно вернулось бы полным)."""
+        clock = FakeClock()
+        backend = InMemoryRateLimitBackend(capacity=1, refill_rate=0, clock=clock)
+
+        assert await backend.consume("1")
+        clock.now = 1e9
+        assert not await backend.consume("1")
+
+    def test_zero_limit_rejected(self):
+        settings = SimpleNamespace(rate_limit_per_minute=0, rate_limit_backend="memory")
+        with pytest.raises(ValueError):
+            create_rate_limit_backend(settings)
+
+
+class TestRateLimitMiddleware:
+    """Тесты middleware лимитера."""
+
+    @pytest.mark.asyncio
+    async def test_throttled_user_notified_once(self):
+        """Отклонённый пользователь получает одно уведомление, хендлер не вызывается."""
+        backend = InMemoryRateLimitBackend(capacity=1, refill_rate=0.001, clock=FakeClock())
+        middleware = RateLimitMiddleware(backend)
+        middleware._send_notice = AsyncMock()
+        handler = AsyncMock(return_value="ok")
+        data = {"event_from_user": SimpleNamespace(id=42)}
+
+        assert await middleware(handler, object(), data) == "ok"
+        assert await middleware(handler, object(), data) is None
+        assert await middleware(handler, object(), data) is None
+
+        assert handler.await_count == 1
+        assert middleware._send_notice.await_count == 1
@@ -0,0 +1,230 @@
+"""Тесты для очереди генерации отчётов (на SQLite вместо PostgreSQL)."""
+import asyncio
+import pytest
+import pytest_asyncio
+import sys
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.db.models import ReportRequest, ReportStatus, User
+from src.services.analytics_storage import analysis_content_hash
+from src.services.report_queue import GeneratedReport, ReportQueue, ReportWorker
+
+ANALYSIS = {"input_data": {"latin_name": "Ivan"}, "calculations": {"consciousness_number": 6}}
+
+
+class FakeClock:
+    """Управляемые часы для тестов."""
+
+    def __init__(self):
+        self.now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+@pytest_asyncio.fixture
+async def db_manager(db_manager):
+    async with db_manager.get_session() as session:
+        session.add(User(id=1, telegram_user_id="42"))
+    return db_manager
+
+
+async def enqueue(queue, db_manager, name="Иван"):
+    async with db_manager.get_session() as session:
+        request = await queue.enqueue(session, user_id=1, chat_id=42, full_name=name, birth_date=date(1990, 3, 15))
+        return request.id
+
+
+async def load(db_manager, request_id):
+    async with db_manager.get_session() as session:
+        return (await session.execute(select(ReportRequest).where(ReportRequest.id == request_id))).scalar_one()
+
+
+async def load_all(db_manager):
+    async with db_manager.get_session() as session:
+        return list((await session.execute(select(ReportRequest).order_by(ReportRequest.id))).scalars())
+
+
+class TestReportQueue:
+    """Тесты очереди заявок."""
+
+    @pytest.mark.asyncio
+    async def test_claim_takes_each_job_once(self, db_manager):
+        """Заявка забирается одним воркером и переходит в PROCESSING."""
+        clock = FakeClock()
+        queue = ReportQueue(db_manager, clock=clock)
+        first_id = await enqueue(queue, db_manager)
+        await enqueue(queue, db_manager)
+
+        jobs = await queue.claim(limit=1)
+        assert [job.id for job in jobs] == [first_id]
+        assert jobs[0].attempts == 1 and jobs[0].chat_id == 42
+        assert jobs[0].birth_date == date(1990, 3, 15)
+
+        assert len(await queue.claim(limit=5)) == 1
+        assert await queue.claim(limit=5) == []
+        assert (await load(db_manager, first_id)).status == ReportStatus.PROCESSING
+
+    @pytest.mark.asyncio
+    async def test_complete_stores_result(self, db_manager):
+        """Результат сохраняется структурой с content_hash, заявка уходит из очереди."""
+        queue = ReportQueue(db_manager, clock=FakeClock())
+        request_id = await enqueue(queue, db_manager)
+        job, = await queue.claim()
+        await queue.complete(job, ANALYSIS)
+
+        stored, = await load_all(db_manager)
+        assert stored.id != request_id
+        assert stored.status == ReportStatus.DONE
+        assert stored.result_json == ANALYSIS
+        assert stored.content_hash == analysis_content_hash(date(1990, 3, 15), "Ivan")
+        assert stored.full_name == "Иван"
+
+    @pytest.mark.asyncio
+    async def test_repeated_report_updates_stored_analysis(self, db_manager):
+        """Повторная заявка на тот же анализ обновляет сохранённую строку, а не дублирует её."""
+        queue = ReportQueue(db_manager, clock=FakeClock())
+        for _ in range(2):
+            await enqueue(queue, db_manager)
+            job, = await queue.claim()
+            await queue.complete(job, ANALYSIS)
+
+        assert len(await load_all(db_manager)) == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_job_retried_with_backoff(self, db_manager):
+        """После ошибки заявка доступна снова только после задержки, затем — ERROR."""
+        clock = FakeClock()
+        queue = ReportQueue(db_manager, max_attempts=2, backoff_base=10, clock=clock)
+        request_id = await enqueue(queue, db_manager)
+
+        job, = await queue.claim()
+        assert await queue.fail(job, "timeout") is True
+        assert await queue.claim() == []
+
+        clock.advance(11)
+        job, = await queue.claim()
+        assert job.attempts == 2
+        assert await queue.fail(job, "timeout") is False
+
+        stored = await load(db_manager, request_id)
+        assert stored.status == ReportStatus.ERROR
+        assert stored.error == "timeout"
+
+    @pytest.mark.asyncio
+    async def test_visibility_timeout_releases_job(self, db_manager):
+        """Заявка упавшего воркера снова забирается после таймаута видимости."""
+        clock = FakeClock()
+        queue = ReportQueue(db_manager, visibility_timeout=60, clock=clock)
+        await enqueue(queue, db_manager)
+
+        stale, = await queue.claim()
+        clock.advance(61)
+        job, = await queue.claim()
+        assert job.id == stale.id and job.attempts == 2
+
+        # Завершение устаревшей попытки не затирает новую
+        await queue.complete(stale, ANALYSIS)
+        assert (await load(db_manager, job.id)).status == ReportStatus.PROCESSING
+
+    @pytest.mark.asyncio
+    async def test_expired_job_with_exhausted_attempts_goes_to_error(self, db_manager):
+        """Заявка, исчерпавшая попытки на таймаутах видимости, не забирается снова."""
+        clock = FakeClock()
+        queue = ReportQueue(db_manager, visibility_timeout=60, max_attempts=2, clock=clock)
+        request_id = await enqueue(queue, db_manager)
+
+        await queue.claim()
+        clock.advance(61)
+        job, = await queue.claim()
+        assert job.attempts == 2
+
+        clock.advance(61)
+        assert await queue.claim() == []
+        stored = await load(db_manager, request_id)
+        assert stored.status == ReportStatus.ERROR
+        assert stored.locked_until is None
+
+
+class TestReportWorker:
+    """Тесты воркера."""
+
+    @pytest.mark.asyncio
+    async def test_worker_generates_and_delivers(self, db_manager):
+        """Воркер генерирует отчёт, доставляет его и отмечает заявку выполненной."""
+        queue = ReportQueue(db_manager)
+        request_id = await enqueue(queue, db_manager, name="")
+        delivered = []
+
+        async def generate(job):
+            return GeneratedReport(ANALYSIS, f"отчёт для {job.full_name or 'даты'}")
+
+        async def deliver(job, text):
+            delivered.append((job.chat_id, text))
+
+        worker = ReportWorker(queue, generate, deliver, concurrency=2, poll_interval=0.01)
+        task = asyncio.create_task(worker.run())
+        for _ in range(100):
+            if delivered:
+                break
+            await asyncio.sleep(0.01)
+        worker.stop()
+        await task
+
+        assert delivered == [(42, "отчёт для даты")]
+        stored, = await load_all(db_manager)
+        assert stored.id != request_id
+        assert stored.status == ReportStatus.DONE and stored.result_json == ANALYSIS
+
+    @pytest.mark.asyncio
+    async def test_delivery_error_requeues_job(self, db_manager):
+        """Ошибка доставки возвращает заявку в очередь."""
+        queue = ReportQueue(db_manager)
+        request_id = await enqueue(queue, db_manager)
+
+        async def generate(job):
+            return GeneratedReport(ANALYSIS, "отчёт")
+
+        async def deliver(job, text):
+            raise RuntimeError("Telegram недоступен")
+
+        worker = ReportWorker(queue, generate, deliver)
+        assert await worker.run_once() == 1
+        await asyncio.gather(*worker._running)
+
+        stored = await load(db_manager, request_id)
+        assert stored.status == ReportStatus.PENDING
+        assert stored.attempts == 1
+
+    @pytest.mark.asyncio
+    async def test_idle_poll_interval_backs_off(self, db_manager):
+        """Пока очередь пуста, интервал опроса удваивается до максимума."""
+        queue = ReportQueue(db_manager)
+
+        async def generate(job):
+            return GeneratedReport(ANALYSIS, "отчёт")
+
+        async def deliver(job, text):
+            pass
+
+        worker = ReportWorker(queue, generate, deliver, poll_interval=1, max_poll_interval=4)
+        sleeps = []
+
+        async def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 5:
+                worker.stop()
+
+        worker._sleep = sleep
+        await worker.run()
+
+        assert sleeps == [1, 2, 4, 4, 4]
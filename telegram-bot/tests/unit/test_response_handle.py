@@ -0,0 +1,156 @@
+"""Тесты для ответа с правкой сообщения-заглушки."""
+import asyncio
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageText
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.services.response_handle import ResponseHandle
+
+
+class FakeBot:
+    """Запоминает вызовы Bot API вместо обращения к Telegram."""
+
+    def __init__(self):
+        self.calls = []
+        self.edit_error = None
+        self._next_id = 100
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self._next_id += 1
+        self.calls.append(("send", text, kwargs))
+        return SimpleNamespace(message_id=self._next_id)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        if self.edit_error is not None:
+            raise self.edit_error
+        self.calls.append(("edit", text, kwargs))
+
+    async def delete_message(self, chat_id, message_id):
+        self.calls.append(("delete", message_id, {}))
+
+    async def send_chat_action(self, chat_id, action):
+        self.calls.append(("action", action, {}))
+
+    def kinds(self):
+        return [kind for kind, _, _ in self.calls if kind != "action"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_answer_is_edited_into_placeholder():
+    """Статус и ответ — одно сообщение: отправка заглушки и одна правка."""
+    bot = FakeBot()
+
+    async with ResponseHandle(bot, 1, action=None) as response:
+        await response.status("Думаю...")
+        await response.finish("**Готово**")
+
+    assert bot.kinds() == ["send", "edit"]
+    _, text, kwargs = bot.calls[-1]
+    assert text == "Готово"
+    assert kwargs["parse_mode"] is None
+    assert kwargs["entities"][0].type == "bold"
+
+
+@pytest.mark.asyncio
+async def test_status_edits_are_throttled():
+    """Частые статусы схлопываются: показывается последний после интервала."""
+    bot = FakeBot()
+    clock = FakeClock()
+
+    async with ResponseHandle(bot, 1, action=None, min_edit_interval=0.05, clock=clock) as response:
+        await response.status("шаг 1")
+        await response.status("шаг 2")
+        await response.status("шаг 3")
+        assert bot.kinds() == ["send"]
+
+        clock.now = 1.0
+        await asyncio.sleep(0.1)
+        assert [text for kind, text, _ in bot.calls if kind == "edit"] == ["⏳ шаг 3"]
+
+        await response.finish("ответ")
+
+    assert bot.kinds() == ["send", "edit", "edit"]
+
+
+@pytest.mark.asyncio
+async def test_long_answer_overflows_into_new_messages():
+    bot = FakeBot()
+    markup = object()
+
+    async with ResponseHandle(bot, 1, action=None, limit=50) as response:
+        await response.status("Думаю...")
+        await response.finish("слово " * 30, reply_markup=markup)
+
+    assert bot.kinds()[:2] == ["send", "edit"]
+    assert len(bot.kinds()) > 3
+    assert "reply_markup" not in bot.calls[1][2]
+    assert bot.calls[-1][2]["reply_markup"] is markup
+
+
+@pytest.mark.asyncio
+async def test_lost_placeholder_falls_back_to_send():
+    bot = FakeBot()
+    bot.edit_error = TelegramBadRequest(
+        EditMessageText(text="x", chat_id=1, message_id=1), "Bad Request: message to edit not found"
+    )
+
+    async with ResponseHandle(bot, 1, action=None) as response:
+        await response.status("Думаю...")
+        await response.finish("ответ")
+
+    # Заглушка, которую не удалось изменить, удаляется до отправки ответа
+    assert bot.kinds() == ["send", "delete", "send"]
+    assert bot.calls[-1][1] == "ответ"
+
+
+@pytest.mark.asyncio
+async def test_second_finish_does_not_overwrite_answer():
+    """Ошибка после ответа уходит новым сообщением, ответ в заглушке остаётся."""
+    bot = FakeBot()
+
+    async with ResponseHandle(bot, 1, action=None) as response:
+        await response.status("Думаю...")
+        await response.finish("ответ")
+        await response.finish("ошибка", markdown=False)
+
+    assert bot.kinds() == ["send", "edit", "send"]
+    assert [text for _, text, _ in bot.calls] == ["⏳ Думаю...", "ответ", "ошибка"]
+
+
+@pytest.mark.asyncio
+async def test_unfinished_placeholder_is_deleted():
+    bot = FakeBot()
+
+    async with ResponseHandle(bot, 1, action=None) as response:
+        await response.status("Думаю...")
+
+    assert bot.kinds() == ["send", "delete"]
+
+
+@pytest.mark.asyncio
+async def test_chat_action_renewed_until_finish():
+    bot = FakeBot()
+
+    async with ResponseHandle(bot, 1, action_interval=0.01) as response:
+        await asyncio.sleep(0.05)
+        await response.finish("ответ")
+        actions = len([call for call in bot.calls if call[0] == "action"])
+        await asyncio.sleep(0.03)
+
+    assert actions >= 2
+    assert len([call for call in bot.calls if call[0] == "action"]) == actions
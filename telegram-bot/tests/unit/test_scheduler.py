@@ -0,0 +1,147 @@
+"""Тесты для планировщика апдейтов по чатам."""
+import asyncio
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.middlewares.scheduler import QUEUE_LAG, UpdateSchedulerMiddleware
+from src.services.metrics import render_metrics
+
+
+def chat_data(chat_id):
+    return {"event_chat": SimpleNamespace(id=chat_id)}
+
+
+class TestUpdateScheduler:
+    """Тесты планировщика."""
+
+    @pytest.mark.asyncio
+    async def test_same_chat_processed_in_order(self):
+        """Апдейты одного чата обрабатываются строго по очереди."""
+        scheduler = UpdateSchedulerMiddleware(workers=4)
+        log = []
+
+        async def handler(event, data):
+            log.append(("start", event))
+            # Первый апдейт дольше второго: без очереди ответы поменялись бы местами
+            await asyncio.sleep(0.02 if event == 1 else 0)
+            log.append(("end", event))
+            return event
+
+        results = await asyncio.gather(*(scheduler(handler, i, chat_data(1)) for i in (1, 2, 3)))
+        await scheduler.close()
+
+        assert results == [1, 2, 3]
+        assert log == [("start", 1), ("end", 1), ("start", 2), ("end", 2), ("start", 3), ("end", 3)]
+
+    @pytest.mark.asyncio
+    async def test_different_chats_run_concurrently(self):
+        """Разные чаты не ждут друг друга."""
+        scheduler = UpdateSchedulerMiddleware(workers=4)
+        running = 0
+        peak = 0
+
+        async def handler(event, data):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(scheduler(handler, None, chat_data(chat_id)) for chat_id in range(4)))
+        await scheduler.close()
+
+        assert peak == 4
+
+    @pytest.mark.asyncio
+    async def test_capacity_applies_backpressure(self):
+        """При заполнении ёмкости новый апдейт ждёт освобождения места."""
+        scheduler = UpdateSchedulerMiddleware(workers=2, capacity=1)
+        release = asyncio.Event()
+
+        async def slow(event, data):
+            await release.wait()
+
+        async def fast(event, data):
+            return "done"
+
+        first = asyncio.create_task(scheduler(slow, None, chat_data(1)))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(scheduler(fast, None, chat_data(2)))
+        await asyncio.sleep(0.01)
+        assert not second.done()
+
+        release.set()
+        await first
+        assert await second == "done"
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_handler_error_releases_chat(self):
+        """Ошибка хендлера не блокирует очередь чата."""
+        scheduler = UpdateSchedulerMiddleware(workers=1)
+
+        async def failing(event, data):
+            raise RuntimeError("boom")
+
+        async def ok(event, data):
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            await scheduler(failing, None, chat_data(1))
+        assert await scheduler(ok, None, chat_data(1)) == "ok"
+        assert scheduler.pending == 0
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_update_without_chat_bypasses_queue(self):
+        """Апдейт без чата и пользователя обрабатывается сразу."""
+        scheduler = UpdateSchedulerMiddleware()
+
+        async def handler(event, data):
+            return "direct"
+
+        assert await scheduler(handler, None, {}) == "direct"
+        assert scheduler._tasks == []
+
+    @pytest.mark.asyncio
+    async def test_lag_metric_exported(self):
+        """Задержка в очереди попадает в метрики."""
+        scheduler = UpdateSchedulerMiddleware(workers=1)
+        before = QUEUE_LAG.count()
+
+        async def handler(event, data):
+            return None
+
+        await scheduler(handler, None, chat_data(7))
+        await scheduler.close()
+
+        assert QUEUE_LAG.count() == before + 1
+        output = render_metrics()
+        assert "# TYPE bot_scheduler_queue_lag_seconds histogram" in output
+        assert "bot_scheduler_queue_depth" in output
+
+    @pytest.mark.asyncio
+    async def test_pending_lag_is_aggregated(self):
+        """Задержка ожидания экспортируется агрегатом, без метки чата."""
+        scheduler = UpdateSchedulerMiddleware(workers=1)
+        release = asyncio.Event()
+
+        async def handler(event, data):
+            await release.wait()
+
+        tasks = [asyncio.create_task(scheduler(handler, None, chat_data(chat))) for chat in (1, 1, 2, 3)]
+        await asyncio.sleep(0.01)
+
+        output = render_metrics()
+        assert 'bot_scheduler_waiting_chats 3' in output
+        assert 'bot_scheduler_pending_lag_seconds{stat="max"}' in output
+        assert "chat=" not in output
+
+        release.set()
+        await asyncio.gather(*tasks)
+        await scheduler.close()
@@ -0,0 +1,180 @@
+"""Тесты для форматирования ответов модели в entities Telegram."""
+import pytest
+import sys
+import os
+
+from aiogram.types import MessageEntity
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.services.telegram_format import (
+    HORIZONTAL_RULE,
+    FormattedText,
+    render_markdown,
+    send_formatted,
+    split_formatted,
+    utf16_len,
+)
+
+
+def entity_texts(formatted):
+    """Пары (тип, текст entity), вырезанные по смещениям UTF-16."""
+    encoded = formatted.text.encode("utf-16-le")
+    return [
+        (entity.type, encoded[entity.offset * 2:(entity.offset + entity.length) * 2].decode("utf-16-le"))
+        for entity in formatted.entities
+    ]
+
+
+class TestRenderMarkdown:
+    """Тесты перевода Markdown в текст и entities."""
+
+    def test_emphasis(self):
+        """Жирный, курсив, зачёркнутый и код становятся entities без маркеров."""
+        result = render_markdown("Это **жирный**, *курсив*, ~~старое~~ и `код`")
+
+        assert result.text == "Это жирный, курсив, старое и код"
+        assert entity_texts(result) == [
+            ("bold", "жирный"),
+            ("italic", "курсив"),
+            ("strikethrough", "старое"),
+            ("code", "код"),
+        ]
+
+    def test_utf16_offsets_after_emoji(self):
+        """Эмодзи вне BMP занимают две единицы UTF-16."""
+        result = render_markdown("🔮💎 **Число** 7")
+
+        assert result.text == "🔮💎 Число 7"
+        assert result.entities[0].offset == 5
+        assert result.entities[0].length == 5
+        assert entity_texts(result) == [("bold", "Число")]
+
+    def test_nested_emphasis(self):
+        result = render_markdown("***важно***")
+
+        assert result.text == "важно"
+        assert sorted(entity_texts(result)) == [("bold", "важно"), ("italic", "важно")]
+
+    def test_unmatched_markers_stay_literal(self):
+        """Непарные маркеры и `_` внутри слова не ломают разметку."""
+        result = render_markdown("2*3=6, **незакрытый и snake_case_name")
+
+        assert result.text == "2*3=6, **незакрытый и snake_case_name"
+        assert result.entities == ()
+
+    def test_headings_lists_and_rules(self):
+        result = render_markdown("## Заголовок\n- пункт\n* ещё\n---\n> цитата")
+
+        assert result.text == f"Заголовок\n• пункт\n• ещё\n{HORIZONTAL_RULE}\nцитата"
+        assert entity_texts(result) == [("bold", "Заголовок"), ("blockquote", "цитата")]
+
+    def test_section_headers_are_bold(self):
+        result = render_markdown("✨ Твой персональный профиль\nТекст")
+
+        assert entity_texts(result) == [("bold", "✨ Твой персональный профиль")]
+
+    def test_code_block_keeps_content(self):
+        """Внутри блока кода разметка не разбирается."""
+        result = render_markdown("До\n```python\nx = a**2 * b_c\n```\nПосле")
+
+        assert result.text == "До\nx = a**2 * b_c\nПосле"
+        assert entity_texts(result) == [("pre", "x = a**2 * b_c")]
+        assert result.entities[0].language == "python"
+
+    def test_link(self):
+        result = render_markdown("Смотри [сайт](https://example.com) и [не ссылку](javascript:x)")
+
+        assert result.text == "Смотри сайт и [не ссылку](javascript:x)"
+        assert result.entities[0].type == "text_link"
+        assert result.entities[0].url == "https://example.com"
+
+    def test_collapses_blank_lines(self):
+        result = render_markdown("\n\nПервый\n\n\n\nВторой\n\n")
+
+        assert result.text == "Первый\n\nВторой"
+
+
+class TestSplitFormatted:
+    """Тесты разбиения на сообщения."""
+
+    def test_short_text_is_single_chunk(self):
+        formatted = render_markdown("Коротко **и ясно**")
+
+        assert split_formatted(formatted, limit=100) == [formatted]
+
+    def test_chunks_respect_limit_and_entities(self):
+        """Части не длиннее лимита, ни одна entity не разрезана."""
+        paragraph = "Обычный текст " * 20 + "**жирный текст в конце абзаца** 🔮"
+        formatted = render_markdown("\n\n".join([paragraph] * 10))
+        chunks = split_formatted(formatted, limit=700)
+
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert utf16_len(chunk.text) <= 700
+            for entity_type, text in entity_texts(chunk):
+                assert (entity_type, text) == ("bold", "жирный текст в конце абзаца")
+        total_bold = sum(len(chunk.entities) for chunk in chunks)
+        assert total_bold == 10
+
+    def test_boundary_moves_before_entity(self):
+        """Граница внутри entity переносится к её началу."""
+        formatted = render_markdown("a" * 10 + " **" + "b " * 10 + "b**")
+        chunks = split_formatted(formatted, limit=20)
+
+        assert chunks[0].text == "a" * 10
+        assert chunks[1].entities[0].offset == 0
+
+    def test_oversized_entity_is_split(self):
+        """Блок кода длиннее лимита делится, каждая часть остаётся в pre."""
+        code = "\n".join(f"line {i}" for i in range(50))
+        chunks = split_formatted(render_markdown(f"```\n{code}\n```"), limit=100)
+
+        assert len(chunks) > 1
+        assert "\n".join(chunk.text for chunk in chunks) == code
+        for chunk in chunks:
+            assert utf16_len(chunk.text) <= 100
+            assert [entity.type for entity in chunk.entities] == ["pre"]
+
+    def test_entity_spanning_chunks_keeps_nested_entities(self):
+        """Entity через все части повторяется в каждой, вложенные — только в своей."""
+        words = [f"w{i:03d}" for i in range(200)]
+        text = " ".join(words)
+        entities = [MessageEntity(type="bold", offset=0, length=len(text))]
+        entities += [MessageEntity(type="italic", offset=i * 5, length=4) for i in range(len(words))]
+        chunks = split_formatted(FormattedText(text, tuple(entities)), limit=100)
+
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert entity_texts(chunk)[0] == ("bold", chunk.text)
+            assert [t for kind, t in entity_texts(chunk)[1:]] == chunk.text.split(" ")
+        assert sum(len(chunk.entities) - 1 for chunk in chunks) == len(words)
+
+    def test_text_without_spaces(self):
+        chunks = split_formatted(FormattedText("x" * 250), limit=100)
+
+        assert [len(chunk.text) for chunk in chunks] == [100, 100, 50]
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text, kwargs))
+
+
+@pytest.mark.asyncio
+async def test_send_formatted_passes_entities_and_markup_to_last_chunk():
+    bot = FakeBot()
+    markup = object()
+
+    await send_formatted(bot, 42, "**один**\n\nдва " * 30, limit=100, reply_markup=markup)
+
+    assert len(bot.sent) > 1
+    for _, _, kwargs in bot.sent:
+        assert kwargs["parse_mode"] is None
+        assert isinstance(kwargs["entities"], list)
+    assert all("reply_markup" not in kwargs for _, _, kwargs in bot.sent[:-1])
+    assert bot.sent[-1][2]["reply_markup"] is markup
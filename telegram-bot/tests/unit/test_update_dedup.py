@@ -0,0 +1,104 @@
+"""Тесты для дедупликации апдейтов по update_id."""
+import asyncio
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+
+from aiogram.types import Update
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.middlewares.idempotency import DUPLICATES, IdempotencyMiddleware, SharedIdempotencyMiddleware
+from src.middlewares.scheduler import UpdateSchedulerMiddleware
+from src.services.update_dedup import PostgresUpdateDedupBackend, UpdateDeduplicator
+
+
+class TestUpdateDeduplicator:
+    """Тесты дедупликатора."""
+
+    @pytest.mark.asyncio
+    async def test_local_duplicates_rejected(self):
+        """Повтор update_id отсекается в памяти процесса."""
+        dedup = UpdateDeduplicator(max_entries=2)
+        assert await dedup.claim(1) is True
+        assert await dedup.claim(1) is False
+        assert await dedup.claim(2) is True
+        assert await dedup.claim(3) is True
+        assert len(dedup) == 2
+
+    @pytest.mark.asyncio
+    async def test_shared_backend_sees_other_workers(self, db_manager):
+        """Апдейт, обработанный другим воркером или до перезапуска, отсекается через БД."""
+        first = UpdateDeduplicator(PostgresUpdateDedupBackend(db_manager))
+        second = UpdateDeduplicator(PostgresUpdateDedupBackend(db_manager))
+
+        assert await first.claim(100) is True
+        assert await second.claim(100) is False
+        assert await second.claim(101) is True
+
+    @pytest.mark.asyncio
+    async def test_expired_records_evicted(self, db_manager):
+        """Записи старше TTL удаляются лениво."""
+        now = [1000.0]
+        backend = PostgresUpdateDedupBackend(db_manager, ttl=60, evict_every=2, clock=lambda: now[0])
+        await backend.claim(1)
+        now[0] += 120
+        await backend.claim(2)  # второй вызов запускает очистку
+
+        assert await backend.claim(1) is True
+
+
+class TestIdempotencyMiddleware:
+    """Тесты middleware идемпотентности."""
+
+    @pytest.mark.asyncio
+    async def test_duplicate_dropped_before_handler(self):
+        """Повторный апдейт не доходит до хендлера и учитывается в метрике."""
+        middleware = IdempotencyMiddleware(UpdateDeduplicator())
+        update = Update.model_validate(
+            {"update_id": 7, "message": {"message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}, "text": "hi"}}
+        )
+        calls = []
+        before = DUPLICATES.value(event="message")
+
+        async def handler(event, data):
+            calls.append(event.update_id)
+            return "handled"
+
+        assert await middleware(handler, update, {}) == "handled"
+        assert await middleware(handler, update, {}) is None
+        assert calls == [7]
+        assert DUPLICATES.value(event="message") == before + 1
+
+    @pytest.mark.asyncio
+    async def test_slow_shared_claim_keeps_chat_order(self):
+        """Медленная проверка в БД идёт в очереди чата и не переставляет его апдейты."""
+
+        class SlowBackend:
+            async def claim(self, update_id):
+                # Первый апдейт ждёт БД дольше второго
+                await asyncio.sleep(0.05 if update_id == 1 else 0)
+                return True
+
+        deduplicator = UpdateDeduplicator(SlowBackend())
+        local = IdempotencyMiddleware(deduplicator)
+        scheduler = UpdateSchedulerMiddleware(workers=2)
+        shared = SharedIdempotencyMiddleware(deduplicator)
+        handled = []
+
+        async def handler(event, data):
+            handled.append(event.update_id)
+
+        async def after_scheduler(event, data):
+            return await shared(handler, event, data)
+
+        async def after_local(event, data):
+            return await scheduler(after_scheduler, event, data)
+
+        updates = [SimpleNamespace(update_id=i, event_type="message") for i in (1, 2)]
+        await asyncio.gather(*(local(after_local, u, {"event_chat": SimpleNamespace(id=5)}) for u in updates))
+        await scheduler.close()
+
+        assert handled == [1, 2]
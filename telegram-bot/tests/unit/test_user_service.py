@@ -0,0 +1,94 @@
+"""Тесты для upsert пользователя и кеша ID."""
+import pytest
+import sys
+import os
+
+from sqlalchemy import select
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.db.models import User
+from src.services.user_service import UserCache, UserService
+
+
+async def ensure(db_manager, cache, telegram_user_id, **profile):
+    async with db_manager.get_session() as session:
+        return await UserService(session, cache).ensure_user(telegram_user_id, **profile)
+
+
+async def load(db_manager, telegram_user_id):
+    async with db_manager.get_session() as session:
+        result = await session.execute(select(User).where(User.telegram_user_id == str(telegram_user_id)))
+        return result.scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_creates_user_in_one_statement(db_manager, statements):
+    cache = UserCache()
+
+    user_id = await ensure(db_manager, cache, 42, username="ivan", full_name="Ivan")
+
+    assert user_id is not None
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("INSERT")
+    user = await load(db_manager, 42)
+    assert (user.id, user.username, user.full_name) == (user_id, "ivan", "Ivan")
+
+
+@pytest.mark.asyncio
+async def test_repeated_calls_hit_cache(db_manager, statements):
+    """Неизменный профиль — ни одного запроса к БД."""
+    cache = UserCache()
+    user_id = await ensure(db_manager, cache, 42, username="ivan", full_name="Ivan")
+    statements.clear()
+
+    assert await ensure(db_manager, cache, 42, username="ivan", full_name="Ivan") == user_id
+    assert await ensure(db_manager, cache, 42) == user_id
+    assert statements == []
+
+
+@pytest.mark.asyncio
+async def test_changed_profile_updates_same_row(db_manager, statements):
+    cache = UserCache()
+    user_id = await ensure(db_manager, cache, 42, username="ivan", full_name="Ivan")
+    statements.clear()
+
+    assert await ensure(db_manager, cache, 42, username="ivan_new") == user_id
+    assert len(statements) == 1
+
+    user = await load(db_manager, 42)
+    assert (user.username, user.full_name) == ("ivan_new", "Ivan")
+    assert cache.get("42").username == "ivan_new"
+
+
+@pytest.mark.asyncio
+async def test_other_process_row_is_reused(db_manager):
+    """Пользователь, созданный другим процессом (пустой кеш), не дублируется."""
+    first = await ensure(db_manager, UserCache(), 42, full_name="Ivan")
+    second = await ensure(db_manager, UserCache(), 42, full_name="Ivan")
+
+    assert first == second
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_user_is_not_cached(db_manager):
+    cache = UserCache()
+
+    with pytest.raises(RuntimeError):
+        async with db_manager.get_session() as session:
+            await UserService(session, cache).ensure_user(42, full_name="Ivan")
+            raise RuntimeError("enqueue failed")
+
+    assert cache.get("42") is None
+
+
+def test_cache_is_bounded():
+    from src.services.user_service import CachedUser
+
+    cache = UserCache(max_entries=2)
+    for telegram_id in ("1", "2", "3"):
+        cache.put(telegram_id, CachedUser(int(telegram_id), None, None))
+
+    assert len(cache) == 2
+    assert cache.get("1") is None
@@ -0,0 +1,96 @@
+"""Тесты для хранилища состояния пользователей."""
+import pytest
+import sys
+import os
+from collections import deque
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from services.user_state_store import InMemoryStateBackend, UserStateStore
+
+
+def make_store(backend, **kwargs):
+    """Хранилище с пространствами имён как в context_handler."""
+    store = UserStateStore(backend, **kwargs)
+    store.namespace("user_data")
+    store.namespace("contexts", ring_size=3)
+    return store
+
+
+class TestUserStateStore:
+    """Тесты двухуровневого хранилища."""
+
+    @pytest.mark.asyncio
+    async def test_write_behind(self):
+        """Запись попадает в общий уровень только при сбросе, компактным JSON."""
+        backend = InMemoryStateBackend()
+        store = make_store(backend)
+        store.namespace("user_data")[1] = {"name": "Ivan"}
+
+        assert await backend.get_many(["user_data:1"]) == {}
+
+        await store.flush()
+        assert await backend.get_many(["user_data:1"]) == {"user_data:1": b'{"name":"Ivan"}'}
+
+    @pytest.mark.asyncio
+    async def test_in_place_mutation_persisted(self):
+        """Изменение вложенного значения без присваивания тоже сохраняется."""
+        backend = InMemoryStateBackend()
+        store = make_store(backend)
+        user_data = store.namespace("user_data")
+        user_data[1] = {}
+        await store.flush()
+
+        user_data[1]["birth_date"] = "20.05.1997"
+        await store.flush()
+
+        other = make_store(backend)
+        await other.hydrate(1)
+        assert other.namespace("user_data")[1] == {"birth_date": "20.05.1997"}
+
+    @pytest.mark.asyncio
+    async def test_context_is_ring_buffer(self):
+        """Контекст восстанавливается кольцевым буфером фиксированного размера."""
+        backend = InMemoryStateBackend()
+        store = make_store(backend)
+        contexts = store.namespace("contexts")
+        contexts[1] = deque(maxlen=3)
+        for i in range(5):
+            contexts[1].append({"role": "user", "content": str(i)})
+        await store.close()
+
+        other = make_store(backend)
+        await other.hydrate(1)
+        restored = other.namespace("contexts")[1]
+
+        assert isinstance(restored, deque) and restored.maxlen == 3
+        assert [msg["content"] for msg in restored] == ["2", "3", "4"]
+
+    @pytest.mark.asyncio
+    async def test_l1_is_bounded(self):
+        """L1 не растёт сверх max_entries; вытесненные данные не теряются."""
+        backend = InMemoryStateBackend()
+        store = make_store(backend, max_entries=2)
+        user_data = store.namespace("user_data")
+        for user_id in range(5):
+            user_data[user_id] = {"name": f"user{user_id}"}
+
+        assert len(store) == 2
+        await store.flush()
+
+        await store.hydrate(0)
+        assert user_data[0] == {"name": "user0"}
+
+    @pytest.mark.asyncio
+    async def test_delete_propagates(self):
+        """Удаление ключа удаляет его и из общего уровня."""
+        backend = InMemoryStateBackend()
+        store = make_store(backend)
+        store.namespace("user_data")[1] = {"name": "Ivan"}
+        await store.flush()
+
+        del store.namespace("user_data")[1]
+        await store.flush()
+
+        assert await backend.get_many(["user_data:1"]) == {}
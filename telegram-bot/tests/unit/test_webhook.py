@@ -0,0 +1,158 @@
+"""Тесты для приёма апдейтов по webhook."""
+import asyncio
+import pytest
+import sys
+import os
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+# Добавляем путь к src
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from src.middlewares.scheduler import UpdateSchedulerMiddleware
+from src.webhook import SECRET_HEADER, WebhookUpdateQueue, derive_webhook_secret, resolve_webhook_url
+
+SECRET = "test-secret"
+UPDATE = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}, "text": "hi"}}
+
+
+class SlowDispatcher:
+    """Диспетчер, обработка которого ждёт сигнала."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.handled = []
+
+    async def feed_update(self, bot, update):
+        await self.release.wait()
+        self.handled.append(update.update_id)
+
+
+class ChatDispatcher:
+    """Диспетчер с планировщиком апдейтов; апдейты чата 5 ждут сигнала."""
+
+    def __init__(self):
+        self.scheduler = UpdateSchedulerMiddleware(workers=2)
+        self.release = asyncio.Event()
+        self.handled = []
+
+    async def feed_update(self, bot, update):
+        async def handler(event, data):
+            if event.message.chat.id == 5:
+                await self.release.wait()
+            self.handled.append(event.update_id)
+
+        await self.scheduler(handler, update, {"event_chat": update.message.chat})
+
+
+def chat_update(update_id, chat_id):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": "hi"},
+    }
+
+
+async def make_client(dispatcher, queue_size=10):
+    updates = WebhookUpdateQueue(dispatcher, bot=None, secret_token=SECRET, queue_size=queue_size)
+    app = web.Application()
+    updates.register(app, path="/webhook")
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    return client, updates
+
+
+class TestWebhookUpdateQueue:
+    """Тесты очереди webhook."""
+
+    @pytest.mark.asyncio
+    async def test_acknowledges_before_processing(self):
+        """Ответ 200 приходит до окончания обработки апдейта."""
+        dispatcher = SlowDispatcher()
+        client, updates = await make_client(dispatcher)
+        try:
+            response = await client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: SECRET})
+            assert response.status == 200
+            assert dispatcher.handled == []
+
+            dispatcher.release.set()
+        finally:
+            await client.close()  # on_shutdown дообрабатывает очередь
+        assert dispatcher.handled == [1]
+
+    @pytest.mark.asyncio
+    async def test_rejects_wrong_secret(self):
+        """Запрос без верного секрета отклоняется и не попадает в очередь."""
+        client, updates = await make_client(SlowDispatcher())
+        try:
+            response = await client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: "wrong"})
+            assert response.status == 401
+            response = await client.post("/webhook", json=UPDATE)
+            assert response.status == 401
+            assert updates.pending == 0
+        finally:
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_full_queue_returns_503(self):
+        """При заполненной очереди Telegram получает 503 и повторит доставку."""
+        dispatcher = SlowDispatcher()
+        client, updates = await make_client(dispatcher, queue_size=2)
+        try:
+            statuses = []
+            for update_id in range(1, 4):
+                response = await client.post(
+                    "/webhook", json={"update_id": update_id}, headers={SECRET_HEADER: SECRET}
+                )
+                statuses.append(response.status)
+                await asyncio.sleep(0)
+            # Два апдейта приняты и ещё обрабатываются, третий не помещается
+            assert statuses == [200, 200, 503]
+            dispatcher.release.set()
+        finally:
+            await client.close()
+        assert dispatcher.handled == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_flooding_chat_does_not_block_others(self):
+        """Пока апдейты одного чата ждут в его очереди, другой чат обрабатывается сразу."""
+        dispatcher = ChatDispatcher()
+        client, updates = await make_client(dispatcher, queue_size=100)
+        try:
+            for update_id in range(1, 31):
+                response = await client.post("/webhook", json=chat_update(update_id, 5), headers={SECRET_HEADER: SECRET})
+                assert response.status == 200
+            response = await client.post("/webhook", json=chat_update(100, 6), headers={SECRET_HEADER: SECRET})
+            assert response.status == 200
+
+            for _ in range(100):
+                if dispatcher.handled:
+                    break
+                await asyncio.sleep(0.01)
+            assert dispatcher.handled == [100]
+
+            dispatcher.release.set()
+        finally:
+            await client.close()
+            await dispatcher.scheduler.close()
+        assert dispatcher.handled == [100] + list(range(1, 31))
+
+    @pytest.mark.asyncio
+    async def test_invalid_payload_returns_400(self):
+        """Некорректное тело запроса отклоняется."""
+        client, updates = await make_client(SlowDispatcher())
+        try:
+            response = await client.post("/webhook", data="not json", headers={SECRET_HEADER: SECRET})
+            assert response.status == 400
+        finally:
+            await client.close()
+
+
+def test_secret_and_url_helpers():
+    """Секрет по умолчанию стабилен и допустим для Telegram; URL дополняется путём."""
+    secret = derive_webhook_secret("123:abc")
+    assert secret == derive_webhook_secret("123:abc")
+    assert "123:abc" not in secret and secret.isalnum()
+    assert resolve_webhook_url("https://bot.example.com/", "/webhook") == "https://bot.example.com/webhook"
+    assert resolve_webhook_url("https://bot.example.com/webhook", "/webhook") == "https://bot.example.com/webhook"
+    assert resolve_webhook_url(None, "/webhook") is None